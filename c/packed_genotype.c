@@ -0,0 +1,116 @@
+#include <postgres.h>
+#include <fmgr.h>
+#include <utils/lsyscache.h>
+#include <utils/array.h>
+
+#ifdef PG_MODULE_MAGIC
+PG_MODULE_MAGIC;
+#endif
+
+/*
+ * Packed genotype layout (see dml/packedgenotype.py):
+ * 4-byte big-endian number of calls, then four calls per byte, two bits each,
+ * the first call of a byte in its lowest bits, each stored as call + 1
+ */
+
+static int32 packed_count( bytea* packed ) {
+	int32 size = (int32)VARSIZE_ANY_EXHDR( packed );
+	unsigned char* data;
+	int32 count;
+	if( size < 4 ) {
+		ereport( ERROR, (errcode(ERRCODE_INVALID_BINARY_REPRESENTATION),errmsg("packed genotype is shorter than its header")) );
+	}
+	data = (unsigned char*)VARDATA_ANY( packed );
+	count = (int32)(((uint32)data[0] << 24) | ((uint32)data[1] << 16) | ((uint32)data[2] << 8) | (uint32)data[3]);
+	if( count < 0 || size < 4 + (count + 3) / 4 ) {
+		ereport( ERROR, (errcode(ERRCODE_INVALID_BINARY_REPRESENTATION),errmsg("packed genotype of %d calls is too short", count)) );
+	}
+	return count;
+}
+
+static Datum packed_call( unsigned char* data, int32 i ) {
+	int code = (data[ 4 + i / 4 ] >> (2 * (i % 4))) & 3;
+	return CharGetDatum( (char)(code - 1) );
+}
+
+static ArrayType* tinyint_array( FunctionCallInfo fcinfo, Datum* content, bool* nullflags, int length ) {
+	/* The element type is taken from the declared return type, tinyint[] */
+	Oid results_type = get_element_type( get_fn_expr_rettype( fcinfo->flinfo ) );
+	int16 results_width;
+	bool results_passbyvalue;
+	char results_alignmentcode;
+	int dims[1];
+	int lbs[1];
+	get_typlenbyvalalign( results_type, &results_width, &results_passbyvalue, &results_alignmentcode );
+	dims[0] = length;
+	lbs[0] = 1;
+	return construct_md_array( content, nullflags, 1, dims, lbs, results_type, results_width, results_passbyvalue, results_alignmentcode );
+}
+
+PG_FUNCTION_INFO_V1( genotype_unpack );
+Datum genotype_unpack( PG_FUNCTION_ARGS ) {
+	bytea* packed = PG_GETARG_BYTEA_PP( 0 );
+	int32 count = packed_count( packed );
+	unsigned char* data = (unsigned char*)VARDATA_ANY( packed );
+	Datum* results_content = (Datum *)palloc( sizeof(Datum) * (count > 0 ? count : 1) );
+	ArrayType* results;
+	int32 i;
+
+	for( i = 0; i < count; ++i ) {
+		results_content[i] = packed_call( data, i );
+	}
+	results = tinyint_array( fcinfo, results_content, NULL, count );
+	pfree( results_content );
+	PG_RETURN_ARRAYTYPE_P( results );
+}
+
+PG_FUNCTION_INFO_V1( genotype_packed_index );
+Datum genotype_packed_index( PG_FUNCTION_ARGS ) {
+	bytea* packed = PG_GETARG_BYTEA_PP( 0 );
+	int32 count = packed_count( packed );
+	unsigned char* data = (unsigned char*)VARDATA_ANY( packed );
+	ArrayType* indices = PG_GETARG_ARRAYTYPE_P( 1 );
+
+	Oid indices_type = ARR_ELEMTYPE( indices );
+	int16 indices_width;
+	bool indices_passbyvalue;
+	char indices_alignmentcode;
+	Datum* indices_content;
+	bool* indices_nullflags;
+	int indices_length;
+
+	Datum* results_content;
+	bool* results_nullflags;
+	ArrayType* results;
+	int i;
+
+	get_typlenbyvalalign( indices_type, &indices_width, &indices_passbyvalue, &indices_alignmentcode );
+	deconstruct_array( indices, indices_type, indices_width, indices_passbyvalue, indices_alignmentcode, &indices_content, &indices_nullflags, &indices_length );
+
+	results_content = (Datum *)palloc( sizeof(Datum) * (indices_length > 0 ? indices_length : 1) );
+	results_nullflags = (bool *)palloc0( sizeof(bool) * (indices_length > 0 ? indices_length : 1) );
+	for( i = 0; i < indices_length; ++i ) {
+		int32 index = DatumGetInt32( indices_content[i] );
+		if( indices_nullflags[i] || index < 1 || index > count ) {
+			results_content[i] = 0;
+			results_nullflags[i] = true;
+		} else {
+			results_content[i] = packed_call( data, index - 1 );
+		}
+	}
+	results = tinyint_array( fcinfo, results_content, results_nullflags, indices_length );
+	pfree( results_content );
+	pfree( results_nullflags );
+	PG_RETURN_ARRAYTYPE_P( results );
+}
+
+PG_FUNCTION_INFO_V1( genotype_packed_call );
+Datum genotype_packed_call( PG_FUNCTION_ARGS ) {
+	bytea* packed = PG_GETARG_BYTEA_PP( 0 );
+	int32 count = packed_count( packed );
+	int32 index = PG_GETARG_INT32( 1 );
+	if( index < 1 || index > count ) {
+		PG_RETURN_NULL();
+	}
+	PG_RETURN_DATUM( packed_call( (unsigned char*)VARDATA_ANY( packed ), index - 1 ) );
+}
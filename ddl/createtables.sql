@@ -92,12 +92,36 @@ CREATE TABLE genotype (
   genotype_id SERIAL PRIMARY KEY,
   genotype_line INTEGER NOT NULL,
   genotype_chromosome INTEGER NOT NULL,
-  genotype tinyint[] NOT NULL,
+  genotype tinyint[],
+  genotype_packed BYTEA,
   genotype_genotype_version INTEGER NOT NULL REFERENCES genotype_version (genotype_version_id),
   FOREIGN KEY (genotype_line) REFERENCES line (line_id),
   FOREIGN KEY (genotype_chromosome) REFERENCES chromosome (chromosome_id),
-  unique (genotype_line, genotype_chromosome)
+  unique (genotype_line, genotype_chromosome),
+  CHECK ((genotype IS NULL) <> (genotype_packed IS NULL))
   );
+  -- Calls are stored either as tinyint[] (a byte per call) or packed four calls to a byte in genotype_packed (see dml/packedgenotype.py). The genotype_calls view in functions.sql shows both as tinyint[].
+
+-- Create the variant_genotype_lines table
+DROP TABLE IF EXISTS variant_genotype_lines;
+CREATE TABLE variant_genotype_lines (
+  variant_genotype_lines_genotype_version INTEGER NOT NULL REFERENCES genotype_version (genotype_version_id),
+  variant_genotype_lines_chromosome INTEGER NOT NULL REFERENCES chromosome (chromosome_id),
+  variant_genotype_lines INTEGER[] NOT NULL,
+  variant_genotype_lines_stamp TEXT NOT NULL,
+  PRIMARY KEY (variant_genotype_lines_genotype_version, variant_genotype_lines_chromosome)
+  );
+  -- The lines, in order, of every variant_genotype array of a chromosome, and the stamp of the genotypes the arrays were built from. The arrays are up to date while the stamp matches the genotype table (see dml/variantmajor.py).
+
+-- Create the variant_genotype table
+DROP TABLE IF EXISTS variant_genotype;
+CREATE TABLE variant_genotype (
+  variant_genotype_variant INTEGER NOT NULL REFERENCES variant (variant_id),
+  variant_genotype_genotype_version INTEGER NOT NULL REFERENCES genotype_version (genotype_version_id),
+  variant_genotype tinyint[] NOT NULL,
+  PRIMARY KEY (variant_genotype_variant, variant_genotype_genotype_version)
+  );
+  -- The calls of one variant for every line, the transpose of the genotype table, for questions about single variants.
 
 -- Create the trait table
 DROP TABLE IF EXISTS trait;
@@ -115,8 +139,11 @@ CREATE TABLE phenotype (
   phenotype_id SERIAL PRIMARY KEY,
   phenotype_line INTEGER NOT NULL REFERENCES line (line_id),
   phenotype_trait INTEGER NOT NULL REFERENCES trait (trait_id),
-  phenotype_value VARCHAR(128) NOT NULL
+  phenotype_value DOUBLE PRECISION,
+  phenotype_value_text VARCHAR(128),
+  CHECK (phenotype_value IS NOT NULL OR phenotype_value_text IS NOT NULL)
   );
+  -- Values are stored as double precision. The text of a value is kept in phenotype_value_text only when the double does not read back as the same number (too many digits, out of range, or not a number); see split_phenotype_values() in dml/parsinghelpers.py. Databases created before this change are converted by migrate_phenotype_value.sql.
   -- Ran into problem with insertion, this is not largest enough because the values can be on the magnitude of 10^-99 or possibly greater, so this would have to be (Number length + Magnitude). As far as I can tell right now, the value is 16 characters long and can be an order up to e-90, but smallest observed is e-87. Therefore, the minimum length for phenotype_value should be 16+87=103. Let's round it up to 128 for good measure.
 
 -- Create the gwas_algorithm table
@@ -0,0 +1,36 @@
+-- Connect to the baxdb database
+\connect baxdb
+
+-- Declare the custom C functions built from ./c and installed into $libdir/baxdb
+
+-- array_multi_index(values, indices): the elements of values at the 1-based indices, in the order given
+-- Out-of-range and NULL indices give NULL elements
+CREATE OR REPLACE FUNCTION array_multi_index(anyarray, integer[])
+  RETURNS anyarray
+  AS '$libdir/baxdb/array_multi_index', 'array_multi_index'
+  LANGUAGE C IMMUTABLE STRICT;
+
+-- genotype_unpack(packed): the calls of a packed genotype (see dml/packedgenotype.py), -1 for missing
+CREATE OR REPLACE FUNCTION genotype_unpack(bytea)
+  RETURNS tinyint[]
+  AS '$libdir/baxdb/packed_genotype', 'genotype_unpack'
+  LANGUAGE C IMMUTABLE STRICT;
+
+-- genotype_packed_index(packed, indices): the calls of a packed genotype at the 1-based indices, like array_multi_index
+CREATE OR REPLACE FUNCTION genotype_packed_index(bytea, integer[])
+  RETURNS tinyint[]
+  AS '$libdir/baxdb/packed_genotype', 'genotype_packed_index'
+  LANGUAGE C IMMUTABLE STRICT;
+
+-- genotype_packed_call(packed, index): the call of a packed genotype at a 1-based index, NULL if out of range
+CREATE OR REPLACE FUNCTION genotype_packed_call(bytea, integer)
+  RETURNS tinyint
+  AS '$libdir/baxdb/packed_genotype', 'genotype_packed_call'
+  LANGUAGE C IMMUTABLE STRICT;
+
+-- Every genotype with its calls as tinyint[], whether they are stored packed or not
+CREATE OR REPLACE VIEW genotype_calls AS
+  SELECT genotype_id, genotype_line, genotype_chromosome,
+         COALESCE(genotype, genotype_unpack(genotype_packed)) AS genotype,
+         genotype_genotype_version
+  FROM genotype;
@@ -0,0 +1,17 @@
+-- Connect to the baxdb database
+\connect baxdb
+
+-- Non-unique indexes on foreign keys and common access paths. Unique constraints
+-- already index their columns. The same set is listed in dml/indexes.py, which drops
+-- them before bulk loads and builds them again afterwards, so keep the two in sync.
+
+-- Phenotypes of a line, and of a trait (joined in dml/sample_query.sql)
+CREATE INDEX IF NOT EXISTS phenotype_line_idx ON phenotype (phenotype_line);
+CREATE INDEX IF NOT EXISTS phenotype_trait_idx ON phenotype (phenotype_trait);
+
+-- Runs of a trait, and the results of a run
+CREATE INDEX IF NOT EXISTS gwas_run_trait_idx ON gwas_run (gwas_run_trait);
+CREATE INDEX IF NOT EXISTS gwas_result_gwas_run_idx ON gwas_result (gwas_result_gwas_run);
+
+-- Genotypes of a chromosome in a genotype version (see dml/fetch.py)
+CREATE INDEX IF NOT EXISTS genotype_genotype_version_idx ON genotype (genotype_genotype_version, genotype_chromosome);
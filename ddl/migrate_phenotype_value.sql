@@ -0,0 +1,43 @@
+-- Connect to the baxdb database
+\connect baxdb
+
+-- Converts phenotype.phenotype_value of a database created before it was stored as
+-- double precision. The old text column is kept as phenotype_value_text, and cleared
+-- for every value whose double reads back as the same number, so only values that
+-- cannot round-trip (too many digits, out of range, or not a number) keep their text.
+-- This is the rule of split_phenotype_value in dml/parsinghelpers.py, which new rows
+-- are written with. Needs PostgreSQL 12 or later for the shortest text of a double.
+-- Run it once, as a superuser or the owner of the phenotype table.
+
+BEGIN;
+
+-- Print doubles as the shortest text that reads back as the same double, like Python's repr
+SET LOCAL extra_float_digits = 1;
+
+ALTER TABLE phenotype RENAME COLUMN phenotype_value TO phenotype_value_text;
+ALTER TABLE phenotype ALTER COLUMN phenotype_value_text DROP NOT NULL;
+ALTER TABLE phenotype ADD COLUMN phenotype_value DOUBLE PRECISION;
+
+-- Casts text to double precision, or NULL unless it is a decimal (NUMBER_PATTERN in
+-- dml/parsinghelpers.py) within the range of a double
+CREATE FUNCTION pg_temp.try_float8(value TEXT) RETURNS DOUBLE PRECISION AS $$
+BEGIN
+  IF value !~ '^\s*[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?\s*$' THEN
+    RETURN NULL;
+  END IF;
+  RETURN value::DOUBLE PRECISION;
+EXCEPTION WHEN numeric_value_out_of_range THEN
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+UPDATE phenotype SET phenotype_value = pg_temp.try_float8(phenotype_value_text);
+
+-- Compare as numbers, so that 1.0, 1e3 and .5 read back as 1, 1000 and 0.5
+UPDATE phenotype SET phenotype_value_text = NULL
+  WHERE CASE WHEN phenotype_value IS NULL THEN FALSE
+    ELSE phenotype_value_text::NUMERIC = phenotype_value::TEXT::NUMERIC END;
+
+ALTER TABLE phenotype ADD CHECK (phenotype_value IS NOT NULL OR phenotype_value_text IS NOT NULL);
+
+COMMIT;
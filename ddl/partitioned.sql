@@ -0,0 +1,46 @@
+-- Connect to the baxdb database
+\connect baxdb
+
+-- Optional partitioned layout of the genotype and gwas_result tables, replacing the
+-- ones in createtables.sql. Run it after createtables.sql and before functions.sql
+-- (init_db.sh and install.sh do when BAXDB_PARTITIONED is set). Requires PostgreSQL 11
+-- or later, for unique indexes and ON CONFLICT on partitioned tables.
+-- Partitions are created by the loaders in dml/insert.py as they are needed (see dml/partitions.py):
+--   genotype_v<genotype_version_id>, partitioned in turn into genotype_v<genotype_version_id>_c<chromosome_id>
+--   gwas_result_c<chromosome_id>
+-- Unique constraints must include the partition key, so a line may have a genotype
+-- for the same chromosome in more than one genotype version.
+
+-- Create the genotype table
+DROP TABLE IF EXISTS genotype;
+CREATE TABLE genotype (
+  genotype_id SERIAL,
+  genotype_line INTEGER NOT NULL,
+  genotype_chromosome INTEGER NOT NULL,
+  genotype tinyint[],
+  genotype_packed BYTEA,
+  genotype_genotype_version INTEGER NOT NULL REFERENCES genotype_version (genotype_version_id),
+  FOREIGN KEY (genotype_line) REFERENCES line (line_id),
+  FOREIGN KEY (genotype_chromosome) REFERENCES chromosome (chromosome_id),
+  PRIMARY KEY (genotype_id, genotype_genotype_version, genotype_chromosome),
+  unique (genotype_line, genotype_chromosome, genotype_genotype_version),
+  CHECK ((genotype IS NULL) <> (genotype_packed IS NULL))
+  ) PARTITION BY LIST (genotype_genotype_version);
+
+-- Create the gwas_result table
+DROP TABLE IF EXISTS gwas_result;
+CREATE TABLE gwas_result (
+  gwas_result_id SERIAL,
+  gwas_result_chromosome INTEGER NOT NULL REFERENCES chromosome (chromosome_id),
+  basepair INTEGER NOT NULL CHECK (basepair > 0),
+  gwas_result_gwas_run INTEGER NOT NULL REFERENCES gwas_run (gwas_run_id),
+  pval NUMERIC NOT NULL CHECK (pval > 0),
+  cofactor NUMERIC CHECK (cofactor IN (0,1)),
+  _order NUMERIC CHECK (_order > 0),
+  null_pval NUMERIC CHECK (null_pval > 0),
+  model_added_pval NUMERIC CHECK (model_added_pval > 0),
+  model TEXT,
+  pcs INTEGER[],
+  PRIMARY KEY (gwas_result_id, gwas_result_chromosome),
+  unique (gwas_result_chromosome, basepair, gwas_result_gwas_run, model)
+  ) PARTITION BY LIST (gwas_result_chromosome);
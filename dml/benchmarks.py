@@ -0,0 +1,154 @@
+#!/bin/python
+"""Measures import times and the cost of the hot database paths"""
+# Run from the dml directory against a loaded database:
+#   python benchmarks.py
+import os
+import subprocess
+import sys
+import time
+import find
+from dbconnect import connect
+
+# The hot lookups as they ran before being prepared: parsed and planned on every call
+ADHOC_QUERIES = {
+  'find_line': "SELECT line_id FROM line WHERE line_name = %s AND line_population = %s;",
+  'find_trait': "SELECT trait_id FROM trait WHERE trait_name = %s;",
+  'find_gwas_run': "SELECT gwas_run_id FROM gwas_run WHERE gwas_run_gwas_algorithm = %s AND missing_snp_cutoff_value = %s AND missing_line_cutoff_value = %s AND gwas_run_imputation_method = %s AND gwas_run_trait = %s AND nsnps = %s AND nlines = %s AND gwas_run_genotype_version = %s AND gwas_run_kinship = %s AND gwas_run_population_structure = %s AND minor_allele_frequency_cutoff_value = %s;",
+}
+
+# A row to look up for each of them, with columns in the order the find function takes them
+SAMPLE_QUERIES = {
+  'find_line': "SELECT line_name, line_population FROM line LIMIT 1;",
+  'find_trait': "SELECT trait_name FROM trait LIMIT 1;",
+  'find_gwas_run': "SELECT gwas_run_gwas_algorithm, missing_snp_cutoff_value, missing_line_cutoff_value, gwas_run_imputation_method, gwas_run_trait, nsnps, nlines, gwas_run_genotype_version, gwas_run_kinship, gwas_run_population_structure, minor_allele_frequency_cutoff_value FROM gwas_run LIMIT 1;",
+}
+
+
+def time_calls(function, args, repeat):
+  """Times repeated calls of a function
+
+    :param function: function to call
+    :type function: function
+    :param args: arguments of every call
+    :type args: tuple
+    :param repeat: number of calls
+    :type repeat: integer
+    :return: mean seconds per call
+    :rtype: float
+  """
+  start = time.perf_counter()
+  for _ in range(repeat):
+    function(*args)
+  return (time.perf_counter() - start) / repeat
+
+
+def adhoc_lookup(conn, SQL, *args):
+  """Runs a lookup the way the find functions used to, as a fresh query
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param SQL: query with ``%s`` placeholders
+    :type SQL: string
+    :return: first column of the first row
+    :rtype: integer
+  """
+  cur = conn.cursor()
+  cur.execute(SQL, args)
+  row = cur.fetchone()
+  cur.close()
+  return row[0] if row is not None else None
+
+
+def planning_time(conn, SQL, args):
+  """Finds how long the server takes to plan a query
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param SQL: query with ``%s`` placeholders
+    :type SQL: string
+    :param args: value of each placeholder
+    :type args: tuple
+    :return: planning time in milliseconds
+    :rtype: float
+  """
+  cur = conn.cursor()
+  cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + SQL, args)
+  plan = cur.fetchone()[0]
+  cur.close()
+  return plan[0]['Planning Time']
+
+
+def benchmark_prepared_lookups(conn, repeat=2000):
+  """Compares ad hoc and prepared lookups on the hot find paths
+
+    This function looks up one existing row per function, bypassing the ID cache so
+    that every call reaches the database
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param repeat: number of lookups per function and method
+    :type repeat: integer
+    :return: (ad hoc ms per call, prepared ms per call, planning ms per ad hoc call), keyed by function name
+    :rtype: dict
+  """
+  results = {}
+  cur = conn.cursor()
+  for name, SQL in SAMPLE_QUERIES.items():
+    cur.execute(SQL)
+    args = cur.fetchone()
+    if args is None:
+      print("[ SKIP ]\t%s\t(table is empty)" % name)
+      continue
+    uncached = getattr(find, name).__wrapped__
+    # Prepare before timing, as a long-running loader would have already
+    uncached(conn, *args)
+    adhoc = time_calls(adhoc_lookup, (conn, ADHOC_QUERIES[name]) + tuple(args), repeat)
+    prepared = time_calls(uncached, (conn,) + tuple(args), repeat)
+    results[name] = (adhoc * 1000, prepared * 1000, planning_time(conn, ADHOC_QUERIES[name], args))
+  cur.close()
+  conn.rollback()
+  return results
+
+
+# Run in a fresh interpreter for each measurement, so nothing is already imported
+IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import %s
+print((time.perf_counter() - start) * 1000)
+print(','.join(name for name in ('pandas', 'numpy', 'tqdm', 'psycopg2') if name in sys.modules))
+"""
+
+def benchmark_import_time(modules=('find', 'getorcreate', 'parsinghelpers', 'dbconnect', 'insert'), repeat=5):
+  """Measures how long each module takes to import in a fresh interpreter
+
+    :param modules: names of modules
+    :type modules: list of strings
+    :param repeat: number of interpreters started per module
+    :type repeat: integer
+    :return: (fastest import in ms, heavy packages the import loaded), keyed by module name
+    :rtype: dict
+  """
+  directory = os.path.dirname(os.path.abspath(__file__))
+  results = {}
+  for module in modules:
+    times = []
+    for _ in range(repeat):
+      output = subprocess.check_output([sys.executable, '-c', IMPORT_SCRIPT % module], cwd=directory, universal_newlines=True)
+      milliseconds, loaded = output.split('\n')[:2]
+      times.append(float(milliseconds))
+    results[module] = (min(times), loaded.split(',') if loaded else [])
+  return results
+
+
+if __name__ == '__main__':
+  print("%-16s %12s   %s" % ('module', 'import ms', 'heavy packages loaded'))
+  for module, (milliseconds, loaded) in benchmark_import_time().items():
+    print("%-16s %12.1f   %s" % (module, milliseconds, ', '.join(loaded) or '-'))
+  print()
+
+  conn = connect()
+  print("%-16s %12s %12s %12s" % ('lookup', 'ad hoc ms', 'prepared ms', 'planning ms'))
+  for name, (adhoc, prepared, planning) in benchmark_prepared_lookups(conn).items():
+    print("%-16s %12.4f %12.4f %12.4f" % (name, adhoc, prepared, planning))
+  conn.close()
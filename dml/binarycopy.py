@@ -0,0 +1,256 @@
+"""Encodes and decodes rows in the PostgreSQL binary COPY format"""
+# Reference: https://www.postgresql.org/docs/9.6/static/sql-copy.html (Binary Format)
+import struct
+
+COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+COPY_HEADER = COPY_SIGNATURE + struct.pack('!ii', 0, 0)
+COPY_TRAILER = struct.pack('!h', -1)
+NULL_FIELD = struct.pack('!i', -1)
+
+# A tinyint array element on the wire: a 4-byte length (always 1) followed by
+# the single byte written by tinyint_send() / read by tinyint_recv().
+# Kept as a spec rather than a NumPy dtype so importing this module does not load NumPy.
+TINYINT_ELEMENT = [('length', '>i4'), ('value', 'i1')]
+
+
+def find_type_oid(conn, type_name):
+  """Finds the OID of a type by its name
+
+    This function finds the OID of a type, which is needed to encode arrays of
+    user-defined types such as ``tinyint`` whose OID differs between databases
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param type_name: name of type
+    :type type_name: string
+    :return: OID of type
+    :rtype: integer
+  """
+  cur = conn.cursor()
+  cur.execute("SELECT %s::regtype::oid;", (type_name,))
+  oid = cur.fetchone()[0]
+  cur.close()
+  return oid
+
+
+def encode_integer(value):
+  """Encodes an integer field
+
+    :param value: value of an ``INTEGER`` column, or None for NULL
+    :type value: integer
+    :return: length-prefixed field
+    :rtype: bytes
+  """
+  if value is None:
+    return NULL_FIELD
+  return struct.pack('!ii', 4, value)
+
+
+def encode_tinyint_array(calls, tinyint_oid):
+  """Encodes a one-dimensional tinyint[] field
+
+    This function lays out the whole array with a single NumPy structured copy,
+    so no Python object is created per element
+
+    :param calls: allele calls
+    :type calls: numpy array of int8
+    :param tinyint_oid: OID of the tinyint type (see :func:`find_type_oid`)
+    :type tinyint_oid: integer
+    :return: length-prefixed field
+    :rtype: bytes
+  """
+  import numpy as np
+  calls = np.asarray(calls, dtype=np.int8)
+  n = calls.shape[0]
+  if n == 0:
+    header = struct.pack('!iii', 0, 0, tinyint_oid)
+    return struct.pack('!i', len(header)) + header
+  elements = np.empty(n, dtype=TINYINT_ELEMENT)
+  elements['length'] = 1
+  elements['value'] = calls
+  header = struct.pack('!iiiii', 1, 0, tinyint_oid, n, 1)
+  return struct.pack('!i', len(header) + elements.nbytes) + header + elements.tobytes()
+
+
+def encode_bytes(data):
+  """Encodes a bytea field
+
+    :param data: contents of a ``BYTEA`` column, or None for NULL
+    :type data: bytes
+    :return: length-prefixed field
+    :rtype: bytes
+  """
+  if data is None:
+    return NULL_FIELD
+  return struct.pack('!i', len(data)) + data
+
+
+def encode_tuple(fields):
+  """Encodes a tuple from already encoded fields
+
+    :param fields: length-prefixed fields, in column order
+    :type fields: list of bytes
+    :return: encoded tuple
+    :rtype: bytes
+  """
+  return struct.pack('!h', len(fields)) + b''.join(fields)
+
+
+class CopyStream(object):
+  """File-like wrapper around an iterable of encoded tuples
+
+  Passing an instance to ``cursor.copy_expert()`` streams the header, every tuple
+  and the trailer to the server without holding the whole payload in memory.
+
+  :param tuples: encoded tuples (see :func:`encode_tuple`)
+  :type tuples: iterable of bytes
+  """
+  def __init__(self, tuples):
+    self.chunks = iter(tuples)
+    self.chunk = COPY_HEADER
+    self.offset = 0
+    self.done = False
+
+  def next_chunk(self):
+    """Advances to the next encoded tuple, then to the trailer
+
+      :return: False once the trailer has been consumed
+      :rtype: boolean
+    """
+    if self.done:
+      return False
+    try:
+      self.chunk = next(self.chunks)
+    except StopIteration:
+      self.chunk = COPY_TRAILER
+      self.done = True
+    self.offset = 0
+    return True
+
+  def read(self, size=-1):
+    pieces = []
+    while size < 0 or size > 0:
+      if self.offset >= len(self.chunk) and not self.next_chunk():
+        break
+      end = len(self.chunk) if size < 0 else self.offset + size
+      piece = self.chunk[self.offset:end]
+      self.offset += len(piece)
+      if size > 0:
+        size -= len(piece)
+      pieces.append(piece)
+    return b''.join(pieces)
+
+
+def decode_integer(field):
+  """Decodes an integer field
+
+    :param field: field contents, without its length prefix, or None for NULL
+    :type field: bytes
+    :return: value
+    :rtype: integer
+  """
+  if field is None:
+    return None
+  return struct.unpack('!i', field)[0]
+
+
+def decode_tinyint_array(field, out=None):
+  """Decodes a one-dimensional tinyint[] field
+
+    This function reads the whole array with a single NumPy structured view when it
+    has no NULL elements. NULL elements, which the loaders never write, become -1,
+    the missing call in .012 files.
+
+    :param field: field contents, without its length prefix
+    :type field: bytes
+    :param out: array to decode into, which must have the length of the field's array
+    :type out: numpy array of int8
+    :return: allele calls
+    :rtype: numpy array of int8
+    :raises: :exc:`ValueError` if the array is not one-dimensional or does not fit ``out``
+  """
+  import numpy as np
+  ndim, hasnull, _ = struct.unpack_from('!iii', field, 0)
+  if ndim == 0:
+    n = 0
+  elif ndim == 1:
+    n = struct.unpack_from('!i', field, 12)[0]
+  else:
+    raise ValueError('Expected a one-dimensional tinyint[], got %d dimensions' % ndim)
+  if out is None:
+    out = np.empty(n, dtype=np.int8)
+  elif out.shape[0] != n:
+    raise ValueError('Expected %d calls, got %d' % (out.shape[0], n))
+  offset = 12 + 8 * ndim
+  if not hasnull:
+    out[:] = np.frombuffer(field, dtype=TINYINT_ELEMENT, count=n, offset=offset)['value']
+    return out
+  for i in range(n):
+    length = struct.unpack_from('!i', field, offset)[0]
+    offset += 4
+    if length < 0:
+      out[i] = -1
+    else:
+      out[i] = struct.unpack_from('b', field, offset)[0]
+      offset += length
+  return out
+
+
+class CopyDecoder(object):
+  """File-like target that splits a binary COPY ... TO STDOUT stream into tuples
+
+  Passing an instance to ``cursor.copy_expert()`` hands every tuple to ``callback``
+  as soon as it has arrived, so the whole payload is never held in memory. The server
+  sends one message per tuple, so normally each write completes exactly one tuple.
+
+  :param callback: called with the fields of each tuple (bytes, or None for NULL)
+  :type callback: function
+  """
+  def __init__(self, callback):
+    self.callback = callback
+    self.buffer = bytearray()
+    self.header = False
+    self.done = False
+    self.count = 0
+
+  def write(self, data):
+    self.buffer += data
+    offset = 0
+    if not self.header:
+      if len(self.buffer) < len(COPY_SIGNATURE) + 8:
+        return len(data)
+      if bytes(self.buffer[:len(COPY_SIGNATURE)]) != COPY_SIGNATURE:
+        raise ValueError('Not a binary COPY stream')
+      extension = struct.unpack_from('!i', self.buffer, len(COPY_SIGNATURE) + 4)[0]
+      offset = len(COPY_SIGNATURE) + 8 + extension
+      if len(self.buffer) < offset:
+        return len(data)
+      self.header = True
+    while not self.done and len(self.buffer) - offset >= 2:
+      nfields = struct.unpack_from('!h', self.buffer, offset)[0]
+      if nfields == -1:
+        self.done = True
+        offset += 2
+        break
+      fields = []
+      position = offset + 2
+      for _ in range(nfields):
+        if len(self.buffer) - position < 4:
+          break
+        length = struct.unpack_from('!i', self.buffer, position)[0]
+        position += 4
+        if length < 0:
+          fields.append(None)
+          continue
+        if len(self.buffer) - position < length:
+          break
+        fields.append(bytes(self.buffer[position:position + length]))
+        position += length
+      if len(fields) < nfields:
+        # The rest of the tuple has not arrived yet
+        break
+      self.callback(fields)
+      self.count += 1
+      offset = position
+    del self.buffer[:offset]
+    return len(data)
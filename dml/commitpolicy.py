@@ -0,0 +1,182 @@
+"""Controls how often the insert functions commit to the database"""
+import weakref
+from contextlib import contextmanager
+from idcache import cache
+
+class CommitPolicy(object):
+  """Commit policy shared by the insert functions
+
+  .. _commit_policy_class:
+
+  :param mode: *required.* when to commit. One of
+    ``'row'`` (after every row),
+    ``'batch'`` (after every ``batch_size`` rows and at the end of each file),
+    ``'file'`` (at the end of each file), or
+    ``'load'`` (only when :meth:`finish` is called)
+  :type mode: string
+  :param batch_size: number of rows per commit in ``'batch'`` mode
+  :type batch_size: integer
+
+  Rows written outside of :meth:`file`, such as by :func:`getorcreate.get_or_create`
+  or a single insert, count as a file of their own and are committed at once, except
+  in ``'load'`` mode, where nothing is committed until :meth:`finish`.
+
+  A policy also keeps one cursor per connection, which the insert functions reuse
+  instead of opening and closing a cursor for every row. Pending rows and open files
+  are counted per connection too, so one policy, such as :data:`DEFAULT`, can be
+  shared by connections used at once from several threads.
+
+  :example:
+    .. code-block:: python
+
+      policy = CommitPolicy('load')
+      # In 'load' mode wrap the whole load, so that a failure rolls back everything
+      with policy.file(conn):
+        insert.insert_lines_from_file(conn, lineFile, populationID, policy)
+        insert.insert_variants_from_file(conn, posFile, speciesID, chromosomeID, policy=policy)
+      policy.finish(conn)
+  """
+  ROW = 'row'
+  BATCH = 'batch'
+  FILE = 'file'
+  LOAD = 'load'
+  MODES = (ROW, BATCH, FILE, LOAD)
+
+  def __init__(self, mode=ROW, batch_size=1000):
+    if mode not in self.MODES:
+      raise ValueError('Commit mode must be one of %s, not %r' % (', '.join(self.MODES), mode))
+    if batch_size < 1:
+      raise ValueError('Batch size must be positive, not %r' % batch_size)
+    self.mode = mode
+    self.batch_size = batch_size
+    self.pending = weakref.WeakKeyDictionary()
+    self.depth = weakref.WeakKeyDictionary()
+    self.cursors = weakref.WeakKeyDictionary()
+    self.hooks = weakref.WeakKeyDictionary()
+
+  def __repr__(self):
+    return "<%s: {mode = %r, batch_size = %r, pending = %r}>" % (self.__class__.__name__, self.mode, self.batch_size, sum(self.pending.values()))
+
+  def cursor(self, conn):
+    """Returns the cursor kept for a connection, opening a new one if needed
+
+      :param conn: psycopg2 connection
+      :type conn: connection object
+      :return: cursor
+      :rtype: cursor object
+    """
+    cur = self.cursors.get(conn)
+    if cur is None or cur.closed:
+      cur = conn.cursor()
+      self.cursors[conn] = cur
+    return cur
+
+  def after_commit(self, conn, callback, *args):
+    """Runs a function once the policy next commits a connection
+
+      For work that must not see uncommitted rows, such as dropping cached copies of
+      them. A function added more than once with the same arguments runs once, and
+      nothing runs if the transaction is rolled back instead.
+
+      :param conn: psycopg2 connection
+      :type conn: connection object
+      :param callback: function to call
+      :type callback: function
+      :param args: arguments to call it with
+    """
+    hooks = self.hooks.setdefault(conn, [])
+    if (callback, args) not in hooks:
+      hooks.append((callback, args))
+
+  def commit(self, conn):
+    """Commits the current transaction, then runs the functions added by :meth:`after_commit`
+
+      :param conn: psycopg2 connection
+      :type conn: connection object
+    """
+    conn.commit()
+    self.pending.pop(conn, None)
+    for callback, args in self.hooks.pop(conn, []):
+      callback(*args)
+
+  def rollback(self, conn):
+    """Rolls back the current transaction
+
+      Also clears the :ref:`ID cache <id_cache_class>`, which may hold IDs of rows
+      that no longer exist
+
+      :param conn: psycopg2 connection
+      :type conn: connection object
+    """
+    conn.rollback()
+    cache.clear()
+    self.pending.pop(conn, None)
+    self.hooks.pop(conn, None)
+
+  def row(self, conn, count=1):
+    """Records written rows, committing if the policy calls for it
+
+      Outside of :meth:`file`, rows are committed at once unless the policy is ``'load'``
+
+      :param conn: psycopg2 connection
+      :type conn: connection object
+      :param count: number of rows written
+      :type count: integer
+    """
+    self.pending[conn] = self.pending.get(conn, 0) + count
+    if self.mode == self.ROW or (self.mode == self.BATCH and self.pending[conn] >= self.batch_size):
+      self.commit(conn)
+    elif self.depth.get(conn, 0) == 0 and self.mode != self.LOAD:
+      self.commit(conn)
+
+  @contextmanager
+  def file(self, conn):
+    """Wraps the loading of one file
+
+      Commits at the end of the file unless the policy is ``'load'``. If loading
+      the file fails, everything not yet committed is rolled back. When a loader
+      calls another loader on the same connection, only the outermost one commits
+      or rolls back.
+
+      :param conn: psycopg2 connection
+      :type conn: connection object
+    """
+    self.depth[conn] = self.depth.get(conn, 0) + 1
+    try:
+      yield self
+    except Exception:
+      if self.leave(conn) == 0:
+        self.rollback(conn)
+      raise
+    if self.leave(conn) == 0 and self.mode != self.LOAD:
+      self.commit(conn)
+
+  def leave(self, conn):
+    """Records the end of a file on a connection
+
+      :param conn: psycopg2 connection
+      :type conn: connection object
+      :return: number of files still open on the connection
+      :rtype: integer
+    """
+    depth = self.depth[conn] - 1
+    if depth:
+      self.depth[conn] = depth
+    else:
+      del self.depth[conn]
+    return depth
+
+  def finish(self, conn):
+    """Commits whatever is pending and closes the cursor kept for a connection
+
+      :param conn: psycopg2 connection
+      :type conn: connection object
+    """
+    self.commit(conn)
+    cur = self.cursors.pop(conn, None)
+    if cur is not None and not cur.closed:
+      cur.close()
+
+
+# Per-row commits, which is how the insert functions have always behaved
+DEFAULT = CommitPolicy(CommitPolicy.ROW)
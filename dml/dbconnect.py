@@ -1,13 +1,30 @@
 """This module helps connect to a PostgreSQL database"""
 from configparser import ConfigParser
+import contextlib
+from contextlib import contextmanager
+import atexit
+import json
+import math
+import os
+import re
+import threading
+import time
+import weakref
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
 import sys
+from idcache import cache
+
+# Parsed .ini sections, keyed by (absolute path, section), with the file's modification time
+parsedConfigs = {}
 
 # Use the parameters in database.ini to configure the database connection
 def config(filename='database.ini', section='postgresql'):
   """Parses ini file 
 
-    This function parsers out the PostgreSQL credentials from input .ini
+    This function parsers out the PostgreSQL credentials from input .ini.
+    Each section is parsed once and reused until the file changes.
 
     :param filename: input file
     :type filename: str
@@ -27,6 +44,14 @@ def config(filename='database.ini', section='postgresql'):
         host=localhost
         port=5432
   """
+  key = (os.path.abspath(filename), section)
+  try:
+    mtime = os.path.getmtime(filename)
+  except OSError:
+    mtime = None
+  if key in parsedConfigs and parsedConfigs[key][0] == mtime:
+    return dict(parsedConfigs[key][1])
+
   # create a parser
   parser = ConfigParser()
   # read config file
@@ -41,14 +66,17 @@ def config(filename='database.ini', section='postgresql'):
   else:
     raise Exception('Section {0} not found in the {1} file'.format(section, filename))
 
-  return db
+  parsedConfigs[key] = (mtime, db)
+  return dict(db)
 
 # Return a connection to the database
-def connect():
+def connect(instrument=None):
   """Creates connection object to database 
 
     This function creates a connection object to database
 
+    :param instrument: record every statement in :data:`queryStats`, defaults to whether :func:`enable_instrumentation` has been called
+    :type instrument: boolean
     :return: connection to database
     :rtype: connection object
   """
@@ -60,7 +88,7 @@ def connect():
 
     # connect to the PostgreSQL server
     print('Connection to the PostgreSQL database...')
-    conn = psycopg2.connect(**params)
+    conn = psycopg2.connect(connection_factory=connection_factory(instrument), **params)
 
     # create a cursor
     cur = conn.cursor()
@@ -78,3 +106,441 @@ def connect():
     sys.exit(1)
   
   return conn
+
+
+
+class StatementStats(object):
+  """Latency of one statement issued from one function
+
+  Latencies are counted in a histogram with one bucket per power of two microseconds,
+  so percentiles are accurate to within a factor of two whatever the number of calls
+  """
+  def __init__(self):
+    self.count = 0
+    self.total = 0.0
+    self.rows = 0
+    self.max = 0.0
+    self.buckets = {}
+
+  def add(self, seconds, rows):
+    self.count += 1
+    self.total += seconds
+    self.rows += max(rows, 0)
+    self.max = max(self.max, seconds)
+    bucket = max(0, int(math.log2(max(seconds * 1e6, 1))))
+    self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+  def percentile(self, fraction):
+    """Estimates a latency percentile
+
+      :param fraction: percentile as a fraction, e.g. 0.99
+      :type fraction: float
+      :return: upper bound of the bucket holding the percentile, in seconds
+      :rtype: float
+    """
+    seen = 0
+    for bucket in sorted(self.buckets):
+      seen += self.buckets[bucket]
+      if seen >= fraction * self.count:
+        return min(2.0 ** (bucket + 1) / 1e6, self.max)
+    return self.max
+
+  def report(self):
+    return {
+      'count': self.count,
+      'total_s': self.total,
+      'mean_s': self.total / self.count if self.count else 0.0,
+      'rows': self.rows,
+      'p50_s': self.percentile(0.5),
+      'p90_s': self.percentile(0.9),
+      'p99_s': self.percentile(0.99),
+      'max_s': self.max,
+      'histogram_us': dict(('<%d' % 2 ** (bucket + 1), n) for bucket, n in sorted(self.buckets.items())),
+    }
+
+
+class QueryStats(object):
+  """Statement latencies of the instrumented connections in this process
+
+  .. _query_stats_class:
+
+  :param slow_threshold: seconds after which a statement is recorded as slow
+  :type slow_threshold: float
+  :param max_slow: number of slow statements kept, the most recent ones
+  :type max_slow: integer
+
+  Statements are grouped by the function that issued them (the nearest caller outside
+  of dbconnect.py, prepared.py, commitpolicy.py and psycopg2) and by their text with whitespace
+  collapsed. Prepared statements are grouped by name.
+  """
+  def __init__(self, slow_threshold=1.0, max_slow=100):
+    self.slow_threshold = slow_threshold
+    self.max_slow = max_slow
+    self.statements = {}
+    self.slow = []
+    self.lock = threading.Lock()
+
+  def __repr__(self):
+    return "<%s: {slow_threshold = %r, statements = %r}>" % (self.__class__.__name__, self.slow_threshold, len(self.statements))
+
+  def record(self, caller, statement, seconds, rows):
+    """Records one statement
+
+      :param caller: ``module.function`` that issued the statement
+      :type caller: string
+      :param statement: normalized statement text
+      :type statement: string
+      :param seconds: time the statement took
+      :type seconds: float
+      :param rows: number of rows it returned or affected, or -1 if unknown
+      :type rows: integer
+    """
+    with self.lock:
+      stats = self.statements.get((caller, statement))
+      if stats is None:
+        stats = self.statements[(caller, statement)] = StatementStats()
+      stats.add(seconds, rows)
+      if seconds >= self.slow_threshold:
+        self.slow.append({'caller': caller, 'statement': statement, 'seconds': seconds, 'rows': rows, 'at': time.time()})
+        del self.slow[:-self.max_slow]
+
+  def reset(self):
+    """Forgets everything recorded so far"""
+    with self.lock:
+      self.statements.clear()
+      del self.slow[:]
+
+  def report(self):
+    """Summarizes the recorded statements, slowest in total first
+
+      :return: ``statements`` (one entry per caller and statement) and ``slow`` (statements over the threshold)
+      :rtype: dict
+    """
+    with self.lock:
+      statements = [dict(caller=caller, statement=statement, **stats.report())
+                    for (caller, statement), stats in self.statements.items()]
+      slow = list(self.slow)
+    statements.sort(key=lambda s: s['total_s'], reverse=True)
+    return {'pid': os.getpid(), 'slow_threshold_s': self.slow_threshold, 'statements': statements, 'slow': slow}
+
+  def dump(self, filename):
+    """Writes the report as JSON
+
+      :param filename: output file; ``{pid}`` is replaced by the process ID
+      :type filename: str
+    """
+    with open(filename.format(pid=os.getpid()), 'w') as f:
+      json.dump(self.report(), f, indent=2)
+
+
+# Statement latencies of this process, or None until enable_instrumentation() is called
+queryStats = None
+
+# Frames from these files are skipped when looking for the function that issued a statement
+INSTRUMENTATION_FILES = tuple(os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+                              for name in ('dbconnect.py', 'prepared.py', 'commitpolicy.py')) + (os.path.abspath(contextlib.__file__),)
+
+def enable_instrumentation(filename=None, slow_threshold=1.0):
+  """Starts recording the statements of every connection opened from now on
+
+    :param filename: JSON file to write the report to when the process exits; ``{pid}`` is replaced by the process ID
+    :type filename: str
+    :param slow_threshold: seconds after which a statement is recorded as slow
+    :type slow_threshold: float
+    :return: statement latencies, which can be reported or dumped at any time
+    :rtype: :ref:`QueryStats <query_stats_class>` object
+
+    :example:
+      .. code-block:: python
+
+        stats = dbconnect.enable_instrumentation('querystats.{pid}.json', slow_threshold=0.5)
+        conn = dbconnect.connect()
+        insert.insert_phenotypes_from_file(conn, phenotypeFile, populationID)
+        stats.dump('phenotypes.json')
+  """
+  global queryStats
+  if queryStats is None:
+    queryStats = QueryStats(slow_threshold)
+  queryStats.slow_threshold = slow_threshold
+  if filename is not None:
+    atexit.register(queryStats.dump, filename)
+  return queryStats
+
+# Literals that statement_label() replaces with ?: strings (including array literals such as
+# '{1,2}'), ARRAY[...] constructors, and numbers that are not part of a name or a $1 parameter
+LITERAL_PATTERNS = [
+  (re.compile(r"[Ee]?'(?:[^']|'')*'"), '?'),
+  (re.compile(r'ARRAY\[[^\[\]]*\]'), 'ARRAY[?]'),
+  (re.compile(r'(?<![\w$.])\d+(?:\.\d+)?(?:[eE][-+]?\d+)?'), '?'),
+  (re.compile(r'\?(?:\s*,\s*\?)+'), '?'),
+]
+
+def statement_label(statement):
+  """Normalizes a statement so that repeated executions are grouped together
+
+    Prepared statements are labelled by name, and the literals of other statements,
+    such as those built with ``cur.mogrify``, are replaced with ``?``
+
+    :param statement: statement as sent to the server
+    :type statement: str or bytes
+    :return: label
+    :rtype: str
+  """
+  if isinstance(statement, bytes):
+    statement = statement.decode('utf-8', 'replace')
+  statement = ' '.join(statement.split())
+  match = re.match(r'EXECUTE (\w+)', statement)
+  if match:
+    return 'EXECUTE ' + match.group(1)
+  for pattern, placeholder in LITERAL_PATTERNS:
+    statement = pattern.sub(placeholder, statement)
+  return statement[:200]
+
+def calling_function():
+  """Finds the function that issued a statement
+
+    :return: ``module.function``
+    :rtype: str
+  """
+  frame = sys._getframe(2)
+  while frame is not None:
+    filename = os.path.abspath(frame.f_code.co_filename)
+    if filename not in INSTRUMENTATION_FILES and 'psycopg2' not in filename:
+      return '%s.%s' % (os.path.splitext(os.path.basename(filename))[0], frame.f_code.co_name)
+    frame = frame.f_back
+  return '?'
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+  """Cursor that records the latency of every statement in :data:`queryStats`"""
+  def timed(self, label, method, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+      return method(*args, **kwargs)
+    finally:
+      if queryStats is not None:
+        queryStats.record(calling_function(), label, time.perf_counter() - start, self.rowcount)
+
+  def execute(self, query, vars=None):
+    return self.timed(statement_label(query), super(InstrumentedCursor, self).execute, query, vars)
+
+  def executemany(self, query, vars_list):
+    return self.timed(statement_label(query), super(InstrumentedCursor, self).executemany, query, vars_list)
+
+  def copy_expert(self, sql, file, size=8192):
+    return self.timed(statement_label(sql), super(InstrumentedCursor, self).copy_expert, sql, file, size)
+
+  def copy_from(self, file, table, *args, **kwargs):
+    return self.timed('COPY %s FROM' % table, super(InstrumentedCursor, self).copy_from, file, table, *args, **kwargs)
+
+  def copy_to(self, file, table, *args, **kwargs):
+    return self.timed('COPY %s TO' % table, super(InstrumentedCursor, self).copy_to, file, table, *args, **kwargs)
+
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+  """Connection whose cursors are :class:`InstrumentedCursor` and whose commits are timed"""
+  def __init__(self, *args, **kwargs):
+    super(InstrumentedConnection, self).__init__(*args, **kwargs)
+    self.cursor_factory = InstrumentedCursor
+
+  def commit(self):
+    start = time.perf_counter()
+    try:
+      return super(InstrumentedConnection, self).commit()
+    finally:
+      if queryStats is not None:
+        queryStats.record(calling_function(), 'COMMIT', time.perf_counter() - start, -1)
+
+def connection_factory(instrument=None):
+  """Chooses the connection class
+
+    :param instrument: whether to record statements, defaults to whether :func:`enable_instrumentation` has been called
+    :type instrument: boolean
+    :return: connection class
+    :rtype: class
+  """
+  if instrument is None:
+    instrument = queryStats is not None
+  elif instrument and queryStats is None:
+    enable_instrumentation()
+  return InstrumentedConnection if instrument else psycopg2.extensions.connection
+
+
+class ConnectionPool(object):
+  """Pool of connections to the database, shared by the threads of one process
+
+  .. _connection_pool_class:
+
+  :param minconn: number of connections opened up front and kept open
+  :type minconn: integer
+  :param maxconn: most connections open at once
+  :type maxconn: integer
+  :param filename: input .ini file
+  :type filename: str
+  :param section: section within .ini
+  :type section: str
+  :param instrument: record every statement in :data:`queryStats`, defaults to whether :func:`enable_instrumentation` has been called
+  :type instrument: boolean
+
+  Every connection is checked with ``SELECT 1`` when it is checked out, and
+  replaced if the check fails. A pool belongs to the process that created it;
+  use :func:`get_pool` to get one that is safe to use after a fork. In a forked
+  child, every pool of the parent is disowned (see :meth:`disown`).
+  """
+  def __init__(self, minconn=1, maxconn=10, filename='database.ini', section='postgresql', instrument=None):
+    if minconn < 0 or maxconn < max(minconn, 1):
+      raise ValueError('Pool size must satisfy 0 <= minconn <= maxconn and maxconn >= 1, not %r, %r' % (minconn, maxconn))
+    self.minconn = minconn
+    self.maxconn = maxconn
+    self.pid = os.getpid()
+    self.pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, connection_factory=connection_factory(instrument), **config(filename, section))
+    pools.add(self)
+
+  def __repr__(self):
+    return "<%s: {minconn = %r, maxconn = %r, pid = %r}>" % (self.__class__.__name__, self.minconn, self.maxconn, self.pid)
+
+  def healthy(self, conn):
+    """Checks that a connection still works
+
+      :param conn: psycopg2 connection
+      :type conn: connection object
+      :return: whether the connection answered ``SELECT 1``
+      :rtype: boolean
+    """
+    if conn.closed:
+      return False
+    try:
+      cur = conn.cursor()
+      cur.execute('SELECT 1;')
+      cur.fetchone()
+      cur.close()
+      conn.rollback()
+      return True
+    except psycopg2.Error:
+      return False
+
+  def getconn(self):
+    """Checks out a working connection
+
+      :return: connection to database
+      :rtype: connection object
+      :raises: :exc:`psycopg2.pool.PoolError` if all ``maxconn`` connections are checked out
+    """
+    # Every connection in the pool may have gone stale, e.g. after a server restart
+    for _ in range(self.maxconn + 1):
+      conn = self.pool.getconn()
+      if self.healthy(conn):
+        return conn
+      self.pool.putconn(conn, close=True)
+    raise psycopg2.OperationalError('Unable to get a working connection from the pool')
+
+  def putconn(self, conn, close=False):
+    """Returns a connection to the pool, rolling back any open transaction
+
+      :param conn: psycopg2 connection
+      :type conn: connection object
+      :param close: close the connection instead of keeping it
+      :type close: boolean
+    """
+    self.pool.putconn(conn, close=close or bool(conn.closed))
+
+  def closeall(self):
+    """Closes every connection in the pool"""
+    self.pool.closeall()
+
+  def disown(self):
+    """Cuts a forked child off from the connections of a pool it inherited
+
+      Closing a connection, which psycopg2 also does when it is garbage collected,
+      tells the server to end the session, and the parent still uses these sessions.
+      This function points the child's copy of each connection's socket at
+      ``/dev/null`` instead, so closing the connection in the child reaches nothing.
+      The pool must not be used afterwards.
+    """
+    devnull = os.open(os.devnull, os.O_RDWR)
+    try:
+      for conn in list(self.pool._pool) + list(self.pool._used.values()):
+        if not conn.closed:
+          os.dup2(devnull, conn.fileno())
+    finally:
+      os.close(devnull)
+
+
+# Every pool created in this process or inherited from its parent
+pools = weakref.WeakSet()
+# Pools inherited from the parent process, disowned and kept referenced so that they are never closed
+inheritedPools = []
+# Pool used by pooled_connection(), created on first use in each process
+defaultPool = None
+
+def disown_inherited_pools():
+  """Disowns every pool inherited from the parent process
+
+    Runs in every child right after a fork. The pools are kept in
+    :data:`inheritedPools`, and :func:`get_pool` creates a new one for the child.
+  """
+  global defaultPool
+  pid = os.getpid()
+  for pool in list(pools):
+    if pool.pid != pid:
+      pool.disown()
+      pools.discard(pool)
+      inheritedPools.append(pool)
+  if defaultPool is not None and defaultPool.pid != pid:
+    defaultPool = None
+
+if hasattr(os, 'register_at_fork'):
+  os.register_at_fork(after_in_child=disown_inherited_pools)
+
+def get_pool(minconn=1, maxconn=10):
+  """Returns the pool of the current process, creating it if needed
+
+    The size is only used when the pool is created. A pool inherited from a parent
+    process is never used or closed, since its connections belong to the parent
+    (see :func:`disown_inherited_pools`).
+
+    :param minconn: number of connections opened up front and kept open
+    :type minconn: integer
+    :param maxconn: most connections open at once
+    :type maxconn: integer
+    :return: pool
+    :rtype: :ref:`ConnectionPool <connection_pool_class>` object
+  """
+  global defaultPool
+  if defaultPool is not None and defaultPool.pid != os.getpid():
+    disown_inherited_pools()
+  if defaultPool is None:
+    defaultPool = ConnectionPool(minconn, maxconn)
+  return defaultPool
+
+@contextmanager
+def pooled_connection(pool=None):
+  """Checks out a connection for the duration of a ``with`` block
+
+    Commits when the block finishes and rolls back if it raises (clearing the
+    :ref:`ID cache <id_cache_class>`), then returns the connection to the pool
+
+    :param pool: pool to use, defaults to :func:`get_pool`
+    :type pool: :ref:`ConnectionPool <connection_pool_class>` object
+
+    :example:
+      .. code-block:: python
+
+        with pooled_connection() as conn:
+          traitID = find.find_trait(conn, 'weight')
+  """
+  pool = pool or get_pool()
+  conn = pool.getconn()
+  try:
+    yield conn
+    conn.commit()
+  except BaseException:
+    if not conn.closed:
+      try:
+        conn.rollback()
+      except psycopg2.Error:
+        pass
+    cache.clear()
+    raise
+  finally:
+    pool.putconn(conn)
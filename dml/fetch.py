@@ -0,0 +1,436 @@
+"""Reads genotypes, phenotypes and GWAS results back out of the database"""
+import io
+import itertools
+import binarycopy as bc
+import packedgenotype
+
+# Rows a server-side cursor fetches per round trip, and rows per chunk
+ITERSIZE = 10000
+CHUNKSIZE = 100000
+
+# Type OIDs of the columns that are turned into float and integer NumPy arrays
+FLOAT_OIDS = (700, 701)
+INTEGER_OIDS = (20, 21, 23)
+
+# Server-side cursors need names that are unique on their connection
+cursorNames = itertools.count()
+
+
+def fetch_variant_positions(conn, chromosome):
+  """Fetches the positions of every variant on a chromosome
+
+    This function returns the positions in variant_id order, which is the order of
+    the columns of the .012 file they were loaded with, and so of each genotype array
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param chromosome: :ref:`chromosome_id <chromosome_class>`
+    :type chromosome: integer
+    :return: variant_pos of each variant
+    :rtype: numpy array of int64
+  """
+  import numpy as np
+  cur = conn.cursor()
+  buf = io.StringIO()
+  SQL = cur.mogrify("COPY (SELECT variant_pos FROM variant WHERE variant_chromosome = %s ORDER BY variant_id) TO STDOUT;", (chromosome,))
+  cur.copy_expert(SQL.decode(), buf)
+  cur.close()
+  buf.seek(0)
+  return np.loadtxt(buf, dtype=np.int64, ndmin=1)
+
+
+def genotype_lines(conn, genotype_version, chromosome, lines=None):
+  """Chooses the lines whose genotypes are fetched
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param genotype_version: :ref:`genotype_version_id <genotype_version_class>`
+    :type genotype_version: integer
+    :param chromosome: :ref:`chromosome_id <chromosome_class>`
+    :type chromosome: integer
+    :param lines: :ref:`line_id <line_class>` of each row, in order; defaults to every line genotyped for the chromosome, by line_id
+    :type lines: list of integers
+    :return: line_id of each row
+    :rtype: list of integers
+  """
+  if lines is not None:
+    lines = [int(line) for line in lines]
+    if len(set(lines)) != len(lines):
+      raise ValueError('Lines must not repeat')
+    return lines
+  cur = conn.cursor()
+  cur.execute("SELECT genotype_line FROM genotype WHERE genotype_genotype_version = %s AND genotype_chromosome = %s ORDER BY genotype_line;", (genotype_version, chromosome))
+  lines = [row[0] for row in cur.fetchall()]
+  cur.close()
+  return lines
+
+
+def copy_genotype_rows(conn, genotype_version, chromosome, lines, ncolumns, indices=None):
+  """Copies genotype rows into a preallocated lines x columns matrix
+
+    This function streams the rows of every line through one binary COPY and decodes
+    each tinyint[] straight into its row of the matrix, without building a Python
+    object per call. Packed genotypes are sent packed and unpacked here. If ``indices``
+    are given, the server slices each array with ``array_multi_index`` (or
+    ``genotype_packed_index``) so that only those calls are sent.
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param genotype_version: :ref:`genotype_version_id <genotype_version_class>`
+    :type genotype_version: integer
+    :param chromosome: :ref:`chromosome_id <chromosome_class>`
+    :type chromosome: integer
+    :param lines: :ref:`line_id <line_class>` of each row
+    :type lines: list of integers
+    :param ncolumns: number of calls per row
+    :type ncolumns: integer
+    :param indices: 1-based indices into the genotype arrays, one per column
+    :type indices: list of integers
+    :return: allele calls
+    :rtype: numpy array of int8
+    :raises: :exc:`ValueError` if a line has no genotype, or a genotype does not have ``ncolumns`` calls
+  """
+  import numpy as np
+  rowIndex = dict((line, row) for row, line in enumerate(lines))
+  matrix = np.empty((len(lines), ncolumns), dtype=np.int8)
+  filled = np.zeros(len(lines), dtype=bool)
+
+  def decode_row(fields):
+    row = rowIndex[bc.decode_integer(fields[0])]
+    try:
+      if fields[1] is None:
+        packedgenotype.unpack_calls(fields[2], out=matrix[row])
+      else:
+        bc.decode_tinyint_array(fields[1], out=matrix[row])
+    except ValueError as err:
+      raise ValueError('Genotype of line %s on chromosome %s does not have %d calls: %s' % (lines[row], chromosome, ncolumns, err))
+    filled[row] = True
+
+  cur = conn.cursor()
+  if indices is None:
+    SQL = cur.mogrify("""COPY (SELECT genotype_line, genotype, genotype_packed FROM genotype
+          WHERE genotype_genotype_version = %s AND genotype_chromosome = %s AND genotype_line = ANY(%s))
+          TO STDOUT WITH (FORMAT binary);""", (genotype_version, chromosome, lines))
+  else:
+    indices = [int(i) for i in indices]
+    SQL = cur.mogrify("""COPY (SELECT genotype_line, COALESCE(array_multi_index(genotype, %s::integer[]), genotype_packed_index(genotype_packed, %s::integer[])), NULL::bytea FROM genotype
+          WHERE genotype_genotype_version = %s AND genotype_chromosome = %s AND genotype_line = ANY(%s))
+          TO STDOUT WITH (FORMAT binary);""", (indices, indices, genotype_version, chromosome, lines))
+  cur.copy_expert(SQL.decode(), bc.CopyDecoder(decode_row))
+  cur.close()
+
+  if not filled.all():
+    missing = [lines[row] for row in np.flatnonzero(~filled)]
+    raise ValueError('No genotype for %d line(s) on chromosome %s in genotype version %s: %s' % (len(missing), chromosome, genotype_version, ', '.join(str(line) for line in missing)))
+  return matrix
+
+
+def genotype_stamp(conn, genotype_version, chromosome):
+  """Identifies the genotypes of a chromosome as they are now
+
+    The stamp changes whenever genotype rows of the chromosome are inserted or
+    deleted, so anything derived from them can be checked against it before it is
+    reused. Rows updated in place are not noticed; the loaders never update genotypes.
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param genotype_version: :ref:`genotype_version_id <genotype_version_class>`
+    :type genotype_version: integer
+    :param chromosome: :ref:`chromosome_id <chromosome_class>`
+    :type chromosome: integer
+    :return: number of genotype rows and highest genotype_id, as ``'<count>.<max>'``
+    :rtype: string
+  """
+  cur = conn.cursor()
+  cur.execute("SELECT count(*), max(genotype_id) FROM genotype WHERE genotype_genotype_version = %s AND genotype_chromosome = %s;", (genotype_version, chromosome))
+  count, maxID = cur.fetchone()
+  cur.close()
+  return '%d.%d' % (count, maxID or 0)
+
+
+def fetch_genotype_matrix(conn, genotype_version, chromosome, lines=None):
+  """Fetches the genotypes of one chromosome as a lines x variants matrix
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param genotype_version: :ref:`genotype_version_id <genotype_version_class>`
+    :type genotype_version: integer
+    :param chromosome: :ref:`chromosome_id <chromosome_class>`
+    :type chromosome: integer
+    :param lines: :ref:`line_id <line_class>` of each row, in order; defaults to every line genotyped for the chromosome, by line_id
+    :type lines: list of integers
+    :return: allele calls (one row per line, one column per variant in order of variant_pos), line_id of each row, variant_pos of each column
+    :rtype: tuple of (numpy array of int8, list of integers, numpy array of int64)
+    :raises: :exc:`ValueError` if a requested line has no genotype, or a genotype does not have one call per variant
+  """
+  import numpy as np
+  positions = fetch_variant_positions(conn, chromosome)
+  lines = genotype_lines(conn, genotype_version, chromosome, lines)
+  matrix = copy_genotype_rows(conn, genotype_version, chromosome, lines, positions.shape[0])
+  # Columns follow the .pos file, which vcftools writes sorted; only reorder if it was not
+  if positions.shape[0] > 1 and (np.diff(positions) < 0).any():
+    order = np.argsort(positions, kind='stable')
+    matrix = matrix[:, order]
+    positions = positions[order]
+  return matrix, lines, positions
+
+
+def find_variant_indices(conn, chromosome, start=None, end=None, positions=None):
+  """Maps a region or a list of variants to indices into the genotype arrays
+
+    This function numbers the variants of a chromosome in variant_id order, which is
+    the order of the calls in each genotype array, and picks out either every variant
+    with ``start <= variant_pos <= end`` (ordered by position) or the variants at
+    ``positions`` (in the order given)
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param chromosome: :ref:`chromosome_id <chromosome_class>`
+    :type chromosome: integer
+    :param start: first base pair of the region
+    :type start: integer
+    :param end: last base pair of the region
+    :type end: integer
+    :param positions: variant_pos of each variant, instead of a region
+    :type positions: list of integers
+    :return: 1-based index of each variant, variant_pos of each variant
+    :rtype: tuple of (list of integers, list of integers)
+    :raises: :exc:`ValueError` if neither or both of a region and positions are given, or a position is not a variant of the chromosome
+  """
+  if (positions is None) == (start is None or end is None):
+    raise ValueError('Give either start and end, or positions')
+  cur = conn.cursor()
+  if positions is None:
+    cur.execute("""SELECT i, variant_pos FROM (
+          SELECT variant_pos, row_number() OVER (ORDER BY variant_id) AS i FROM variant WHERE variant_chromosome = %s) v
+        WHERE variant_pos BETWEEN %s AND %s
+        ORDER BY variant_pos, i;""", (chromosome, start, end))
+    rows = cur.fetchall()
+  else:
+    positions = [int(position) for position in positions]
+    cur.execute("""SELECT i, variant_pos FROM (
+          SELECT variant_pos, row_number() OVER (ORDER BY variant_id) AS i FROM variant WHERE variant_chromosome = %s) v
+        WHERE variant_pos = ANY(%s);""", (chromosome, positions))
+    found = dict((position, i) for i, position in cur.fetchall())
+    missing = [position for position in positions if position not in found]
+    if missing:
+      raise ValueError('%d position(s) are not variants of chromosome %s: %s' % (len(missing), chromosome, ', '.join(str(position) for position in missing[:20])))
+    rows = [(found[position], position) for position in positions]
+  cur.close()
+  return [i for i, _ in rows], [position for _, position in rows]
+
+
+def fetch_genotype_region(conn, genotype_version, chromosome, start=None, end=None, positions=None, lines=None):
+  """Fetches the genotypes of a region, or of chosen variants, as a lines x variants matrix
+
+    This function slices every genotype array on the server with ``array_multi_index``,
+    so only the calls of the selected variants cross the wire, and fetches all lines
+    with one query
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param genotype_version: :ref:`genotype_version_id <genotype_version_class>`
+    :type genotype_version: integer
+    :param chromosome: :ref:`chromosome_id <chromosome_class>`
+    :type chromosome: integer
+    :param start: first base pair of the region
+    :type start: integer
+    :param end: last base pair of the region
+    :type end: integer
+    :param positions: variant_pos of each variant to fetch, in column order, instead of a region
+    :type positions: list of integers
+    :param lines: :ref:`line_id <line_class>` of each row, in order; defaults to every line genotyped for the chromosome, by line_id
+    :type lines: list of integers
+    :return: allele calls, line_id of each row, variant_pos of each column
+    :rtype: tuple of (numpy array of int8, list of integers, numpy array of int64)
+
+    :example:
+      .. code-block:: python
+
+        # The calls of every line in a 1 Mb window of chromosome 10
+        matrix, lines, positions = fetch.fetch_genotype_region(conn, versionID, chr10ID, 5000000, 5999999)
+  """
+  import numpy as np
+  indices, positions = find_variant_indices(conn, chromosome, start, end, positions)
+  lines = genotype_lines(conn, genotype_version, chromosome, lines)
+  if indices:
+    matrix = copy_genotype_rows(conn, genotype_version, chromosome, lines, len(indices), indices)
+  else:
+    matrix = np.empty((len(lines), 0), dtype=np.int8)
+  return matrix, lines, np.array(positions, dtype=np.int64)
+
+
+def server_cursor(conn, itersize=ITERSIZE):
+  """Opens a named, server-side cursor
+
+    Rows of a query run on this cursor stay on the server until they are fetched,
+    ``itersize`` at a time when iterating. The cursor lives in the current
+    transaction, so the connection must not be in autocommit mode.
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param itersize: rows fetched per round trip
+    :type itersize: integer
+    :return: named cursor
+    :rtype: cursor object
+  """
+  cur = conn.cursor(name='baxdb_stream_%d' % next(cursorNames))
+  cur.itersize = itersize
+  return cur
+
+
+def stream_rows(conn, SQL, args=None, itersize=ITERSIZE):
+  """Runs a query and yields its rows as they arrive
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param SQL: query with ``%s`` placeholders
+    :type SQL: string
+    :param args: value of each placeholder
+    :type args: tuple
+    :param itersize: rows fetched per round trip
+    :type itersize: integer
+    :return: rows
+    :rtype: generator of tuples
+  """
+  cur = server_cursor(conn, itersize)
+  try:
+    cur.execute(SQL, args)
+    for row in cur:
+      yield row
+  finally:
+    cur.close()
+
+
+def chunk_arrays(rows, description):
+  """Turns a chunk of rows into one NumPy array per column
+
+    Float columns become float64 arrays with NULL as NaN, integer columns without
+    NULLs become int64 arrays, and every other column an object array
+
+    :param rows: rows of a chunk
+    :type rows: list of tuples
+    :param description: ``description`` of the cursor the rows came from
+    :type description: sequence of Column objects
+    :return: array of each column, keyed by column name
+    :rtype: dict
+  """
+  import numpy as np
+  arrays = {}
+  for i, column in enumerate(description):
+    values = [row[i] for row in rows]
+    if column.type_code in FLOAT_OIDS:
+      arrays[column.name] = np.array(values, dtype=np.float64)
+    elif column.type_code in INTEGER_OIDS and None not in values:
+      arrays[column.name] = np.array(values, dtype=np.int64)
+    else:
+      array = np.empty(len(values), dtype=object)
+      array[:] = values
+      arrays[column.name] = array
+  return arrays
+
+
+def stream_chunks(conn, SQL, args=None, chunksize=CHUNKSIZE, output='pandas'):
+  """Runs a query and yields its rows in chunks as they arrive
+
+    At most one chunk is held in client memory at a time, however many rows the
+    query returns
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param SQL: query with ``%s`` placeholders
+    :type SQL: string
+    :param args: value of each placeholder
+    :type args: tuple
+    :param chunksize: rows per chunk
+    :type chunksize: integer
+    :param output: ``'pandas'`` for DataFrames, ``'numpy'`` for dicts of column arrays (see :func:`chunk_arrays`), or ``'rows'`` for lists of tuples
+    :type output: string
+    :return: chunks
+    :rtype: generator
+    :raises: :exc:`ValueError` if output is not one of the above
+  """
+  if output not in ('pandas', 'numpy', 'rows'):
+    raise ValueError("Output must be 'pandas', 'numpy' or 'rows', not %r" % output)
+  if output == 'pandas':
+    import pandas as pd
+  cur = server_cursor(conn, chunksize)
+  try:
+    cur.execute(SQL, args)
+    while True:
+      rows = cur.fetchmany(chunksize)
+      if not rows:
+        break
+      if output == 'pandas':
+        yield pd.DataFrame.from_records(rows, columns=[column.name for column in cur.description])
+      elif output == 'numpy':
+        yield chunk_arrays(rows, cur.description)
+      else:
+        yield rows
+  finally:
+    cur.close()
+
+
+def stream_gwas_results(conn, genotype_version, chunksize=None, output='pandas', itersize=ITERSIZE):
+  """Streams the GWAS results of every run on a genotype version
+
+    This function yields results in the order the server finds them, starting as soon
+    as the first ones are read. P-values are returned as double precision.
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param genotype_version: :ref:`genotype_version_id <genotype_version_class>`
+    :type genotype_version: integer
+    :param chunksize: rows per chunk, or None to yield single rows
+    :type chunksize: integer
+    :param output: type of each chunk, as for :func:`stream_chunks`
+    :type output: string
+    :param itersize: rows fetched per round trip when yielding single rows
+    :type itersize: integer
+    :return: (gwas_result_id, gwas_run_id, chromosome_id, basepair, pval, cofactor, _order, null_pval, model_added_pval, model, pcs) rows, or chunks of them
+    :rtype: generator
+
+    :example:
+      .. code-block:: python
+
+        for chunk in fetch.stream_gwas_results(conn, versionID, chunksize=500000):
+          significant.append(chunk[chunk.pval < 1e-8])
+        conn.rollback()
+  """
+  SQL = """SELECT r.gwas_result_id, r.gwas_result_gwas_run, r.gwas_result_chromosome, r.basepair,
+                  r.pval::double precision AS pval, r.cofactor::double precision AS cofactor, r._order::double precision AS _order,
+                  r.null_pval::double precision AS null_pval, r.model_added_pval::double precision AS model_added_pval,
+                  r.model, r.pcs
+           FROM gwas_result r
+           JOIN gwas_run g ON g.gwas_run_id = r.gwas_result_gwas_run
+           WHERE g.gwas_run_genotype_version = %s;"""
+  if chunksize is None:
+    return stream_rows(conn, SQL, (genotype_version,), itersize)
+  return stream_chunks(conn, SQL, (genotype_version,), chunksize, output)
+
+
+def stream_phenotypes(conn, genotype_version, chunksize=None, output='pandas', itersize=ITERSIZE):
+  """Streams the phenotypes of every line in the population of a genotype version
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param genotype_version: :ref:`genotype_version_id <genotype_version_class>`
+    :type genotype_version: integer
+    :param chunksize: rows per chunk, or None to yield single rows
+    :type chunksize: integer
+    :param output: type of each chunk, as for :func:`stream_chunks`
+    :type output: string
+    :param itersize: rows fetched per round trip when yielding single rows
+    :type itersize: integer
+    :return: (phenotype_id, line_id, line_name, trait_id, trait_name, phenotype_value, phenotype_value_text) rows, or chunks of them; phenotype_value_text is None unless the value did not round-trip as a double
+    :rtype: generator
+  """
+  SQL = """SELECT p.phenotype_id, l.line_id, l.line_name, t.trait_id, t.trait_name, p.phenotype_value, p.phenotype_value_text
+           FROM genotype_version v
+           JOIN line l ON l.line_population = v.genotype_version_population
+           JOIN phenotype p ON p.phenotype_line = l.line_id
+           JOIN trait t ON t.trait_id = p.phenotype_trait
+           WHERE v.genotype_version_id = %s;"""
+  if chunksize is None:
+    return stream_rows(conn, SQL, (genotype_version,), itersize)
+  return stream_chunks(conn, SQL, (genotype_version,), chunksize, output)
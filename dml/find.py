@@ -1,13 +1,75 @@
 """Looks up IDs of various elements in the database"""
 
-import pandas as pd
-import numpy as np
-import psycopg2
-import csv
-import insert
-from dbconnect import config, connect
-from models import species, population, line, chromosome, variant, genotype, trait, phenotype, growout_type, growout, location, gwas_algorithm, genotype_version, imputation_method, kinship_algorithm, kinship, population_structure_algorithm, population_structure, gwas_run, gwas_result
+# Kept free of pandas, numpy and the other dml modules so that lookup scripts start quickly
+import functools
+import prepared
+from idcache import cache
+
+# Small tables loaded whole by prewarm_cache(): the columns that key each row, and its ID
+PREWARM_COLUMNS = {
+  'species': (('shortname',), 'species_id'),
+  'chromosome': (('chromosome_name', 'chromosome_species'), 'chromosome_id'),
+  'trait': (('trait_name',), 'trait_id'),
+  'gwas_algorithm': (('gwas_algorithm',), 'gwas_algorithm_id'),
+  'imputation_method': (('imputation_method',), 'imputation_method_id'),
+}
+
+def cached(table):
+  """Puts the :ref:`ID cache <id_cache_class>` in front of a find function
+
+    Arguments are keyed by their string form, since that is how the find functions
+    put them into their queries
+
+    :param table: name of the table the function looks up
+    :type table: string
+    :return: decorator
+    :rtype: function
+  """
+  def decorator(find_function):
+    @functools.wraps(find_function)
+    def wrapper(conn, *args):
+      key = tuple(str(arg) for arg in args)
+      ID = cache.get(conn, table, key)
+      if ID is None:
+        shared = cache.idle(conn)
+        ID = find_function(conn, *args)
+        if ID is not None:
+          cache.put(conn, table, key, ID, shared)
+      return ID
+    return wrapper
+  return decorator
+
+def prewarm_cache(conn, tables=None):
+  """Loads small tables into the ID cache
+
+    This function reads every row of the tables with a single query, so that later
+    lookups in them do not reach the database
 
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param tables: names of tables, defaults to species, chromosome, trait, gwas_algorithm and imputation_method
+    :type tables: list of strings
+    :return: number of IDs cached, keyed by table name
+    :rtype: dict
+  """
+  tables = list(tables or PREWARM_COLUMNS)
+  unknown = [table for table in tables if table not in PREWARM_COLUMNS]
+  if unknown:
+    raise ValueError('Cannot prewarm table(s): %s' % ', '.join(unknown))
+  selects = []
+  for table in tables:
+    columns, IDcolumn = PREWARM_COLUMNS[table]
+    selects.append("SELECT '%s', ARRAY[%s], %s FROM %s" % (table, ', '.join('%s::text' % column for column in columns), IDcolumn, table))
+  shared = cache.idle(conn)
+  with conn.cursor() as cur:
+    cur.execute(' UNION ALL '.join(selects) + ';')
+    counts = dict((table, 0) for table in tables)
+    for table, key, ID in cur:
+      cache.put(conn, table, tuple(key), ID, shared)
+      counts[table] += 1
+  return counts
+
+@cached('species')
 def find_species(conn, speciesShortname):
   """Finds species by shortname 
 
@@ -20,16 +82,17 @@ def find_species(conn, speciesShortname):
     :return: species_id
     :rtype: integer
   """
-  cur = conn.cursor()
-  cur.execute("SELECT species_id FROM species WHERE shortname = '%s';" %  speciesShortname)
-  row = cur.fetchone()
+  with conn.cursor() as cur:
+    SQL = "SELECT species_id FROM species WHERE shortname = $1;"
+    prepared.execute(cur, 'find_species', SQL, (speciesShortname,))
+    row = cur.fetchone()
   if row is not None:
     speciesID = row[0]  
-    cur.close()
     return speciesID
   else:
     return None
 
+@cached('population')
 def find_population(conn, populationName):
   """Finds species by population name  
 
@@ -42,16 +105,17 @@ def find_population(conn, populationName):
     :return: population_id
     :rtype: integer
   """
-  cur = conn.cursor()
-  cur.execute("SELECT population_id FROM population WHERE population_name = '%s';" % populationName)
-  row = cur.fetchone()
+  with conn.cursor() as cur:
+    SQL = "SELECT population_id FROM population WHERE population_name = $1;"
+    prepared.execute(cur, 'find_population', SQL, (populationName,))
+    row = cur.fetchone()
   if row is not None:
     populationID = row[0]
-    cur.close()
     return populationID
   else:
     return None
 
+@cached('chromosome')
 def find_chromosome(conn, chromosome_name, chromosome_species):
   """Finds chromosome by name and species id
 
@@ -66,18 +130,39 @@ def find_chromosome(conn, chromosome_name, chromosome_species):
     :return: chromosome_id
     :rtype: integer
   """
-  cur = conn.cursor()
-  # not sure if next line is correct...
-  # TODO(timp): Check if this line meets functional requirements
-  cur.execute("SELECT chromosome_id FROM chromosome WHERE chromosome_name = '%s' AND chromosome_species = '%s';" % (chromosome_name, chromosome_species))
-  row = cur.fetchone()
+  with conn.cursor() as cur:
+    # not sure if next line is correct...
+    # TODO(timp): Check if this line meets functional requirements
+    SQL = "SELECT chromosome_id FROM chromosome WHERE chromosome_name = $1 AND chromosome_species = $2;"
+    prepared.execute(cur, 'find_chromosome', SQL, (chromosome_name, chromosome_species))
+    row = cur.fetchone()
   if row is not None:
     chromosomeID = row[0]
-    cur.close()
     return chromosomeID
   else:
     return None
 
+def find_chromosomes(conn, chromosome_names, chromosome_species):
+  """Finds many chromosomes by their names and species id
+
+    This function finds the chromosome_id of every named chromosome of a species with a single query
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param chromosome_names: abbreviations of chromosome names
+    :type chromosome_names: list of strings
+    :param chromosome_species: :ref:`species id <species_class>`
+    :type chromosome_species: integer
+    :return: chromosome_id of each chromosome found, keyed by chromosome name
+    :rtype: dict
+  """
+  with conn.cursor() as cur:
+    SQL = "SELECT chromosome_name, chromosome_id FROM chromosome WHERE chromosome_species = $1 AND chromosome_name = ANY($2);"
+    prepared.execute(cur, 'find_chromosomes', SQL, (chromosome_species, list(chromosome_names)))
+    chromosomeIDs = dict(cur.fetchall())
+  return chromosomeIDs
+
+@cached('line')
 def find_line(conn, line_name, line_population):
   """Finds line by its name and population name 
 
@@ -92,16 +177,37 @@ def find_line(conn, line_name, line_population):
     :return: line_id
     :rtype: integer
   """
-  cur = conn.cursor()
-  cur.execute("SELECT line_id FROM line WHERE line_name = '%s' AND line_population = '%s';" % (line_name, line_population))
-  row = cur.fetchone()
+  with conn.cursor() as cur:
+    SQL = "SELECT line_id FROM line WHERE line_name = $1 AND line_population = $2;"
+    prepared.execute(cur, 'find_line', SQL, (line_name, line_population))
+    row = cur.fetchone()
   if row is not None:
     lineID = row[0]
-    cur.close()
     return lineID
   else:
     return None
 
+def find_lines(conn, line_names, line_population):
+  """Finds many lines by their names and population id
+
+    This function finds the line_id of every named line in a population with a single query
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param line_names: human-readable names of lines
+    :type line_names: list of strings
+    :param line_population: :ref:`population id <population_class>`
+    :type line_population: integer
+    :return: line_id of each line found, keyed by line name
+    :rtype: dict
+  """
+  with conn.cursor() as cur:
+    SQL = "SELECT line_name, line_id FROM line WHERE line_population = $1 AND line_name = ANY($2);"
+    prepared.execute(cur, 'find_lines', SQL, (line_population, list(line_names)))
+    lineIDs = dict(cur.fetchall())
+  return lineIDs
+
+@cached('growout_type')
 def find_growout_type(conn, growout_type):
   """Finds growout type by its name  
 
@@ -114,16 +220,17 @@ def find_growout_type(conn, growout_type):
     :return: growout_type_id
     :rtype: integer
   """
-  cur = conn.cursor()
-  cur.execute("SELECT growout_type_id FROM growout_type WHERE growout_type = '%s';" % growout_type)
-  row = cur.fetchone()
+  with conn.cursor() as cur:
+    SQL = "SELECT growout_type_id FROM growout_type WHERE growout_type = $1;"
+    prepared.execute(cur, 'find_growout_type', SQL, (growout_type,))
+    row = cur.fetchone()
   if row is not None:
     growout_type_ID = row[0]
-    cur.close()
     return growout_type_ID
   else:
     return None
    
+@cached('location')
 def find_location(conn, code):
   """Finds location by its code 
 
@@ -136,16 +243,17 @@ def find_location(conn, code):
     :return: location_id
     :rtype: integer
   """
-  cur = conn.cursor()
-  cur.execute("SELECT location_id FROM location WHERE code = '%s';" % code)
-  row = cur.fetchone()
+  with conn.cursor() as cur:
+    SQL = "SELECT location_id FROM location WHERE code = $1;"
+    prepared.execute(cur, 'find_location', SQL, (code,))
+    row = cur.fetchone()
   if row is not None:
     location_ID = row[0]
-    cur.close()
     return location_ID
   else:
     return None
 
+@cached('kinship_algorithm')
 def find_kinship_algorithm(conn, algorithm):
   """Finds kinship algorithm by algorithm name 
 
@@ -158,16 +266,17 @@ def find_kinship_algorithm(conn, algorithm):
     :return: kinship_algorithm_id
     :rtype: integer
   """
-  cur = conn.cursor()
-  cur.execute("SELECT kinship_algorithm_id FROM kinship_algorithm WHERE kinship_algorithm = '%s';" % algorithm)
-  row = cur.fetchone()
+  with conn.cursor() as cur:
+    SQL = "SELECT kinship_algorithm_id FROM kinship_algorithm WHERE kinship_algorithm = $1;"
+    prepared.execute(cur, 'find_kinship_algorithm', SQL, (algorithm,))
+    row = cur.fetchone()
   if row is not None:
     kinship_algorithm_ID = row[0]
-    cur.close()
     return kinship_algorithm_ID
   else:
     return None
 
+@cached('population_structure_algorithm')
 def find_population_structure_algorithm(conn, algorithm):
   """Finds population structure algorithm by algorithm name
 
@@ -180,16 +289,17 @@ def find_population_structure_algorithm(conn, algorithm):
     :return: population_structure_algorithm_id
     :rtype: integer
   """
-  cur = conn.cursor()
-  cur.execute("SELECT population_structure_algorithm_id FROM population_structure_algorithm WHERE population_structure_algorithm = '%s';" % algorithm)
-  row = cur.fetchone()
+  with conn.cursor() as cur:
+    SQL = "SELECT population_structure_algorithm_id FROM population_structure_algorithm WHERE population_structure_algorithm = $1;"
+    prepared.execute(cur, 'find_population_structure_algorithm', SQL, (algorithm,))
+    row = cur.fetchone()
   if row is not None:
     population_structure_algorithm_ID = row[0]
-    cur.close()
     return population_structure_algorithm_ID
   else:
     return None
 
+@cached('gwas_algorithm')
 def find_gwas_algorithm(conn, gwas_algorithm):
   """Finds algorithm used for genome-wide association study by algorithm name
 
@@ -202,16 +312,17 @@ def find_gwas_algorithm(conn, gwas_algorithm):
     :return: gwas_algorithm_id
     :rtype: integer
   """
-  cur = conn.cursor()
-  cur.execute("SELECT gwas_algorithm_id FROM gwas_algorithm WHERE gwas_algorithm = '%s';" % gwas_algorithm)
-  row = cur.fetchone()
+  with conn.cursor() as cur:
+    SQL = "SELECT gwas_algorithm_id FROM gwas_algorithm WHERE gwas_algorithm = $1;"
+    prepared.execute(cur, 'find_gwas_algorithm', SQL, (gwas_algorithm,))
+    row = cur.fetchone()
   if row is not None:
     gwas_algorithm_ID = row[0]
-    cur.close()
     return gwas_algorithm_ID
   else:
     return None
 
+@cached('genotype_version')
 def find_genotype_version(conn, genotype_version_name):
   """Finds version of genotype by name 
 
@@ -224,16 +335,17 @@ def find_genotype_version(conn, genotype_version_name):
     :return: genotype_version_id
     :rtype: integer
   """
-  cur = conn.cursor()
-  cur.execute("SELECT genotype_version_id FROM genotype_version WHERE genotype_version_name = '%s';" % genotype_version_name)
-  row = cur.fetchone()
+  with conn.cursor() as cur:
+    SQL = "SELECT genotype_version_id FROM genotype_version WHERE genotype_version_name = $1;"
+    prepared.execute(cur, 'find_genotype_version', SQL, (genotype_version_name,))
+    row = cur.fetchone()
   if row is not None:
     genotype_version_ID = row[0]
-    cur.close()
     return genotype_version_ID
   else:
     return None
 
+@cached('imputation_method')
 def find_imputation_method(conn, imputation_method):
   """Finds imputation methodo by name
 
@@ -246,16 +358,17 @@ def find_imputation_method(conn, imputation_method):
     :return: imputation_method_id
     :rtype: integer
   """
-  cur = conn.cursor()
-  cur.execute("SELECT imputation_method_id FROM imputation_method WHERE imputation_method = '%s';" % imputation_method)
-  row = cur.fetchone()
+  with conn.cursor() as cur:
+    SQL = "SELECT imputation_method_id FROM imputation_method WHERE imputation_method = $1;"
+    prepared.execute(cur, 'find_imputation_method', SQL, (imputation_method,))
+    row = cur.fetchone()
   if row is not None:
     imputation_method_ID = row[0]
-    cur.close()
     return imputation_method_ID
   else:
     return None
 
+@cached('kinship')
 def find_kinship(conn, kinship_file_path):
   """Finds kinship by its location on a file system 
 
@@ -269,16 +382,17 @@ def find_kinship(conn, kinship_file_path):
     :return: kinship_id
     :rtype: integer
   """
-  cur = conn.cursor()
-  cur.execute("SELECT kinship_id FROM kinship WHERE kinship_file_path = '%s';" % kinship_file_path)
-  row = cur.fetchone()
+  with conn.cursor() as cur:
+    SQL = "SELECT kinship_id FROM kinship WHERE kinship_file_path = $1;"
+    prepared.execute(cur, 'find_kinship', SQL, (kinship_file_path,))
+    row = cur.fetchone()
   if row is not None:
     kinship_ID = row[0]
-    cur.close()
     return kinship_ID
   else:
     return None
 
+@cached('population_structure')
 def find_population_structure(conn, population_structure_file_path):
   """Finds population_structure by its location within a file system 
 
@@ -292,16 +406,17 @@ def find_population_structure(conn, population_structure_file_path):
     :return: population_structure_id
     :rtype: integer
   """
-  cur = conn.cursor()
-  cur.execute("SELECT population_structure_id FROM population_structure WHERE population_structure_file_path = '%s';" % population_structure_file_path)
-  row = cur.fetchone()
+  with conn.cursor() as cur:
+    SQL = "SELECT population_structure_id FROM population_structure WHERE population_structure_file_path = $1;"
+    prepared.execute(cur, 'find_population_structure', SQL, (population_structure_file_path,))
+    row = cur.fetchone()
   if row is not None:
     population_structure_ID = row[0]
-    cur.close()
     return population_structure_ID
   else:
     return None
 
+@cached('trait')
 def find_trait(conn, trait_name):
   """Finds trait by its name 
 
@@ -314,16 +429,17 @@ def find_trait(conn, trait_name):
     :return: trait_id
     :rtype: integer
   """
-  cur = conn.cursor()
-  cur.execute("SELECT trait_id FROM trait WHERE trait_name = '%s';" % trait_name)
-  row = cur.fetchone()
+  with conn.cursor() as cur:
+    SQL = "SELECT trait_id FROM trait WHERE trait_name = $1;"
+    prepared.execute(cur, 'find_trait', SQL, (trait_name,))
+    row = cur.fetchone()
   if row is not None:
     trait_ID = row[0]
-    cur.close()
     return trait_ID
   else:
     return None
 
+@cached('gwas_run')
 def find_gwas_run(conn, gwas_algorithm, missing_snp_cutoff_value, missing_line_cutoff_value, gwas_run_imputation_method, gwas_run_trait, nsnps, nlines, gwas_run_genotype_version, gwas_run_kinship, gwas_run_population_structure, minor_allele_frequency_cutoff_value):
   """Finds GWAS run by its parameters
 
@@ -365,12 +481,30 @@ def find_gwas_run(conn, gwas_algorithm, missing_snp_cutoff_value, missing_line_c
         - minor_allele_frequency_cutoff_value
 
   """
-  cur = conn.cursor()
-  cur.execute("SELECT gwas_run_id FROM gwas_run WHERE gwas_run_gwas_algorithm = '%s' AND missing_snp_cutoff_value = '%s' AND missing_line_cutoff_value = '%s' AND gwas_run_imputation_method = '%s' AND gwas_run_trait = '%s' AND nsnps = '%s' AND nlines = '%s' AND gwas_run_genotype_version = '%s' AND gwas_run_kinship = '%s' AND gwas_run_population_structure = '%s' AND minor_allele_frequency_cutoff_value = '%s';" % (gwas_algorithm, missing_snp_cutoff_value, missing_line_cutoff_value, gwas_run_imputation_method, gwas_run_trait, nsnps, nlines, gwas_run_genotype_version, gwas_run_kinship, gwas_run_population_structure, minor_allele_frequency_cutoff_value))
-  row = cur.fetchone()
+  with conn.cursor() as cur:
+    SQL = "SELECT gwas_run_id FROM gwas_run WHERE gwas_run_gwas_algorithm = $1 AND missing_snp_cutoff_value = $2 AND missing_line_cutoff_value = $3 AND gwas_run_imputation_method = $4 AND gwas_run_trait = $5 AND nsnps = $6 AND nlines = $7 AND gwas_run_genotype_version = $8 AND gwas_run_kinship = $9 AND gwas_run_population_structure = $10 AND minor_allele_frequency_cutoff_value = $11;"
+    prepared.execute(cur, 'find_gwas_run', SQL, (gwas_algorithm, missing_snp_cutoff_value, missing_line_cutoff_value, gwas_run_imputation_method, gwas_run_trait, nsnps, nlines, gwas_run_genotype_version, gwas_run_kinship, gwas_run_population_structure, minor_allele_frequency_cutoff_value))
+    row = cur.fetchone()
   if row is not None:
     gwas_run_ID = row[0]
-    cur.close()
     return gwas_run_ID
   else:
     return None
+
+def find_traits(conn, trait_names):
+  """Finds many traits by their names
+
+    This function finds the trait_id of every named trait with a single query
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param trait_names: human-readable names of traits
+    :type trait_names: list of strings
+    :return: trait_id of each trait found, keyed by trait name
+    :rtype: dict
+  """
+  with conn.cursor() as cur:
+    SQL = "SELECT trait_name, trait_id FROM trait WHERE trait_name = ANY($1);"
+    prepared.execute(cur, 'find_traits', SQL, (list(trait_names),))
+    traitIDs = dict(cur.fetchall())
+  return traitIDs
@@ -0,0 +1,221 @@
+"""Inserts many objects of a model at once and returns the IDs of all of them"""
+# The insert functions return None for rows that already exist, so callers used to
+# follow every insert with a find. get_or_create() does both in one statement.
+import commitpolicy as cp
+import matrixcache
+from idcache import cache
+from models import species, population, line, chromosome, variant, genotype, trait, phenotype, growout_type, growout, location, gwas_algorithm, genotype_version, imputation_method, kinship_algorithm, kinship, population_structure_algorithm, population_structure, gwas_run, gwas_result
+
+class ModelTable(object):
+  """Describes how the objects of a model are stored
+
+  :param table: name of table
+  :type table: string
+  :param id_column: name of SERIAL column
+  :type id_column: string
+  :param columns: (column, model attribute, array type the values are sent as, type to cast to or None) of each column
+  :type columns: list of tuples
+  :param key: columns that identify a row, as used by the matching find function
+  :type key: list of strings
+  :param nullable_key: key columns that may be NULL, which are compared with IS NOT DISTINCT FROM
+  :type nullable_key: list of strings
+  """
+  def __init__(self, table, id_column, columns, key, nullable_key=()):
+    self.table = table
+    self.id_column = id_column
+    self.columns = columns
+    self.key = key
+    self.nullable_key = nullable_key
+
+  def __repr__(self):
+    return "<%s: {table = %r, key = %r}>" % (self.__class__.__name__, self.table, self.key)
+
+  def match(self, left, right):
+    """Builds the condition that two aliases refer to the same row
+
+      :param left: alias of one relation
+      :type left: string
+      :param right: alias of the other relation
+      :type right: string
+      :return: SQL condition
+      :rtype: string
+    """
+    return ' AND '.join('%s.%s %s %s.%s' % (left, column, 'IS NOT DISTINCT FROM' if column in self.nullable_key else '=', right, column)
+                        for column in self.key)
+
+  def statement(self):
+    """Builds the get-or-create statement
+
+      The statement unnests one array per column, inserts the first object of each
+      key that is not yet in the table, in input order so that new IDs increase
+      along the input, and returns the ID of every object in input order.
+      Rows inserted by the statement are not visible to its own SELECT, so new IDs
+      come from the RETURNING clause and existing ones from a join on the table.
+
+      :return: SQL statement taking one array parameter per column
+      :rtype: string
+    """
+    names = [column for column, _, _, _ in self.columns]
+    arrays = ', '.join('%%s::%s[]' % arrayType for _, _, arrayType, _ in self.columns)
+    values = ', '.join('d.%s::%s' % (column, cast) if cast else 'd.%s' % column for column, _, _, cast in self.columns)
+    keys = ', '.join(self.key)
+    return """WITH input AS (
+          SELECT * FROM unnest({arrays}) WITH ORDINALITY AS i({names}, input_order)
+        ), inserted AS (
+          INSERT INTO {table} ({names})
+          SELECT {values} FROM (
+            SELECT DISTINCT ON ({keys}) * FROM input i
+            WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE {existing})
+            ORDER BY {keys}, input_order) d
+          ORDER BY d.input_order
+          ON CONFLICT DO NOTHING
+          RETURNING {id_column}, {keys}
+        )
+        SELECT DISTINCT ON (i.input_order) i.input_order, COALESCE(n.{id_column}, t.{id_column}), n.{id_column} IS NOT NULL
+        FROM input i
+        LEFT JOIN inserted n ON {new}
+        LEFT JOIN {table} t ON {existing}
+        ORDER BY i.input_order, t.{id_column};""".format(
+      arrays=arrays, names=', '.join(names), table=self.table, values=values, keys=keys,
+      id_column=self.id_column, existing=self.match('t', 'i'), new=self.match('n', 'i'))
+
+
+MODEL_TABLES = {
+  species: ModelTable('species', 'species_id',
+    [('shortname', 'n', 'text', None), ('binomial', 'b', 'text', None), ('subspecies', 's', 'text', None), ('variety', 'v', 'text', None)],
+    ['shortname']),
+  population: ModelTable('population', 'population_id',
+    [('population_name', 'n', 'text', None), ('population_species', 's', 'integer', None)],
+    ['population_name']),
+  line: ModelTable('line', 'line_id',
+    [('line_name', 'n', 'text', None), ('line_population', 'p', 'integer', None)],
+    ['line_name', 'line_population']),
+  chromosome: ModelTable('chromosome', 'chromosome_id',
+    [('chromosome_name', 'n', 'text', None), ('chromosome_species', 's', 'integer', None)],
+    ['chromosome_name', 'chromosome_species']),
+  variant: ModelTable('variant', 'variant_id',
+    [('variant_species', 's', 'integer', None), ('variant_chromosome', 'c', 'integer', None), ('variant_pos', 'p', 'integer', None)],
+    ['variant_species', 'variant_chromosome', 'variant_pos']),
+  # Unpartitioned, genotype holds one version per line and chromosome, so another version raises rather than matching it
+  genotype: ModelTable('genotype', 'genotype_id',
+    [('genotype_line', 'l', 'integer', None), ('genotype_chromosome', 'c', 'integer', None), ('genotype', 'g', 'text', 'tinyint[]'), ('genotype_genotype_version', 'v', 'integer', None)],
+    ['genotype_line', 'genotype_chromosome', 'genotype_genotype_version']),
+  trait: ModelTable('trait', 'trait_id',
+    [('trait_name', 'n', 'text', None), ('measurement_unit', 'u', 'text', None), ('measurement_device', 'm', 'text', None), ('description', 'd', 'text', None)],
+    ['trait_name']),
+  growout_type: ModelTable('growout_type', 'growout_type_id',
+    [('growout_type', 't', 'text', None)],
+    ['growout_type']),
+  growout: ModelTable('growout', 'growout_id',
+    [('growout_name', 'n', 'text', None), ('growout_population', 'p', 'integer', None), ('growout_location', 'l', 'integer', None), ('year', 'y', 'integer', None), ('growout_growout_type', 't', 'integer', None)],
+    ['growout_name']),
+  location: ModelTable('location', 'location_id',
+    [('country', 'c', 'text', None), ('state', 's', 'text', None), ('city', 'i', 'text', None), ('code', 'o', 'text', None)],
+    ['code']),
+  gwas_algorithm: ModelTable('gwas_algorithm', 'gwas_algorithm_id',
+    [('gwas_algorithm', 'a', 'text', None)],
+    ['gwas_algorithm']),
+  genotype_version: ModelTable('genotype_version', 'genotype_version_id',
+    [('genotype_version_name', 'n', 'text', None), ('genotype_version', 'v', 'text', None), ('reference_genome', 'r', 'integer', None), ('genotype_version_population', 'p', 'integer', None)],
+    ['genotype_version_name']),
+  imputation_method: ModelTable('imputation_method', 'imputation_method_id',
+    [('imputation_method', 'm', 'text', None)],
+    ['imputation_method']),
+  kinship_algorithm: ModelTable('kinship_algorithm', 'kinship_algorithm_id',
+    [('kinship_algorithm', 'a', 'text', None)],
+    ['kinship_algorithm']),
+  kinship: ModelTable('kinship', 'kinship_id',
+    [('kinship_algorithm', 'a', 'integer', None), ('kinship_file_path', 'p', 'text', None)],
+    ['kinship_file_path']),
+  population_structure_algorithm: ModelTable('population_structure_algorithm', 'population_structure_algorithm_id',
+    [('population_structure_algorithm', 'a', 'text', None)],
+    ['population_structure_algorithm']),
+  population_structure: ModelTable('population_structure', 'population_structure_id',
+    [('population_structure_algorithm', 'a', 'integer', None), ('population_structure_file_path', 'p', 'text', None)],
+    ['population_structure_file_path']),
+  gwas_run: ModelTable('gwas_run', 'gwas_run_id',
+    [('gwas_run_trait', 't', 'integer', None), ('nsnps', 's', 'integer', None), ('nlines', 'l', 'integer', None), ('gwas_run_gwas_algorithm', 'a', 'integer', None), ('gwas_run_genotype_version', 'v', 'integer', None), ('missing_snp_cutoff_value', 'm', 'numeric', None), ('missing_line_cutoff_value', 'i', 'numeric', None), ('minor_allele_frequency_cutoff_value', 'n', 'numeric', None), ('gwas_run_imputation_method', 'p', 'integer', None), ('gwas_run_kinship', 'k', 'integer', None), ('gwas_run_population_structure', 'o', 'integer', None)],
+    ['gwas_run_trait', 'nsnps', 'nlines', 'gwas_run_gwas_algorithm', 'gwas_run_genotype_version', 'missing_snp_cutoff_value', 'missing_line_cutoff_value', 'minor_allele_frequency_cutoff_value', 'gwas_run_imputation_method', 'gwas_run_kinship', 'gwas_run_population_structure']),
+  gwas_result: ModelTable('gwas_result', 'gwas_result_id',
+    [('gwas_result_chromosome', 'c', 'integer', None), ('basepair', 'b', 'integer', None), ('gwas_result_gwas_run', 'r', 'integer', None), ('pval', 'p', 'numeric', None), ('cofactor', 'o', 'numeric', None), ('_order', 'd', 'numeric', None), ('null_pval', 'n', 'numeric', None), ('model_added_pval', 'a', 'numeric', None), ('model', 'm', 'text', None), ('pcs', 's', 'text', 'integer[]')],
+    ['gwas_result_chromosome', 'basepair', 'gwas_result_gwas_run', 'model'], nullable_key=['model']),
+}
+
+
+def column_value(value, cast):
+  """Converts an attribute into something psycopg2 can put in an array
+
+    :param value: value of a model attribute
+    :type value: any
+    :param cast: type the column is cast to, or None
+    :type cast: string
+    :return: value to send
+    :rtype: any
+  """
+  if value is None:
+    return None
+  if cast is not None:
+    # Array columns are sent as text literals, since psycopg2 would turn a list of lists into one 2-D array
+    return '{%s}' % ','.join(str(v) for v in value)
+  if type(value).__module__ == 'numpy':
+    return value.item()
+  return value
+
+
+def get_or_create(conn, objects, policy=None):
+  """Inserts the objects that are missing and finds the IDs of all of them
+
+  This function inserts every object whose key (the columns its find function looks
+  it up by) is not yet in the table, and returns the IDs of new and existing objects
+  alike, in input order, with a single statement. If another connection inserts one
+  of the keys at the same time, a second statement picks up its ID.
+
+  Phenotypes have no key, since the same line can be measured for the same trait more
+  than once, so they cannot be passed to this function.
+
+  :param conn: psycopg2 connection
+  :type conn: connection object
+  :param objects: objects of one model, such as :ref:`trait <trait_class>` objects
+  :type objects: list
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
+  :return: ID of each object, in input order
+  :rtype: list of integers
+  :raises: :exc:`ValueError` if the objects are not all of one supported model,
+    :exc:`RuntimeError` if an ID is still missing after the second statement
+  """
+  objects = list(objects)
+  if not objects:
+    return []
+  model = type(objects[0])
+  if model not in MODEL_TABLES:
+    raise ValueError('Cannot get or create %s objects' % model.__name__)
+  if any(type(obj) is not model for obj in objects):
+    raise ValueError('Objects must all be %s objects' % model.__name__)
+  modelTable = MODEL_TABLES[model]
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
+  SQL = modelTable.statement()
+
+  IDs = [None] * len(objects)
+  pending = list(range(len(objects)))
+  createdIDs = set()
+  for attempt in range(2):
+    args = [[column_value(getattr(objects[i], attribute), cast) for i in pending] for _, attribute, _, cast in modelTable.columns]
+    cur.execute(SQL, args)
+    for inputOrder, ID, isNew in cur.fetchall():
+      IDs[pending[inputOrder - 1]] = ID
+      if isNew:
+        createdIDs.add(ID)
+    pending = [i for i in pending if IDs[i] is None]
+    if not pending:
+      break
+  if createdIDs:
+    cache.invalidate(modelTable.table)
+    if model is genotype:
+      for genotype_version, chromosome in set((obj.v, obj.c) for obj in objects):
+        policy.after_commit(conn, matrixcache.invalidate, genotype_version, chromosome)
+  policy.row(conn, len(createdIDs))
+  if pending:
+    raise RuntimeError('Could not get or create %d %s row(s), first: %r' % (len(pending), modelTable.table, objects[pending[0]]))
+  return IDs
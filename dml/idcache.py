@@ -0,0 +1,140 @@
+"""In-process cache of IDs looked up by the find functions"""
+import threading
+import weakref
+from collections import OrderedDict
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+class IDCache(object):
+  """Least-recently-used cache of IDs, kept separately for each table
+
+  .. _id_cache_class:
+
+  :param maxsize: *required.* number of IDs to keep per table before evicting the least recently used
+  :type maxsize: integer
+
+  Entries are keyed by the connection's DSN and the arguments of the lookup, so
+  connections to different databases do not share IDs. An ID found inside an open
+  transaction may not be committed yet, so it is only given back to the connection
+  that found it (see :meth:`idle`). Lookups that find nothing are not cached. The
+  insert functions invalidate a table whenever they add a row to it, and
+  :class:`commitpolicy.CommitPolicy` clears the whole cache when it rolls back.
+  Call :meth:`clear` after rolling back a connection directly.
+
+  The cache is shared by every thread of the process and guarded by a lock.
+  """
+  def __init__(self, maxsize=100000):
+    self.maxsize = maxsize
+    self.tables = {}
+    self.hits = {}
+    self.misses = {}
+    self.owners = weakref.WeakKeyDictionary()
+    self.lock = threading.Lock()
+
+  def __repr__(self):
+    return "<%s: {maxsize = %r, tables = %r}>" % (self.__class__.__name__, self.maxsize, sorted(self.tables))
+
+  @staticmethod
+  def idle(conn):
+    """Finds whether a connection has no open transaction, so that what it reads is committed
+
+      Call this before the lookup, which itself opens a transaction.
+
+      :param conn: psycopg2 connection
+      :type conn: connection object
+      :rtype: boolean
+    """
+    status = getattr(conn, 'get_transaction_status', None)
+    return status is None or status() == TRANSACTION_STATUS_IDLE
+
+  def owner(self, conn):
+    """Returns the token keying the IDs only a connection may see
+
+      A token, unlike the id of the connection, is never reused by another connection
+
+      :param conn: psycopg2 connection
+      :type conn: connection object
+      :return: token
+      :rtype: object
+    """
+    token = self.owners.get(conn)
+    if token is None:
+      token = self.owners[conn] = object()
+    return token
+
+  def get(self, conn, table, key):
+    """Returns a cached ID
+
+      :param conn: psycopg2 connection
+      :type conn: connection object
+      :param table: name of table
+      :type table: string
+      :param key: arguments of the lookup
+      :type key: tuple
+      :return: ID, or None if it is not cached
+      :rtype: integer
+    """
+    dsn = getattr(conn, 'dsn', None)
+    with self.lock:
+      entries = self.tables.get(table)
+      if entries is not None:
+        for scope in (None, self.owners.get(conn)):
+          ID = entries.get((dsn, scope) + key)
+          if ID is not None:
+            entries.move_to_end((dsn, scope) + key)
+            self.hits[table] = self.hits.get(table, 0) + 1
+            return ID
+      self.misses[table] = self.misses.get(table, 0) + 1
+      return None
+
+  def put(self, conn, table, key, ID, shared=True):
+    """Caches an ID, evicting the least recently used ID of the table if it is full
+
+      :param conn: psycopg2 connection
+      :type conn: connection object
+      :param table: name of table
+      :type table: string
+      :param key: arguments of the lookup
+      :type key: tuple
+      :param ID: ID found by the lookup
+      :type ID: integer
+      :param shared: whether the lookup ran with no open transaction (see :meth:`idle`), so that
+        the ID is committed and other connections may be given it
+      :type shared: boolean
+    """
+    with self.lock:
+      entries = self.tables.setdefault(table, OrderedDict())
+      key = (getattr(conn, 'dsn', None), None if shared else self.owner(conn)) + key
+      entries[key] = ID
+      entries.move_to_end(key)
+      while len(entries) > self.maxsize:
+        entries.popitem(last=False)
+
+  def invalidate(self, table):
+    """Drops every cached ID of a table
+
+      :param table: name of table
+      :type table: string
+    """
+    with self.lock:
+      self.tables.pop(table, None)
+
+  def clear(self):
+    """Drops every cached ID"""
+    with self.lock:
+      self.tables.clear()
+
+  def stats(self):
+    """Reports the hits, misses and size of each table
+
+      :return: ``{'hits': ..., 'misses': ..., 'size': ...}`` keyed by table name
+      :rtype: dict
+    """
+    with self.lock:
+      tables = set(self.tables) | set(self.hits) | set(self.misses)
+      return dict((table, {'hits': self.hits.get(table, 0),
+                           'misses': self.misses.get(table, 0),
+                           'size': len(self.tables.get(table, ()))}) for table in sorted(tables))
+
+
+# Shared by find.py, insert.py and commitpolicy.py
+cache = IDCache()
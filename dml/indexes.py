@@ -0,0 +1,162 @@
+"""Builds, drops and analyzes the non-unique indexes of the schema"""
+# Maintaining these indexes row by row slows bulk loads, so a loader can drop them
+# first and build each one in a single pass afterwards. Unique indexes are never
+# dropped, since the loaders rely on them for ON CONFLICT.
+from contextlib import contextmanager
+
+# (name, table, columns) of each index, as created by ddl/indexes.sql
+MANAGED_INDEXES = [
+  ('phenotype_line_idx', 'phenotype', ['phenotype_line']),
+  ('phenotype_trait_idx', 'phenotype', ['phenotype_trait']),
+  ('gwas_run_trait_idx', 'gwas_run', ['gwas_run_trait']),
+  ('gwas_result_gwas_run_idx', 'gwas_result', ['gwas_result_gwas_run']),
+  ('genotype_genotype_version_idx', 'genotype', ['genotype_genotype_version', 'genotype_chromosome']),
+]
+
+
+def managed_indexes(tables=None):
+  """Lists the managed indexes of some tables
+
+    :param tables: names of tables, defaults to every table with a managed index
+    :type tables: list of strings
+    :return: (name, table, columns) of each index
+    :rtype: list of tuples
+  """
+  return [index for index in MANAGED_INDEXES if tables is None or index[1] in tables]
+
+
+def drop_indexes(conn, tables=None):
+  """Drops the managed indexes before a bulk load
+
+    This function commits, so that the indexes are gone for every connection
+    taking part in the load
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param tables: names of tables, defaults to every table with a managed index
+    :type tables: list of strings
+    :return: names of the indexes dropped
+    :rtype: list of strings
+  """
+  cur = conn.cursor()
+  names = []
+  for name, _, _ in managed_indexes(tables):
+    cur.execute("DROP INDEX IF EXISTS %s;" % name)
+    names.append(name)
+  conn.commit()
+  cur.close()
+  return names
+
+
+def leaf_indexes(cur, name):
+  """Lists the indexes holding the entries of an index
+
+    An index of a partitioned table holds no entries itself; its partitions' indexes,
+    down to those of the partitions that are not partitioned again, hold them.
+
+    :param cur: psycopg2 cursor
+    :type cur: cursor object
+    :param name: name of index
+    :type name: string
+    :return: names of the index itself, or of its partitions' indexes
+    :rtype: list of strings
+  """
+  cur.execute("""WITH RECURSIVE tree(indexrelid) AS (
+                   SELECT to_regclass(%s)::oid
+                   UNION ALL
+                   SELECT pg_inherits.inhrelid FROM pg_inherits JOIN tree ON pg_inherits.inhparent = tree.indexrelid
+                 )
+                 SELECT tree.indexrelid::regclass::text FROM tree JOIN pg_class ON pg_class.oid = tree.indexrelid
+                 WHERE pg_class.relkind = 'i';""", (name,))
+  return [row[0] for row in cur.fetchall()]
+
+
+def analyze(conn, tables=None):
+  """Updates the planner statistics of tables
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param tables: names of tables, defaults to every table with a managed index
+    :type tables: list of strings
+  """
+  if tables is None:
+    tables = sorted(set(table for _, table, _ in MANAGED_INDEXES))
+  cur = conn.cursor()
+  for table in tables:
+    cur.execute("ANALYZE %s;" % table)
+  conn.commit()
+  cur.close()
+
+
+def build_indexes(conn, tables=None, rebuild=False, maintenance_work_mem=None):
+  """Builds the managed indexes after a load, then analyzes their tables
+
+    This function creates each managed index that does not exist, and with ``rebuild``
+    also rebuilds the ones that do, which compacts indexes bloated by many updates.
+    It commits, including anything still pending on the connection.
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param tables: names of tables, defaults to every table with a managed index
+    :type tables: list of strings
+    :param rebuild: also ``REINDEX`` indexes that already exist. The index of a partitioned
+      table is rebuilt one partition at a time, since PostgreSQL before 14 cannot reindex it whole.
+    :type rebuild: boolean
+    :param maintenance_work_mem: memory for sorting during the build, such as ``'1GB'``, instead of the server setting
+    :type maintenance_work_mem: string
+    :return: names of the indexes built or rebuilt
+    :rtype: list of strings
+
+    :example:
+      .. code-block:: python
+
+        indexes.drop_indexes(conn, ['gwas_result'])
+        insert.insert_gwas_runs_and_results_from_file(conn, ...)
+        indexes.build_indexes(conn, ['gwas_result'], maintenance_work_mem='2GB')
+  """
+  cur = conn.cursor()
+  if maintenance_work_mem is not None:
+    cur.execute("SET LOCAL maintenance_work_mem = %s;", (maintenance_work_mem,))
+  built = []
+  for name, table, columns in managed_indexes(tables):
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (name,))
+    if not cur.fetchone()[0]:
+      cur.execute("CREATE INDEX %s ON %s (%s);" % (name, table, ', '.join(columns)))
+      built.append(name)
+    elif rebuild:
+      for partitionIndex in leaf_indexes(cur, name):
+        cur.execute("REINDEX INDEX %s;" % partitionIndex)
+      built.append(name)
+  conn.commit()
+  cur.close()
+  analyze(conn, sorted(set(table for _, table, _ in managed_indexes(tables))))
+  return built
+
+
+@contextmanager
+def dropped(conn, tables=None, **kwargs):
+  """Drops the managed indexes for the duration of a load, then builds them again
+
+    The indexes are built even if the load raises, after rolling back whatever it
+    left uncommitted, so a failed load never leaves the database without them
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param tables: names of tables, defaults to every table with a managed index
+    :type tables: list of strings
+    :param kwargs: passed on to :func:`build_indexes`
+
+    :example:
+      .. code-block:: python
+
+        with indexes.dropped(conn, ['gwas_result'], maintenance_work_mem='2GB'):
+          insert.insert_gwas_runs_and_results_from_file(conn, ...)
+  """
+  drop_indexes(conn, tables)
+  try:
+    yield
+  except BaseException:
+    conn.rollback()
+    raise
+  finally:
+    build_indexes(conn, tables, **kwargs)
@@ -1,16 +1,21 @@
 """Fundamental data importation functionality"""
 # Insert objects (as defined in models.py) into the database
 # TODO(timp): Add in the error handling for each cursor/connection to the database
-import pandas as pd
-import numpy as np
+import io
 import time
 import parsinghelpers as ph
+import binarycopy as bc
+import commitpolicy as cp
 import find
+import prepared
+import matrixcache
+import packedgenotype
+import partitions
+from idcache import cache
 from models import species, population, line, chromosome, variant, genotype, trait, phenotype, growout_type, growout, location, gwas_algorithm, genotype_version, imputation_method, kinship_algorithm, kinship, population_structure_algorithm, population_structure, gwas_run, gwas_result
 import psycopg2 as pg
-from tqdm import tqdm
 
-def insert_species(conn, species):
+def insert_species(conn, species, policy=None):
   """Inserts species into database by its shortname, binomial, subspecies, and variety
 
   This function inserts a species into a database
@@ -19,27 +24,30 @@ def insert_species(conn, species):
   :type conn: connection object
   :param species: :ref:`species <species_class>` object
   :type species: species object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: species_id
   :rtype: integer
   """
-  cur = conn.cursor()
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
   SQL = """INSERT INTO species (shortname, binomial, subspecies, variety)
-        VALUES (%s, %s, %s, %s)
+        VALUES ($1, $2, $3, $4)
         ON CONFLICT DO NOTHING
         RETURNING species_id;"""
   args_tuple = (species.n, species.b, species.s, species.v)
-  cur.execute(SQL, args_tuple)
+  prepared.execute(cur, 'insert_species', SQL, args_tuple)
   row = cur.fetchone()
+  policy.row(conn)
   if row is not None:
     newID = row[0]
-    conn.commit()
-    cur.close()
+    cache.invalidate('species')
     return newID
   else:
     return None
 
 
-def insert_population(conn, population):
+def insert_population(conn, population, policy=None):
   """Inserts population into database
 
   This function inserts a population into a database
@@ -48,26 +56,29 @@ def insert_population(conn, population):
   :type conn: connection object
   :param population: :ref:`population <population_class>` object
   :type population: population object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: population_id
   :rtype: integer
   """
-  cur = conn.cursor()
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
   SQL = """INSERT INTO population (population_name, population_species)
-        VALUES (%s, %s)
+        VALUES ($1, $2)
         ON CONFLICT DO NOTHING
         RETURNING population_id;"""
   args_tuple = (population.n, population.s)
-  cur.execute(SQL, args_tuple)
+  prepared.execute(cur, 'insert_population', SQL, args_tuple)
   row = cur.fetchone()
+  policy.row(conn)
   if row is not None:
      newID = row[0]
-     conn.commit()
-     cur.close()
+     cache.invalidate('population')
      return newID
   else:
     return None  
 
-def insert_chromosome(conn, chromosome):
+def insert_chromosome(conn, chromosome, policy=None):
   """Inserts chromosome into database by its name
 
   This function inserts a chromosome into a database
@@ -76,31 +87,34 @@ def insert_chromosome(conn, chromosome):
   :type conn: connection object
   :param chromosome: :ref:`chromosome <chromosome_class>` object
   :type chromosome: chromosome object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: chromosome_id
   :rtype: integers
   """
-  cur = conn.cursor()
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
   SQL = """INSERT INTO chromosome (chromosome_name, chromosome_species)
-        VALUES (%s, %s)
+        VALUES ($1, $2)
         ON CONFLICT DO NOTHING
         RETURNING chromosome_id;"""
   args_tuple = (chromosome.n, chromosome.s)
   try:
-    cur.execute(SQL, args_tuple)
+    prepared.execute(cur, 'insert_chromosome', SQL, args_tuple)
   except pg.Error as err:
     print("%s: %s" % (err.__class__.__name__, err))
     raise
   row = cur.fetchone()
+  policy.row(conn)
   if row is not None:
     newID = row[0]
-    conn.commit()
-    cur.close()
+    cache.invalidate('chromosome')
     return newID
   else:
     return None
 
 
-def insert_all_chromosomes_for_species(conn, numChromosomes, speciesID):
+def insert_all_chromosomes_for_species(conn, numChromosomes, speciesID, policy=None):
   """Inserts all chromosomes for a species into database by its name
 
   This function inserts all chromosomes for a species into a database
@@ -111,19 +125,23 @@ def insert_all_chromosomes_for_species(conn, numChromosomes, speciesID):
   :type numChromosomes: integer
   :param species: :ref:`species <species_class>` object
   :type species: species object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: list of species_id
   :rtype: list of integers
   """
+  policy = policy or cp.DEFAULT
   chrlist = ph.generate_chromosome_list(numChromosomes)
   insertedChromosomeIDs = []
-  for chrname in chrlist:
-    chrobj = chromosome(chrname, speciesID)
-    insertedChromosomeID = insert_chromosome(conn, chrobj)
-    insertedChromosomeIDs.append(insertedChromosomeID)
+  with policy.file(conn):
+    for chrname in chrlist:
+      chrobj = chromosome(chrname, speciesID)
+      insertedChromosomeID = insert_chromosome(conn, chrobj, policy)
+      insertedChromosomeIDs.append(insertedChromosomeID)
   return insertedChromosomeIDs
 
 
-def insert_line(conn, line):
+def insert_line(conn, line, policy=None):
   """Inserts line into database
 
   This function inserts a line into a database
@@ -132,27 +150,30 @@ def insert_line(conn, line):
   :type conn: connection object
   :param line: :ref:`line <line_class>` object
   :type line: line object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: line_id
   :rtype: integer
   """
-  cur = conn.cursor()
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
   SQL = """INSERT INTO line (line_name, line_population)
-        VALUES (%s, %s)
+        VALUES ($1, $2)
         ON CONFLICT DO NOTHING
         RETURNING line_id;"""
   args_tuple = (line.n, line.p)
-  cur.execute(SQL, args_tuple)
+  prepared.execute(cur, 'insert_line', SQL, args_tuple)
   row = cur.fetchone()
+  policy.row(conn)
   if row is not None:
     newID = row[0]
-    conn.commit()
-    cur.close()
+    cache.invalidate('line')
     return newID
   else:
     return None
 
 
-def insert_lines_from_file(conn, lineFile, populationID):
+def insert_lines_from_file(conn, lineFile, populationID, policy=None):
   """Inserts lines into database from a file
 
   This function inserts a lines into a database from a file
@@ -163,19 +184,54 @@ def insert_lines_from_file(conn, lineFile, populationID):
   :type lineFile: string
   :param populationID: :ref:`population <population_class>`
   :type populationID: integer
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: list of population_id
   :rtype: list of integers
   """
+  from tqdm import tqdm
+  policy = policy or cp.DEFAULT
   linelist = ph.parse_lines_from_file(lineFile)
   insertedLineIDs = []
-  for linename in tqdm(linelist, desc="Lines"):
-    lineobj = line(linename, populationID)
-    insertedLineID = insert_line(conn, lineobj)
-    insertedLineIDs.append(insertedLineID)
+  with policy.file(conn):
+    for linename in tqdm(linelist, desc="Lines"):
+      lineobj = line(linename, populationID)
+      insertedLineID = insert_line(conn, lineobj, policy)
+      insertedLineIDs.append(insertedLineID)
   return insertedLineIDs
 
 
-def insert_variant(conn, variant):
+def insert_lines(conn, line_names, populationID, policy=None):
+  """Inserts many lines into database
+
+  This function inserts lines into a database with a single statement
+
+  :param conn: psycopg2 connection
+  :type conn: connection object
+  :param line_names: names of lines
+  :type line_names: list of strings
+  :param populationID: :ref:`population <population_class>`
+  :type populationID: integer
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
+  :return: line_id of each newly inserted line, keyed by line name
+  :rtype: dict
+  """
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
+  SQL = """INSERT INTO line (line_name, line_population)
+        SELECT unnest(%s::varchar[]), %s
+        ON CONFLICT DO NOTHING
+        RETURNING line_name, line_id;"""
+  cur.execute(SQL, (list(line_names), populationID))
+  newLineIDs = dict(cur.fetchall())
+  if newLineIDs:
+    cache.invalidate('line')
+  policy.row(conn, len(newLineIDs))
+  return newLineIDs
+
+
+def insert_variant(conn, variant, policy=None):
   """Inserts variant into database
 
   This function inserts a variant into a database
@@ -184,31 +240,33 @@ def insert_variant(conn, variant):
   :type conn: connection object
   :param variant: :ref:`variant <variant_class>` object
   :type variant: variant object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: variant_id
   :rtype: integer
   """
-  cur = conn.cursor()
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
   SQL = """INSERT INTO variant(variant_species, variant_chromosome, variant_pos)
-        VALUES (%s,%s,%s)
+        VALUES ($1,$2,$3)
         ON CONFLICT DO NOTHING
         RETURNING variant_id;"""
   args_tuple = (variant.s, variant.c, variant.p)
-  cur.execute(SQL, args_tuple)
+  prepared.execute(cur, 'insert_variant', SQL, args_tuple)
   #newID = cur.fetchone()[0]
   row = cur.fetchone()
+  policy.row(conn)
   if row is not None:
     newID = row[0]
-    conn.commit()
-    cur.close()
     return newID
   else:
     return None
 
 
-def insert_variants_from_file(conn, variantPosFile, speciesID, chromosomeID):
-  """Inserts chromosome into database by its name
+def insert_variants_from_file(conn, variantPosFile, speciesID, chromosomeID, bulk=False, policy=None):
+  """Inserts variants into database from a file
 
-  This function inserts a chromosome into a database
+  This function inserts the variants listed in a .pos file into a database
 
   :param conn: psycopg2 connection
   :type conn: connection object
@@ -218,22 +276,96 @@ def insert_variants_from_file(conn, variantPosFile, speciesID, chromosomeID):
   :type speciesID: integer
   :param chromosomeID: :ref:`chromosome <chromosome_class>`
   :type chromosomeID: integer
+  :param bulk: load through :func:`copy_variants_from_file` instead of one insert per position
+  :type bulk: boolean
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: list of variant_id
   :rtype: list of integers
   """
+  from tqdm import tqdm
+  policy = policy or cp.DEFAULT
+  if bulk:
+    return copy_variants_from_file(conn, variantPosFile, speciesID, chromosomeID, policy)
   variantlist = ph.parse_variants_from_file(variantPosFile)
   # print('num variants:')
   cVariants = len(variantlist)
   # print(cVariants)
   insertedVariantIDs = []
-  for variantpos in tqdm(variantlist, desc="Variants from %s" % variantPosFile):
-    variantobj = variant(speciesID, chromosomeID, variantpos)
-    insertedVariantID = insert_variant(conn, variantobj)
-    insertedVariantIDs.append(insertedVariantID)
+  with policy.file(conn):
+    for variantpos in tqdm(variantlist, desc="Variants from %s" % variantPosFile):
+      variantobj = variant(speciesID, chromosomeID, variantpos)
+      insertedVariantID = insert_variant(conn, variantobj, policy)
+      insertedVariantIDs.append(insertedVariantID)
   return insertedVariantIDs
 
 
-def insert_genotype(conn, genotype):
+def copy_variants_from_file(conn, variantPosFile, speciesID, chromosomeID, policy=None, firstVariantID=None):
+  """Bulk loads variants into database from a file
+
+  This function streams a .pos file into a staging table with ``COPY``, inserts every
+  new position into the variant table in a single statement, and reads back the
+  variant IDs of all positions (new and existing) in file order
+
+  :param conn: psycopg2 connection
+  :type conn: connection object
+  :param variantPosFile: absolute path to input file
+  :type variantPosFile: string
+  :param speciesID: :ref:`species <species_class>`
+  :type speciesID: integer
+  :param chromosomeID: :ref:`chromosome <chromosome_class>`
+  :type chromosomeID: integer
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
+  :param firstVariantID: variant_id to give the first position of the file, the rest following in
+    file order, instead of drawing IDs from the sequence. Used to load chromosomes in parallel
+    into blocks of IDs reserved ahead of time
+  :type firstVariantID: integer
+  :return: variant_id of each position in the file, in file order
+  :rtype: list of integers
+
+  .. note::
+    The input file is handed to the server as-is, so it must be the two-column
+    (chromosome, position) tab-delimited format written by ``vcftools --012``
+  """
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
+  with policy.file(conn):
+    cur.execute("""CREATE TEMPORARY TABLE variant_staging (
+                     variant_order SERIAL,
+                     variant_chromosome_name TEXT,
+                     variant_pos INTEGER NOT NULL
+                   );""")
+    with open(variantPosFile) as f:
+      cur.copy_expert("COPY variant_staging (variant_chromosome_name, variant_pos) FROM STDIN;", f)
+    if firstVariantID is None:
+      SQL = """INSERT INTO variant(variant_species, variant_chromosome, variant_pos)
+            SELECT %s, %s, variant_pos FROM variant_staging
+            ORDER BY variant_order
+            ON CONFLICT DO NOTHING;"""
+      cur.execute(SQL, (speciesID, chromosomeID))
+    else:
+      SQL = """INSERT INTO variant(variant_id, variant_species, variant_chromosome, variant_pos)
+            SELECT %s + variant_order - 1, %s, %s, variant_pos FROM variant_staging
+            ORDER BY variant_order
+            ON CONFLICT DO NOTHING;"""
+      cur.execute(SQL, (firstVariantID, speciesID, chromosomeID))
+    SQL = cur.mogrify("""COPY (SELECT v.variant_id
+                  FROM variant_staging s
+                  JOIN variant v
+                    ON v.variant_species = %s
+                   AND v.variant_chromosome = %s
+                   AND v.variant_pos = s.variant_pos
+                  ORDER BY s.variant_order) TO STDOUT;""", (speciesID, chromosomeID))
+    buf = io.StringIO()
+    cur.copy_expert(SQL.decode(), buf)
+    insertedVariantIDs = [int(variantID) for variantID in buf.getvalue().split()]
+    cur.execute("DROP TABLE variant_staging;")
+    policy.row(conn, len(insertedVariantIDs))
+  return insertedVariantIDs
+
+
+def insert_genotype(conn, genotype, policy=None):
   """Inserts genotype into database
 
   This function inserts a genotype into a database
@@ -242,24 +374,126 @@ def insert_genotype(conn, genotype):
   :type conn: connection object
   :param genotype: :ref:`genotype <genotype_class>` object
   :type genotype: genotype object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: genotype_id
   :rtype: integer
   """
-  cur = conn.cursor()
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
   SQL = """INSERT INTO genotype(genotype_line, genotype_chromosome, genotype, genotype_genotype_version)
-        VALUES (%s,%s,%s,%s)
+        VALUES ($1,$2,$3,$4)
         ON CONFLICT DO NOTHING
         RETURNING genotype_id;"""
 
   args_tuple = (genotype.l, genotype.c, genotype.g, genotype.v)
-  cur.execute(SQL, args_tuple)
-  newID = cur.fetchone()[0]
-  conn.commit()
-  cur.close()
-  return newID
+  prepared.execute(cur, 'insert_genotype', SQL, args_tuple)
+  row = cur.fetchone()
+  if row is not None:
+    policy.after_commit(conn, matrixcache.invalidate, genotype.v, genotype.c)
+  policy.row(conn)
+  if row is not None:
+    newID = row[0]
+    return newID
+  else:
+    return None
+
+
+def copy_genotypes(conn, lineIDs, chromosomeID, genotypes, genotype_versionID, policy=None, firstGenotypeID=None, packed=False, detached=False):
+  """Bulk loads genotypes into database
 
+  This function encodes each line's allele calls straight into the binary ``COPY``
+  representation of ``tinyint[]``, or packs them four to a byte into ``genotype_packed``,
+  and streams them into a staging table, then inserts them into the genotype table
+  in a single statement. If genotype is partitioned (see ``ddl/partitioned.sql``), the
+  partition of the genotype version and chromosome is created if it does not exist.
 
-def insert_genotypes_from_file(conn, genotypeFile, lineFile, chromosomeID, populationID, genotype_versionID):
+  :param conn: psycopg2 connection
+  :type conn: connection object
+  :param lineIDs: :ref:`line_id <line_class>` of each row of genotypes
+  :type lineIDs: list of integers
+  :param chromosomeID: :ref:`chromosome <chromosome_class>`
+  :type chromosomeID: integer
+  :param genotypes: allele calls of each line, in the same order as lineIDs
+  :type genotypes: iterable of numpy arrays of int8
+  :param genotype_versionID: :ref:`genotype_version <genotype_version_class>`
+  :type genotype_versionID: integer
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
+  :param firstGenotypeID: genotype_id to give the first line, the rest following in input order,
+    instead of drawing IDs from the sequence (see ``firstVariantID`` of :func:`copy_variants_from_file`)
+  :type firstGenotypeID: integer
+  :param packed: store the calls in ``genotype_packed`` (see :mod:`packedgenotype`) instead of ``genotype``
+  :type packed: boolean
+  :param detached: load straight into the partition while it is detached from genotype, then attach it.
+    A partition that is already detached is loaded and left detached for whoever detached it.
+  :type detached: boolean
+  :return: genotype_id of each line (new and existing), in input order
+  :rtype: list of integers
+  :raises: :exc:`ValueError` if detached is set but genotype is not partitioned
+  """
+  policy = policy or cp.DEFAULT
+  chromosomeField = bc.encode_integer(chromosomeID)
+  versionField = bc.encode_integer(genotype_versionID)
+  if packed:
+    tuples = (bc.encode_tuple([bc.encode_integer(lineID), chromosomeField, bc.NULL_FIELD, bc.encode_bytes(packedgenotype.pack_calls(calls)), versionField])
+              for lineID, calls in zip(lineIDs, genotypes))
+  else:
+    tinyint_oid = bc.find_type_oid(conn, 'tinyint')
+    tuples = (bc.encode_tuple([bc.encode_integer(lineID), chromosomeField, bc.encode_tinyint_array(calls, tinyint_oid), bc.NULL_FIELD, versionField])
+              for lineID, calls in zip(lineIDs, genotypes))
+  cur = policy.cursor(conn)
+  with policy.file(conn):
+    table = 'genotype'
+    loadPartitions = []
+    partitioned = partitions.is_partitioned(cur, 'genotype')
+    if partitioned:
+      partition = partitions.genotype_partition(cur, genotype_versionID, chromosomeID)
+      if detached:
+        table = partition.name
+        loadPartitions.append(partition)
+    elif detached:
+      raise ValueError('Cannot load into a detached partition, genotype is not partitioned')
+    cur.execute("""CREATE TEMPORARY TABLE genotype_staging (
+                     genotype_order SERIAL,
+                     genotype_line INTEGER NOT NULL,
+                     genotype_chromosome INTEGER NOT NULL,
+                     genotype tinyint[],
+                     genotype_packed BYTEA,
+                     genotype_genotype_version INTEGER NOT NULL
+                   );""")
+    cur.copy_expert("COPY genotype_staging (genotype_line, genotype_chromosome, genotype, genotype_packed, genotype_genotype_version) FROM STDIN WITH (FORMAT binary);", bc.CopyStream(tuples), size=1 << 20)
+    with partitions.detached(cur, loadPartitions):
+      if firstGenotypeID is None:
+        cur.execute("""INSERT INTO %s(genotype_line, genotype_chromosome, genotype, genotype_packed, genotype_genotype_version)
+                       SELECT genotype_line, genotype_chromosome, genotype, genotype_packed, genotype_genotype_version
+                       FROM genotype_staging
+                       ORDER BY genotype_order
+                       ON CONFLICT DO NOTHING;""" % table)
+      else:
+        cur.execute("""INSERT INTO %s(genotype_id, genotype_line, genotype_chromosome, genotype, genotype_packed, genotype_genotype_version)
+                       SELECT %%s + genotype_order - 1, genotype_line, genotype_chromosome, genotype, genotype_packed, genotype_genotype_version
+                       FROM genotype_staging
+                       ORDER BY genotype_order
+                       ON CONFLICT DO NOTHING;""" % table, (firstGenotypeID,))
+      # Matrices cached for this chromosome no longer include every line
+      if cur.rowcount:
+        policy.after_commit(conn, matrixcache.invalidate, genotype_versionID, chromosomeID)
+      # Partitioned, a line can have the chromosome in more than one genotype version
+      cur.execute("""SELECT g.genotype_id
+                     FROM genotype_staging s
+                     JOIN %s g
+                       ON g.genotype_line = s.genotype_line
+                      AND g.genotype_chromosome = s.genotype_chromosome
+                      %s
+                     ORDER BY s.genotype_order;""" % (table, 'AND g.genotype_genotype_version = s.genotype_genotype_version' if partitioned else ''))
+      insertedGenotypeIDs = [row[0] for row in cur.fetchall()]
+    cur.execute("DROP TABLE genotype_staging;")
+    policy.row(conn, len(insertedGenotypeIDs))
+  return insertedGenotypeIDs
+
+
+def insert_genotypes_from_file(conn, genotypeFile, lineFile, chromosomeID, populationID, genotype_versionID, bulk=False, policy=None, packed=False, workers=None):
   """Inserts genotypes into database
 
   This function inserts a genotypes into a database
@@ -274,24 +508,43 @@ def insert_genotypes_from_file(conn, genotypeFile, lineFile, chromosomeID, popul
   :type chromosomeID: integer
   :param populationID: :ref:`population <population_class>`
   :type populationID: integer
+  :param bulk: load through :func:`copy_genotypes` instead of one insert per line
+  :type bulk: boolean
+  :param packed: store the calls packed four to a byte (see :func:`copy_genotypes`), which always loads in bulk
+  :type packed: boolean
+  :param workers: parse the .012 file with this many processes (see
+    :func:`parsinghelpers.parse_genotype_matrix_from_file_in_parallel`) instead of one line at a time.
+    Only used when loading in bulk.
+  :type workers: integer
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: list of genotype IDs
   :rtype: list of integers
   """
-  genotypes = ph.parse_genotypes_from_file(genotypeFile)
+  from tqdm import tqdm
+  policy = policy or cp.DEFAULT
   linelist = ph.parse_lines_from_file(lineFile)
   lineIDlist = ph.convert_linelist_to_lineIDlist(conn, linelist, populationID)
+  if bulk or packed:
+    if workers:
+      calls = ph.parse_genotype_matrix_from_file_in_parallel(genotypeFile, workers=workers)
+    else:
+      calls = ph.iter_genotypes_from_file(genotypeFile)
+    return copy_genotypes(conn, lineIDlist, chromosomeID, calls, genotype_versionID, policy, packed=packed)
+  genotypes = ph.parse_genotypes_from_file(genotypeFile)
   zipped = zip(lineIDlist, genotypes)
   ziplist = list(zipped)
   insertedGenotypeIDs = []
-  for zippedpair in tqdm(ziplist, desc="Genotypes from %s" % genotypeFile):
-    genotypeObj = genotype(zippedpair[0], chromosomeID, zippedpair[1], genotype_versionID)
-    insertedGenotypeID = insert_genotype(conn, genotypeObj)
-    insertedGenotypeIDs.append(insertedGenotypeID)
+  with policy.file(conn):
+    for zippedpair in tqdm(ziplist, desc="Genotypes from %s" % genotypeFile):
+      genotypeObj = genotype(zippedpair[0], chromosomeID, zippedpair[1], genotype_versionID)
+      insertedGenotypeID = insert_genotype(conn, genotypeObj, policy)
+      insertedGenotypeIDs.append(insertedGenotypeID)
 
 
   return insertedGenotypeIDs
 
-def insert_growout(conn, growout):
+def insert_growout(conn, growout, policy=None):
   """Inserts growout into database
 
   This function inserts a growout into a database
@@ -300,30 +553,32 @@ def insert_growout(conn, growout):
   :type conn: connection object
   :param growout: :ref:`growout <genotype_class>` object
   :type growout: growout object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: growout_id
   :rtype: integer
   """
-  cur = conn.cursor()
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
   SQL = """INSERT INTO growout(growout_name, growout_population, growout_location, year, growout_growout_type)
-        VALUES (%s, %s, %s, %s, %s)
+        VALUES ($1, $2, $3, $4, $5)
         ON CONFLICT DO NOTHING
         RETURNING growout_id;"""
   args_tuple = (growout.n, growout.p, growout.l, growout.y, growout.t)
   try:
-    cur.execute(SQL, args_tuple)
+    prepared.execute(cur, 'insert_growout', SQL, args_tuple)
   except pg.Error as err:
     print("%s: %s" % (err.__class__.__name__, err))
     raise
   row = cur.fetchone()
+  policy.row(conn)
   if row is not None:
     newID = row[0]
-    conn.commit()
-    cur.close()
     return newID
   else:
     return None
 
-def insert_location(conn, location):
+def insert_location(conn, location, policy=None):
   """Inserts location into database
 
   This function inserts a location into a database
@@ -332,27 +587,30 @@ def insert_location(conn, location):
   :type conn: connection object
   :param location: :ref:`location <location_class>` object
   :type location: location object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: location_id
   :rtype: integer
   """
-  cur = conn.cursor()
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
   SQL = """INSERT INTO location(country, state, city, code)
-        VALUES (%s, %s, %s, %s)
+        VALUES ($1, $2, $3, $4)
         ON CONFLICT DO NOTHING
         RETURNING location_id;"""
   args_tuple = (location.c, location.s, location.i, location.o)
-  cur.execute(SQL, args_tuple)
+  prepared.execute(cur, 'insert_location', SQL, args_tuple)
   row = cur.fetchone()
+  policy.row(conn)
   if row is not None:
     newID = row[0]
-    conn.commit()
-    cur.close()
+    cache.invalidate('location')
     return newID
   else:
     return None  
 
 
-def insert_phenotype(conn, phenotype):
+def insert_phenotype(conn, phenotype, policy=None):
   """Inserts phenotype into database
 
   This function inserts a phenotype into a database
@@ -361,33 +619,41 @@ def insert_phenotype(conn, phenotype):
   :type conn: connection object
   :param phenotype: :ref:`phenotype <phenotype_class>` object
   :type phenotype: phenotype object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: phenotype_id
   :rtype: integer
   """
-  cur = conn.cursor()
-  SQL = """INSERT INTO phenotype(phenotype_line, phenotype_trait, phenotype_value)
-        VALUES (%s, %s, %s)
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
+  SQL = """INSERT INTO phenotype(phenotype_line, phenotype_trait, phenotype_value, phenotype_value_text)
+        VALUES ($1, $2, $3, $4)
         ON CONFLICT DO NOTHING
         RETURNING phenotype_id;"""
-  args_tuple = (phenotype.l, phenotype.t, phenotype.v)
+  value, text = ph.split_phenotype_value(phenotype.v)
+  args_tuple = (phenotype.l, phenotype.t, value, text)
   try:
-    cur.execute(SQL, args_tuple)
+    prepared.execute(cur, 'insert_phenotype', SQL, args_tuple)
   except pg.Error as err:
     print("%s: %s" % (err.__class__.__name__, err))
     raise
   row = cur.fetchone()
+  policy.row(conn)
   if row is not None:
     newID = row[0]
-    conn.commit()
-    cur.close()
     return newID
   else:
     return None
 
-def insert_phenotypes_from_file(conn, phenotypeFile, populationID):
+def insert_phenotypes_from_file(conn, phenotypeFile, populationID, policy=None):
   """Inserts phenotypes into database
 
-  This function inserts phenotypes from a file into a database
+  This function inserts phenotypes from a file into a database. Traits and lines are
+  resolved with one query each, lines missing from the population are created in one
+  batch, and all phenotypes are written in a single statement. Empty cells are skipped.
+  The file is read once, as text. Values are written as double precision parsed from that
+  text, and a value keeps its text only when the double does not read back as the same
+  number (see :func:`parsinghelpers.split_phenotype_value`).
 
   :param conn: psycopg2 connection
   :type conn: connection object
@@ -395,30 +661,44 @@ def insert_phenotypes_from_file(conn, phenotypeFile, populationID):
   :type phenotypeFile: string
   :param populationID: :ref:`population_id <population_class>`
   :type populationID: integer
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: list of phenotype_id
   :rtype: list of integers
   """
-  maize282popID = find.find_population(conn, 'Maize282')
-  # Read through just the first column of the CSV, ignoring any column
-  phenotypeRawData = pd.read_csv(phenotypeFile, index_col=0)
-  insertedPhenoIDs = []
-  for key, value in tqdm(phenotypeRawData.iteritems(), desc="Phenotypes"):
-    # print("***********KEY**************:")
-    # print(key)
-    traitID = find.find_trait(conn, key)
-    for line_name, traitval in tqdm(value.iteritems(), desc="Traits"):
-      lineID = find.find_line(conn, line_name, maize282popID)
-      if lineID is None:
-        newline = line(line_name, maize282popID)
-        lineID = insert_line(conn, newline)
-      pheno = phenotype(lineID, traitID, traitval)
-      # print(pheno)
-      insertedPhenoID = insert_phenotype(conn, pheno)
-      insertedPhenoIDs.append(insertedPhenoID)
+  import pandas as pd
+  policy = policy or cp.DEFAULT
+  # Read everything as text, so that line names such as 0001 keep their leading zeros and each
+  # value is parsed from exactly the text kept for it. Only empty cells are missing; text such
+  # as NA is kept as a value that is not a number.
+  phenotypeRawData = pd.read_csv(phenotypeFile, index_col=0, dtype=str, keep_default_na=False, na_values=[''])
+  # Reshape from one column per trait to one row per (line, trait) measurement
+  phenotypes = phenotypeRawData.rename_axis('line_name').reset_index().melt(id_vars='line_name', var_name='trait_name', value_name='phenotype_text')
+  phenotypes = phenotypes.dropna(subset=['phenotype_text'])
+  values, texts = ph.split_phenotype_values(phenotypes['phenotype_text'])
+  traitIDs = find.find_traits(conn, phenotypeRawData.columns)
+  missingTraits = [traitname for traitname in phenotypeRawData.columns if traitname not in traitIDs]
+  if missingTraits:
+    raise ValueError('Traits not found in database: %s' % ', '.join(missingTraits))
+  with policy.file(conn):
+    lineIDs = find.find_lines(conn, phenotypeRawData.index, populationID)
+    missingLines = [linename for linename in phenotypeRawData.index if linename not in lineIDs]
+    if missingLines:
+      lineIDs.update(insert_lines(conn, missingLines, populationID, policy))
+    cur = policy.cursor(conn)
+    SQL = """INSERT INTO phenotype(phenotype_line, phenotype_trait, phenotype_value, phenotype_value_text)
+          SELECT * FROM unnest(%s::integer[], %s::integer[], %s::double precision[], %s::text[])
+          ON CONFLICT DO NOTHING
+          RETURNING phenotype_id;"""
+    # NaN marks values that are not a number, which are stored as text only
+    args = (phenotypes['line_name'].map(lineIDs).tolist(), phenotypes['trait_name'].map(traitIDs).tolist(), [value if value == value else None for value in values.tolist()], texts)
+    cur.execute(SQL, args)
+    insertedPhenoIDs = [row[0] for row in cur.fetchall()]
+    policy.row(conn, len(insertedPhenoIDs))
   return insertedPhenoIDs
 
 
-def insert_trait(conn, trait):
+def insert_trait(conn, trait, policy=None):
   """Inserts trait into database
 
   This function inserts a trait into a database
@@ -427,27 +707,30 @@ def insert_trait(conn, trait):
   :type conn: connection object
   :param trait: :ref:`trait <trait_class>` object
   :type trait: trait object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: trait_id
   :rtype: integer
   """
-  cur = conn.cursor()
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
   SQL = """INSERT INTO trait(trait_name)
-        VALUES (%s)
+        VALUES ($1)
         ON CONFLICT DO NOTHING
         RETURNING trait_id;"""
   arg = (trait.n,)
-  cur.execute(SQL, arg)
+  prepared.execute(cur, 'insert_trait', SQL, arg)
   row = cur.fetchone()
+  policy.row(conn)
   if row is not None:
     newID = row[0]
-    conn.commit()
-    cur.close()
+    cache.invalidate('trait')
     return newID
   else:
     return None
 
 
-def insert_traits_from_traitlist(conn, traitlist):
+def insert_traits_from_traitlist(conn, traitlist, policy=None):
   """Inserts traits from list into database
 
   This function inserts a traitlist into a database
@@ -456,18 +739,22 @@ def insert_traits_from_traitlist(conn, traitlist):
   :type conn: connection object
   :param traitlist: list of trait names
   :type traitlist: list of strings
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: list of trait IDs
   :rtype: list of integers
   """
+  policy = policy or cp.DEFAULT
   traitIDs = []
-  for traitname in traitlist:
-    traitObj = trait(traitname, None, None, None)
-    insertedTraitID = insert_trait(conn, traitObj)
-    traitIDs.append(insertedTraitID)
+  with policy.file(conn):
+    for traitname in traitlist:
+      traitObj = trait(traitname, None, None, None)
+      insertedTraitID = insert_trait(conn, traitObj, policy)
+      traitIDs.append(insertedTraitID)
   return traitIDs
 
 
-def insert_growout_type(conn, growout_type):
+def insert_growout_type(conn, growout_type, policy=None):
   """Inserts growout type into database
 
   This function inserts a growout type into a database
@@ -476,27 +763,30 @@ def insert_growout_type(conn, growout_type):
   :type conn: connection object
   :param growout_type: :ref:`growout_type <growout_type_class>` object
   :type growout_type: growout_type object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: growout_type_id
   :rtype: integer
   """
-  cur = conn.cursor()
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
   SQL = """INSERT INTO growout_type(growout_type)
-        VALUES (%s)
+        VALUES ($1)
         ON CONFLICT DO NOTHING
         RETURNING growout_type_id;"""
   arg = (growout_type.t,)
-  cur.execute(SQL, arg)
+  prepared.execute(cur, 'insert_growout_type', SQL, arg)
   row = cur.fetchone()
+  policy.row(conn)
   if row is not None:
     newID = row[0]
-    conn.commit()
-    cur.close()
+    cache.invalidate('growout_type')
     return newID
   else:
     return None
 
 
-def insert_gwas_algorithm(conn, gwas_algorithm):
+def insert_gwas_algorithm(conn, gwas_algorithm, policy=None):
   """Inserts GWAS algorithm into database
 
   This function inserts a GWAS algorithm into a database
@@ -505,27 +795,30 @@ def insert_gwas_algorithm(conn, gwas_algorithm):
   :type conn: connection object
   :param gwas_algorithm: :ref:`gwas_algorithm <gwas_algorithm_class>` object
   :type gwas_algorithm: gwas_algorithm object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: gwas algorithm ID
   :rtype: integer
   """
-  cur = conn.cursor()
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
   SQL = """INSERT INTO gwas_algorithm(gwas_algorithm)
-        VALUES (%s)
+        VALUES ($1)
         ON CONFLICT DO NOTHING
         RETURNING gwas_algorithm_id;"""
   args = (gwas_algorithm.a,)
-  cur.execute(SQL, args)
+  prepared.execute(cur, 'insert_gwas_algorithm', SQL, args)
   row = cur.fetchone()
+  policy.row(conn)
   if row is not None:
     newID = row[0]
-    conn.commit()
-    cur.close()
+    cache.invalidate('gwas_algorithm')
     return newID
   else:
     return None
 
 
-def insert_genotype_version(conn, genotype_version):
+def insert_genotype_version(conn, genotype_version, policy=None):
   """Inserts genotype version into database
 
   This function inserts a genotype version into a database
@@ -534,28 +827,31 @@ def insert_genotype_version(conn, genotype_version):
   :type conn: connection object
   :param genotype_version: :ref:`genotype_version <genotype_version_class>` object
   :type genotype_version: genotype_version object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: genotype_version_id
   :rtype: integer
   """
-  cur = conn.cursor()
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
   SQL = """INSERT INTO genotype_version(genotype_version_name, genotype_version, reference_genome, genotype_version_population)
-        VALUES (%s,%s,%s,%s)
+        VALUES ($1,$2,$3,$4)
         ON CONFLICT DO NOTHING
         RETURNING genotype_version_id;"""
   # print("Genotype Version: " + str(genotype_version))
   args_tuple = (genotype_version.n, genotype_version.v, genotype_version.r, genotype_version.p)
-  cur.execute(SQL, args_tuple)
+  prepared.execute(cur, 'insert_genotype_version', SQL, args_tuple)
   row = cur.fetchone()
+  policy.row(conn)
   if row is not None:
     newID = row[0]
-    conn.commit()
-    cur.close()
+    cache.invalidate('genotype_version')
     return newID
   else:
     return None
 
 
-def insert_imputation_method(conn, imputation_method):
+def insert_imputation_method(conn, imputation_method, policy=None):
   """Inserts imputation method into database
 
   This function inserts a imputation method into a database
@@ -564,27 +860,30 @@ def insert_imputation_method(conn, imputation_method):
   :type conn: connection object
   :param imputation_method: :ref:`imputation_method <imputation_method_class>` object
   :type imputation_method: imputation_method object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: imputation_method_id
   :rtype: integer
   """
-  cur = conn.cursor()
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
   SQL = """INSERT INTO imputation_method(imputation_method)
-        VALUES (%s)
+        VALUES ($1)
         ON CONFLICT DO NOTHING
         RETURNING imputation_method_id;"""
   args = (imputation_method.m,)
-  cur.execute(SQL, args)
+  prepared.execute(cur, 'insert_imputation_method', SQL, args)
   row = cur.fetchone()
+  policy.row(conn)
   if row is not None:
     newID = row[0]
-    conn.commit()
-    cur.close()
+    cache.invalidate('imputation_method')
     return newID
   else:
     return None
 
 
-def insert_kinship_algorithm(conn, kinship_algorithm):
+def insert_kinship_algorithm(conn, kinship_algorithm, policy=None):
   """Inserts kinship_algorithm into database
 
   This function inserts a kinship_algorithm into a database
@@ -593,27 +892,30 @@ def insert_kinship_algorithm(conn, kinship_algorithm):
   :type conn: connection object
   :param kinship_algorithm: :ref:`kinship_algorithm <kinship_algorithm_class>` object
   :type kinship_algorithm: kinship_algorithm object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: kinship_algorithm_id
   :rtype: integer
   """
-  cur = conn.cursor()
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
   SQL = """INSERT INTO kinship_algorithm(kinship_algorithm)
-        VALUES (%s)
+        VALUES ($1)
         ON CONFLICT DO NOTHING
         RETURNING kinship_algorithm_id;"""
   args = (kinship_algorithm.a,)
-  cur.execute(SQL, args)
+  prepared.execute(cur, 'insert_kinship_algorithm', SQL, args)
   row = cur.fetchone()
+  policy.row(conn)
   if row is not None:
     newID = row[0]
-    conn.commit()
-    cur.close()
+    cache.invalidate('kinship_algorithm')
     return newID
   else:
     return None
 
 
-def insert_kinship(conn, kinship):
+def insert_kinship(conn, kinship, policy=None):
   """Inserts kinship into database
 
   This function inserts a kinship into a database
@@ -622,27 +924,30 @@ def insert_kinship(conn, kinship):
   :type conn: connection object
   :param kinship: :ref:`kinship <kinship_class>` object
   :type kinship: kinship object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: kinship_id
   :rtype: integer
   """
-  cur = conn.cursor()
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
   SQL = """INSERT INTO kinship(kinship_algorithm, kinship_file_path)
-        VALUES (%s,%s)
+        VALUES ($1,$2)
         ON CONFLICT DO NOTHING
         RETURNING kinship_id;"""
   args = (kinship.a, kinship.p)
-  cur.execute(SQL, args)
+  prepared.execute(cur, 'insert_kinship', SQL, args)
   row = cur.fetchone()
+  policy.row(conn)
   if row is not None:
     newID = row[0]
-    conn.commit()
-    cur.close()
+    cache.invalidate('kinship')
     return newID
   else:
     return None
 
 
-def insert_population_structure_algorithm(conn, population_structure_algorithm):
+def insert_population_structure_algorithm(conn, population_structure_algorithm, policy=None):
   """Inserts population_structure_algorithm into database
 
   This function inserts a population_structure_algorithm into a database
@@ -651,27 +956,30 @@ def insert_population_structure_algorithm(conn, population_structure_algorithm):
   :type conn: connection object
   :param population_structure_algorithm: :ref:`population_structure_algorithm <population_structure_algorithm_class>` object
   :type population_structure_algorithm: population_structure_algorithm object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: population_structure_algorithm_id
   :rtype: integer
   """
-  cur = conn.cursor()
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
   SQL = """INSERT INTO population_structure_algorithm(population_structure_algorithm)
-        VALUES (%s)
+        VALUES ($1)
         ON CONFLICT DO NOTHING
         RETURNING population_structure_algorithm_id;"""
   args = (population_structure_algorithm.a,)
-  cur.execute(SQL, args)
+  prepared.execute(cur, 'insert_population_structure_algorithm', SQL, args)
   row = cur.fetchone()
+  policy.row(conn)
   if row is not None:
     newID = row[0]
-    conn.commit()
-    cur.close()
+    cache.invalidate('population_structure_algorithm')
     return newID
   else:
     return None
 
 
-def insert_population_structure(conn, population_structure):
+def insert_population_structure(conn, population_structure, policy=None):
   """Inserts population into database
 
   This function inserts a population into a database
@@ -680,27 +988,30 @@ def insert_population_structure(conn, population_structure):
   :type conn: connection object
   :param population: :ref:`population <population_class>` object
   :type population: population object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: population_id
   :rtype: integer
   """
-  cur = conn.cursor()
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
   SQL = """INSERT INTO population_structure(population_structure_algorithm, population_structure_file_path)
-        VALUES (%s,%s)
+        VALUES ($1,$2)
         ON CONFLICT DO NOTHING
         RETURNING population_structure_id;"""
   args = (population_structure.a, population_structure.p)
-  cur.execute(SQL, args)
+  prepared.execute(cur, 'insert_population_structure', SQL, args)
   row = cur.fetchone()
+  policy.row(conn)
   if row is not None:
     newID = row[0]
-    conn.commit()
-    cur.close()
+    cache.invalidate('population_structure')
     return newID
   else:
     return None
 
 
-def insert_gwas_run(conn, gwas_run):
+def insert_gwas_run(conn, gwas_run, policy=None):
   """Inserts gwas_run into database
 
   This function inserts a gwas_run into a database
@@ -709,28 +1020,101 @@ def insert_gwas_run(conn, gwas_run):
   :type conn: connection object
   :param gwas_run: :ref:`gwas_run <gwas_run_class>` object
   :type gwas_run: gwas_run object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: gwas_run_id
   :rtype: integer
   """
-  cur = conn.cursor()
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
   SQL = """INSERT INTO gwas_run(gwas_run_trait, nsnps, nlines, gwas_run_gwas_algorithm, gwas_run_genotype_version, missing_snp_cutoff_value, missing_line_cutoff_value, minor_allele_frequency_cutoff_value, gwas_run_imputation_method, gwas_run_kinship, gwas_run_population_structure)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
         ON CONFLICT DO NOTHING
         RETURNING gwas_run_id;"""
   args = (gwas_run.t, gwas_run.s, gwas_run.l, gwas_run.a, gwas_run.v, gwas_run.m, gwas_run.i, gwas_run.n, gwas_run.p, gwas_run.k, gwas_run.o)
   # print(gwas_run)
-  cur.execute(SQL, args)
+  prepared.execute(cur, 'insert_gwas_run', SQL, args)
   row = cur.fetchone()
+  policy.row(conn)
   if row is not None:
     newID = row[0]
-    conn.commit()
-    cur.close()
+    cache.invalidate('gwas_run')
     return newID
   else:
     return None
 
 
-def insert_gwas_runs_from_gwas_results_file(conn, gwas_results_file, gwasRunAlgorithmID, gwasRunGenotypeVersionID, missing_snp_cutoff_value, missing_line_cutoff_value, minor_allele_frequency_cutoff_value, gwasRunImputationMethodID, gwasRunKinshipID, gwasRunPopulationStructureID):
+def upsert_gwas_runs(conn, runKeys, gwasRunAlgorithmID, gwasRunGenotypeVersionID, missing_snp_cutoff_value, missing_line_cutoff_value, minor_allele_frequency_cutoff_value, gwasRunImputationMethodID, gwasRunKinshipID, gwasRunPopulationStructureID, policy=None):
+  """Inserts many GWAS runs that share their parameters into database
+
+  This function inserts every GWAS run that does not exist yet with one statement, then looks
+  up the IDs of all of them (new and existing) with another
+
+  :param conn: psycopg2 connection
+  :type conn: connection object
+  :param runKeys: (:ref:`trait_id <trait_class>`, nSNPs, nLines) of each run
+  :type runKeys: list of tuples
+  :param gwasRunAlgorithmID: :ref:`gwas_algorithm_id <gwas_algorithm_class>`
+  :type gwasRunAlgorithmID: integer
+  :param gwasRunGenotypeVersionID: :ref:`genotype_version_id <genotype_version_class>`
+  :type gwasRunGenotypeVersionID: integer
+  :param missing_snp_cutoff_value:
+  :type missing_snp_cutoff_value: numeric
+  :param missing_line_cutoff_value:
+  :type missing_line_cutoff_value: numeric
+  :param minor_allele_frequency_cutoff_value:
+  :type minor_allele_frequency_cutoff_value: numeric
+  :param gwasRunImputationMethodID: :ref:`imputation_method_id <imputation_method_class>`
+  :type gwasRunImputationMethodID: integer
+  :param gwasRunKinshipID: :ref:`kinship_id <kinship_class>`
+  :type gwasRunKinshipID: integer
+  :param gwasRunPopulationStructureID: :ref:`population_structure_id <population_structure_class>`
+  :type gwasRunPopulationStructureID: integer
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
+  :return: gwas_run_id keyed by (trait_id, nSNPs, nLines)
+  :rtype: dict
+  """
+  policy = policy or cp.DEFAULT
+  args = {
+    'traits': [int(key[0]) for key in runKeys],
+    'nsnps': [int(key[1]) for key in runKeys],
+    'nlines': [int(key[2]) for key in runKeys],
+    'algorithm': gwasRunAlgorithmID,
+    'genotype_version': gwasRunGenotypeVersionID,
+    'missing_snp': missing_snp_cutoff_value,
+    'missing_line': missing_line_cutoff_value,
+    'maf': minor_allele_frequency_cutoff_value,
+    'imputation_method': gwasRunImputationMethodID,
+    'kinship': gwasRunKinshipID,
+    'population_structure': gwasRunPopulationStructureID,
+  }
+  cur = policy.cursor(conn)
+  SQL = """INSERT INTO gwas_run(gwas_run_trait, nsnps, nlines, gwas_run_gwas_algorithm, gwas_run_genotype_version, missing_snp_cutoff_value, missing_line_cutoff_value, minor_allele_frequency_cutoff_value, gwas_run_imputation_method, gwas_run_kinship, gwas_run_population_structure)
+        SELECT k.trait, k.nsnps, k.nlines, %(algorithm)s, %(genotype_version)s, %(missing_snp)s, %(missing_line)s, %(maf)s, %(imputation_method)s, %(kinship)s, %(population_structure)s
+        FROM unnest(%(traits)s::integer[], %(nsnps)s::integer[], %(nlines)s::integer[]) AS k(trait, nsnps, nlines)
+        ON CONFLICT DO NOTHING;"""
+  cur.execute(SQL, args)
+  if cur.rowcount:
+    cache.invalidate('gwas_run')
+  policy.row(conn, cur.rowcount)
+  SQL = """SELECT r.gwas_run_trait, r.nsnps, r.nlines, r.gwas_run_id
+        FROM gwas_run r
+        JOIN unnest(%(traits)s::integer[], %(nsnps)s::integer[], %(nlines)s::integer[]) AS k(trait, nsnps, nlines)
+          ON r.gwas_run_trait = k.trait AND r.nsnps = k.nsnps AND r.nlines = k.nlines
+        WHERE r.gwas_run_gwas_algorithm = %(algorithm)s
+          AND r.gwas_run_genotype_version = %(genotype_version)s
+          AND r.missing_snp_cutoff_value = %(missing_snp)s
+          AND r.missing_line_cutoff_value = %(missing_line)s
+          AND r.minor_allele_frequency_cutoff_value = %(maf)s
+          AND r.gwas_run_imputation_method = %(imputation_method)s
+          AND r.gwas_run_kinship = %(kinship)s
+          AND r.gwas_run_population_structure = %(population_structure)s;"""
+  cur.execute(SQL, args)
+  return {(trait, nsnps, nlines): runID for trait, nsnps, nlines, runID in cur.fetchall()}
+
+
+def insert_gwas_runs_from_gwas_results_file(conn, gwas_results_file, gwasRunAlgorithmID, gwasRunGenotypeVersionID, missing_snp_cutoff_value, missing_line_cutoff_value, minor_allele_frequency_cutoff_value, gwasRunImputationMethodID, gwasRunKinshipID, gwasRunPopulationStructureID, policy=None):
   """Inserts a collection of GWAS runs from an input file into database
 
   This function inserts a a collection of GWAS runs from an input file into a database
@@ -753,20 +1137,24 @@ def insert_gwas_runs_from_gwas_results_file(conn, gwas_results_file, gwasRunAlgo
   :type gwasRunKinshipID: integer
   :param gwasRunPopulationStructureID: :ref:`population_structure_id <population_structure_class>`
   :type gwasRunPopulationStructureID: integer
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: list of gwas_run_id
   :rtype: list of integers
   """
+  policy = policy or cp.DEFAULT
   gwas_run_list = ph.parse_unique_runs_from_gwas_results_file(gwas_results_file)
   insertedGwasRunIDs = []
-  for gwas_run_item in gwas_run_list:
-    traitID = find.find_trait(conn, gwas_run_item[0])
-    gwas_run_obj = gwas_run(traitID, gwas_run_item[1], gwas_run_item[2], gwasRunAlgorithmID, gwasRunGenotypeVersionID, missing_snp_cutoff_value, missing_line_cutoff_value, minor_allele_frequency_cutoff_value, gwasRunImputationMethodID, gwasRunKinshipID, gwasRunPopulationStructureID)
-    insertedGwasRunID = insert_gwas_run(conn, gwas_run_obj)
-    insertedGwasRunIDs.append(insertedGwasRunID)
+  with policy.file(conn):
+    for gwas_run_item in gwas_run_list:
+      traitID = find.find_trait(conn, gwas_run_item[0])
+      gwas_run_obj = gwas_run(traitID, gwas_run_item[1], gwas_run_item[2], gwasRunAlgorithmID, gwasRunGenotypeVersionID, missing_snp_cutoff_value, missing_line_cutoff_value, minor_allele_frequency_cutoff_value, gwasRunImputationMethodID, gwasRunKinshipID, gwasRunPopulationStructureID)
+      insertedGwasRunID = insert_gwas_run(conn, gwas_run_obj, policy)
+      insertedGwasRunIDs.append(insertedGwasRunID)
   return insertedGwasRunIDs
 
 
-def insert_gwas_result(conn, gwas_result):
+def insert_gwas_result(conn, gwas_result, policy=None):
   """Inserts gwas_result into database
 
   This function inserts a gwas_result into a database
@@ -775,34 +1163,37 @@ def insert_gwas_result(conn, gwas_result):
   :type conn: connection object
   :param gwas_result: :ref:`gwas_result <gwas_result_class>` object
   :type gwas_result: gwas_result object
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: gwas_result_id
   :rtype: integer
   """
-  cur = conn.cursor()
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
   SQL = """INSERT INTO gwas_result(gwas_result_chromosome, basepair, gwas_result_gwas_run, pval, cofactor, _order, null_pval, model_added_pval, model, pcs)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
         ON CONFLICT DO NOTHING
         RETURNING gwas_result_id;"""
   args = (gwas_result.c, gwas_result.b, gwas_result.r, gwas_result.p, gwas_result.o, gwas_result.d, gwas_result.n, gwas_result.a, gwas_result.m, gwas_result.s)
-  cur.execute(SQL, args)
+  prepared.execute(cur, 'insert_gwas_result', SQL, args)
   row = cur.fetchone()
+  policy.row(conn)
   if row is not None:
     newID = row[0]
-    conn.commit()
-    cur.close()
     return newID
   else:
     return None
 
 
-def insert_gwas_results_from_file(conn, speciesID, gwas_results_file, gwas_algorithm_ID, missing_snp_cutoff_value, missing_line_cutoff_value, imputationMethodID, genotypeVersionID, kinshipID, populationStructureID, minor_allele_frequency_cutoff_value):
+def insert_gwas_results_from_file(conn, speciesID, gwas_results_file, gwas_algorithm_ID, missing_snp_cutoff_value, missing_line_cutoff_value, imputationMethodID, genotypeVersionID, kinshipID, populationStructureID, minor_allele_frequency_cutoff_value, policy=None):
   """Inserts a collection of GWAS results from a file into database
 
-  This function inserts a collection of GWAS results from a file into a database
+  This function inserts a collection of GWAS results from a file into a database. Chromosomes,
+  traits and GWAS runs are each looked up once per distinct value, and the results are then
+  loaded with :func:`copy_gwas_results`
 
   :param conn: psycopg2 connection
   :type conn: connection object
-
   :param speciesID: :ref:`species_id <species_class>`
   :type speciesID: integer
   :param gwas_results_file: absolute path to input file
@@ -823,34 +1214,215 @@ def insert_gwas_results_from_file(conn, speciesID, gwas_results_file, gwas_algor
   :type populationStructureID: integer
   :param minor_allele_frequency_cutoff_value:
   :type minor_allele_frequency_cutoff_value: numeric
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
   :return: list of gwas_result_id
   :rtype: list of integers
   """
-  new_gwas_result_IDs = []
-  df = pd.read_csv(gwas_results_file)
-  for index, row in tqdm(df.iterrows(), desc="GWAS Results"):
-    trait = row['trait']
-    traitID = find.find_trait(conn, trait)
-    gwas_run_ID = find.find_gwas_run(conn, gwas_algorithm_ID, missing_snp_cutoff_value, missing_line_cutoff_value, imputationMethodID, traitID, row['nSNPs'], row['nLines'], genotypeVersionID, kinshipID, populationStructureID, minor_allele_frequency_cutoff_value)
-    snp = row['SNP']
-    snp_list = snp.split("_")
-    chromosome = snp_list[0]
-    chromosome = "chr"+str(chromosome)
-    chromosomeID = find.find_chromosome(conn, chromosome, speciesID)
-    basepair = snp_list[1]
-    
-    pcs = row['PCs']
-    if type(pcs) == str:
-      pcs_list = pcs.split(":")
-      pcs_list = [int(x) for x in pcs_list]
-    elif np.isnan(pcs):
-      pcs_list = None
- 
-    new_gwas_result = gwas_result(chromosomeID, basepair, gwas_run_ID, row['pval'], row['cofactor'], row['order'], row['nullPval'], row['modelAddedPval'], row['model'], pcs_list)
-    if new_gwas_result:
-      print("yep")
-    else:
-      print("nope")
-    new_gwas_result_ID = insert_gwas_result(conn, new_gwas_result)
-    new_gwas_result_IDs.append(new_gwas_result_ID)
+  import pandas as pd
+  policy = policy or cp.DEFAULT
+  df = pd.read_csv(gwas_results_file, dtype={'SNP': str, 'PCs': str}, float_precision='round_trip')
+  df['chromosome'], df['basepair'] = ph.split_snp_names(df['SNP'])
+
+  chromosomeIDs = find.find_chromosomes(conn, df['chromosome'].unique(), speciesID)
+  missingChromosomes = sorted(set(df['chromosome'].unique()) - set(chromosomeIDs))
+  if missingChromosomes:
+    raise ValueError('Chromosomes not found in database: %s' % ', '.join(missingChromosomes))
+
+  traitIDs = find.find_traits(conn, df['trait'].unique())
+  missingTraits = sorted(set(df['trait'].unique()) - set(traitIDs))
+  if missingTraits:
+    raise ValueError('Traits not found in database: %s' % ', '.join(missingTraits))
+
+  # Look up each run once, rather than once per result
+  gwasRunIDs = {}
+  for trait, nsnps, nlines in df[['trait', 'nSNPs', 'nLines']].drop_duplicates().itertuples(index=False, name=None):
+    gwas_run_ID = find.find_gwas_run(conn, gwas_algorithm_ID, missing_snp_cutoff_value, missing_line_cutoff_value, imputationMethodID, traitIDs[trait], nsnps, nlines, genotypeVersionID, kinshipID, populationStructureID, minor_allele_frequency_cutoff_value)
+    if gwas_run_ID is None:
+      raise ValueError('GWAS run not found in database: trait %s, %s SNPs, %s lines' % (trait, nsnps, nlines))
+    gwasRunIDs[(trait, nsnps, nlines)] = gwas_run_ID
+
+  return copy_gwas_results(conn, gwas_results_from_dataframe(df, chromosomeIDs, gwasRunIDs), policy)
+
+
+def gwas_results_from_dataframe(df, chromosomeIDs, gwasRunIDs):
+  """Converts rows of a GWAS results file into rows of the gwas_result table
+
+  :param df: rows of a GWAS results file, with the chromosome name and basepair of each SNP
+    already split into ``chromosome`` and ``basepair`` columns (see :func:`parsinghelpers.split_snp_names`)
+  :type df: pandas DataFrame
+  :param chromosomeIDs: :ref:`chromosome_id <chromosome_class>` keyed by chromosome name
+  :type chromosomeIDs: dict
+  :param gwasRunIDs: :ref:`gwas_run_id <gwas_run_class>` keyed by (trait name, nSNPs, nLines)
+  :type gwasRunIDs: dict
+  :return: rows ready for :func:`copy_gwas_results`
+  :rtype: pandas DataFrame
+  """
+  import pandas as pd
+  return pd.DataFrame({
+    'gwas_result_chromosome': df['chromosome'].map(chromosomeIDs),
+    'basepair': df['basepair'],
+    'gwas_result_gwas_run': pd.MultiIndex.from_frame(df[['trait', 'nSNPs', 'nLines']]).map(gwasRunIDs).values,
+    'pval': df['pval'],
+    'cofactor': df['cofactor'],
+    '_order': df['order'],
+    'null_pval': df['nullPval'],
+    'model_added_pval': df['modelAddedPval'],
+    'model': df['model'],
+    # PCs are colon-delimited, e.g. 1:2, which becomes the array literal {1,2}
+    'pcs': '{' + df['PCs'].str.replace(':', ',') + '}',
+  }, index=df.index)
+
+
+def copy_gwas_results(conn, gwas_results, policy=None, detached=()):
+  """Bulk loads GWAS results into database
+
+  This function streams GWAS results into a staging table with ``COPY`` and inserts them
+  into the gwas_result table in a single statement. If gwas_result is partitioned (see
+  ``ddl/partitioned.sql``), the partitions of the chromosomes are created if they do not exist.
+
+  :param conn: psycopg2 connection
+  :type conn: connection object
+  :param gwas_results: one row per result, with a column for every column of the
+    :ref:`gwas_result <gwas_result_class>` table except its ID. ``pcs`` holds array literals such as ``{1,2}``
+  :type gwas_results: pandas DataFrame
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
+  :param detached: partitions of gwas_result that are detached (see :func:`partitions.detach`);
+    the results of their chromosomes are inserted straight into them
+  :type detached: list of Partition
+  :return: list of gwas_result_id of the newly inserted results
+  :rtype: list of integers
+  """
+  policy = policy or cp.DEFAULT
+  columns = ['gwas_result_chromosome', 'basepair', 'gwas_result_gwas_run', 'pval', 'cofactor', '_order', 'null_pval', 'model_added_pval', 'model', 'pcs']
+  buf = io.StringIO()
+  gwas_results.to_csv(buf, columns=columns, header=False, index=False)
+  buf.seek(0)
+  cur = policy.cursor(conn)
+  with policy.file(conn):
+    if partitions.is_partitioned(cur, 'gwas_result'):
+      for chromosomeID in gwas_results['gwas_result_chromosome'].unique():
+        partitions.gwas_result_partition(cur, chromosomeID)
+    cur.execute("""CREATE TEMPORARY TABLE gwas_result_staging (
+                     gwas_result_chromosome INTEGER,
+                     basepair INTEGER,
+                     gwas_result_gwas_run INTEGER,
+                     pval NUMERIC,
+                     cofactor NUMERIC,
+                     _order NUMERIC,
+                     null_pval NUMERIC,
+                     model_added_pval NUMERIC,
+                     model TEXT,
+                     pcs INTEGER[]
+                   );""")
+    cur.copy_expert("COPY gwas_result_staging (%s) FROM STDIN WITH (FORMAT csv);" % ', '.join(columns), buf)
+    new_gwas_result_IDs = []
+    for partition in detached:
+      cur.execute("""INSERT INTO %s(%s)
+                     SELECT %s FROM gwas_result_staging
+                     WHERE gwas_result_chromosome = %%s
+                     ON CONFLICT DO NOTHING
+                     RETURNING gwas_result_id;""" % (partition.name, ', '.join(columns), ', '.join(columns)), (partition.bounds['gwas_result_chromosome'],))
+      new_gwas_result_IDs.extend(row[0] for row in cur.fetchall())
+    cur.execute("""INSERT INTO gwas_result(%s)
+                   SELECT %s FROM gwas_result_staging
+                   WHERE gwas_result_chromosome <> ALL(%%s)
+                   ON CONFLICT DO NOTHING
+                   RETURNING gwas_result_id;""" % (', '.join(columns), ', '.join(columns)), ([partition.bounds['gwas_result_chromosome'] for partition in detached],))
+    new_gwas_result_IDs.extend(row[0] for row in cur.fetchall())
+    cur.execute("DROP TABLE gwas_result_staging;")
+    policy.row(conn, len(new_gwas_result_IDs))
   return new_gwas_result_IDs
+
+
+def insert_gwas_runs_and_results_from_file(conn, speciesID, gwas_results_file, gwas_algorithm_ID, missing_snp_cutoff_value, missing_line_cutoff_value, imputationMethodID, genotypeVersionID, kinshipID, populationStructureID, minor_allele_frequency_cutoff_value, chunksize=100000, policy=None, detached=False):
+  """Inserts the GWAS runs and GWAS results of a file into database
+
+  This function reads a GWAS results file once, in chunks of bounded size. The runs of each chunk
+  that have not been seen yet are upserted with :func:`upsert_gwas_runs`, and its results are loaded
+  with :func:`copy_gwas_results` against the accumulated run, trait and chromosome IDs
+
+  :param conn: psycopg2 connection
+  :type conn: connection object
+  :param speciesID: :ref:`species_id <species_class>`
+  :type speciesID: integer
+  :param gwas_results_file: absolute path to input file
+  :type gwas_results_file: string
+  :param gwas_algorithm_ID: :ref:`gwas_algorithm_id <gwas_algorithm_class>`
+  :type gwas_algorithm_ID: integer
+  :param missing_snp_cutoff_value:
+  :type missing_snp_cutoff_value: numeric
+  :param missing_line_cutoff_value:
+  :type missing_line_cutoff_value: numeric
+  :param imputationMethodID: :ref:`imputation_method_id <imputation_method_class>`
+  :type imputationMethodID: integer
+  :param genotypeVersionID: :ref:`genotype_version_id <genotype_version_class>`
+  :type genotypeVersionID: integer
+  :param kinshipID: :ref:`kinship_id <kinship_class>`
+  :type kinshipID: integer
+  :param populationStructureID: :ref:`population_structure_id <population_structure_class>`
+  :type populationStructureID: integer
+  :param minor_allele_frequency_cutoff_value:
+  :type minor_allele_frequency_cutoff_value: numeric
+  :param chunksize: number of rows of the file to hold in memory at once
+  :type chunksize: integer
+  :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+  :type policy: CommitPolicy object
+  :param detached: detach the gwas_result partition of each chromosome when it is first
+    seen, load its results straight into it, and attach them all again at the end.
+    If the load fails part way under a policy that has already committed, the partitions
+    stay detached until attached with :func:`partitions.attach`.
+  :type detached: boolean
+  :return: list of gwas_run_id and list of gwas_result_id
+  :rtype: tuple of lists of integers
+  :raises: :exc:`ValueError` if a chromosome or trait is not in the database,
+    or detached is set but gwas_result is not partitioned
+  """
+  import pandas as pd
+  from tqdm import tqdm
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
+  if detached and not partitions.is_partitioned(cur, 'gwas_result'):
+    raise ValueError('Cannot load into detached partitions, gwas_result is not partitioned')
+  detachedPartitions = []
+  chromosomeIDs = {}
+  traitIDs = {}
+  gwasRunIDs = {}
+  new_gwas_result_IDs = []
+  reader = pd.read_csv(gwas_results_file, dtype={'SNP': str, 'PCs': str}, float_precision='round_trip', chunksize=chunksize)
+  with policy.file(conn):
+    for df in tqdm(reader, desc="GWAS Results from %s" % gwas_results_file):
+      df['chromosome'], df['basepair'] = ph.split_snp_names(df['SNP'])
+
+      newChromosomes = set(df['chromosome'].unique()) - set(chromosomeIDs)
+      if newChromosomes:
+        chromosomeIDs.update(find.find_chromosomes(conn, newChromosomes, speciesID))
+        missingChromosomes = sorted(newChromosomes - set(chromosomeIDs))
+        if missingChromosomes:
+          raise ValueError('Chromosomes not found in database: %s' % ', '.join(missingChromosomes))
+        if detached:
+          for chromosomeName in sorted(newChromosomes):
+            partition = partitions.gwas_result_partition(cur, chromosomeIDs[chromosomeName])
+            partitions.detach(cur, partition)
+            detachedPartitions.append(partition)
+
+      runs = df[['trait', 'nSNPs', 'nLines']].drop_duplicates().itertuples(index=False, name=None)
+      newRuns = [run for run in runs if run not in gwasRunIDs]
+      if newRuns:
+        newTraits = set(run[0] for run in newRuns) - set(traitIDs)
+        if newTraits:
+          traitIDs.update(find.find_traits(conn, newTraits))
+          missingTraits = sorted(newTraits - set(traitIDs))
+          if missingTraits:
+            raise ValueError('Traits not found in database: %s' % ', '.join(missingTraits))
+        runKeys = [(traitIDs[trait], nsnps, nlines) for trait, nsnps, nlines in newRuns]
+        runIDs = upsert_gwas_runs(conn, runKeys, gwas_algorithm_ID, genotypeVersionID, missing_snp_cutoff_value, missing_line_cutoff_value, minor_allele_frequency_cutoff_value, imputationMethodID, kinshipID, populationStructureID, policy)
+        for run, runKey in zip(newRuns, runKeys):
+          gwasRunIDs[run] = runIDs[runKey]
+
+      gwas_results = gwas_results_from_dataframe(df, chromosomeIDs, gwasRunIDs)
+      new_gwas_result_IDs.extend(copy_gwas_results(conn, gwas_results, policy, detachedPartitions))
+    for partition in detachedPartitions:
+      partitions.attach(cur, partition)
+  return list(gwasRunIDs.values()), new_gwas_result_IDs
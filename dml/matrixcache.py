@@ -0,0 +1,229 @@
+"""On-disk cache of genotype matrices fetched from the database"""
+# Each cached matrix is kept as three .npy files named
+#   v<genotype_version>_c<chromosome>_<hash of database and lines>_s<genotype stamp>.{calls,lines,positions}.npy
+# The stamp (see fetch.genotype_stamp) is read from the database on every lookup, so a
+# matrix is never served once genotypes of its chromosome have been written, whichever
+# process or cache directory wrote it. The insert functions also remove the matrices of
+# the default cache once such writes are committed, to free the space.
+import glob
+import hashlib
+import os
+import fetch
+
+DEFAULT_DIRECTORY = os.environ.get('BAXDB_MATRIX_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'baxdb', 'genotypes'))
+DEFAULT_MAX_BYTES = 10 * 1024 ** 3
+PARTS = ('calls', 'lines', 'positions')
+
+
+class MatrixCache(object):
+  """Cache of genotype matrices stored as .npy files and read back memory-mapped
+
+  .. _matrix_cache_class:
+
+  :param directory: directory holding the cached files, shared by every process that uses it
+  :type directory: string
+  :param max_bytes: size of the cache above which the least recently used matrices are evicted
+  :type max_bytes: integer
+
+  :example:
+    .. code-block:: python
+
+      cache = MatrixCache('/scratch/baxdb', max_bytes=50 * 1024 ** 3)
+      matrix, lines, positions = cache.fetch_genotype_matrix(conn, versionID, chromosomeID)
+  """
+  def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES):
+    self.directory = directory
+    self.max_bytes = max_bytes
+    self.hits = 0
+    self.misses = 0
+
+  def __repr__(self):
+    return "<%s: {directory = %r, max_bytes = %r}>" % (self.__class__.__name__, self.directory, self.max_bytes)
+
+  def key(self, conn, genotype_version, chromosome, lines, stamp):
+    """Names the files of a matrix
+
+      :param conn: psycopg2 connection
+      :type conn: connection object
+      :param genotype_version: :ref:`genotype_version_id <genotype_version_class>`
+      :type genotype_version: integer
+      :param chromosome: :ref:`chromosome_id <chromosome_class>`
+      :type chromosome: integer
+      :param lines: :ref:`line_id <line_class>` of each row, or None for every line
+      :type lines: list of integers
+      :param stamp: stamp of the chromosome's genotypes (see :func:`fetch.genotype_stamp`)
+      :type stamp: string
+      :return: path of the files, without the part and extension
+      :rtype: string
+    """
+    lineKey = 'all' if lines is None else ','.join(str(int(line)) for line in lines)
+    digest = hashlib.sha1(('%s|%s' % (getattr(conn, 'dsn', None), lineKey)).encode()).hexdigest()[:16]
+    return os.path.join(self.directory, 'v%d_c%d_%s_s%s' % (int(genotype_version), int(chromosome), digest, stamp))
+
+  def load(self, key):
+    """Opens a cached matrix, memory-mapped and read-only
+
+      :param key: path from :meth:`key`
+      :type key: string
+      :return: allele calls, line_id of each row, variant_pos of each column; or None if not cached
+      :rtype: tuple
+    """
+    import numpy as np
+    try:
+      parts = tuple(np.load('%s.%s.npy' % (key, part), mmap_mode='r') for part in PARTS)
+    except (IOError, OSError, ValueError):
+      return None
+    # Mark as recently used, for eviction
+    os.utime('%s.calls.npy' % key, None)
+    matrix, lines, positions = parts
+    return matrix, lines.tolist(), positions
+
+  def store(self, key, matrix, lines, positions):
+    """Writes a matrix into the cache, then evicts down to the size limit
+
+      Each file is written under a temporary name and renamed into place, so other
+      processes never read a partly written file. Copies of the same matrix under
+      older stamps are removed.
+
+      :param key: path from :meth:`key`
+      :type key: string
+      :param matrix: allele calls
+      :type matrix: numpy array of int8
+      :param lines: line_id of each row
+      :type lines: list of integers
+      :param positions: variant_pos of each column
+      :type positions: numpy array of int64
+    """
+    import numpy as np
+    os.makedirs(self.directory, exist_ok=True)
+    for path in glob.glob('%s_s*.calls.npy' % key.rsplit('_s', 1)[0]):
+      if path[:-len('.calls.npy')] != key:
+        self.remove(path[:-len('.calls.npy')])
+    # calls is written last, since load() treats it as the marker of a complete entry
+    for part, array in (('lines', np.asarray(lines, dtype=np.int64)), ('positions', positions), ('calls', matrix)):
+      path = '%s.%s.npy' % (key, part)
+      temporary = '%s.%d.tmp' % (path, os.getpid())
+      with open(temporary, 'wb') as f:
+        np.save(f, array)
+      os.replace(temporary, path)
+    self.evict()
+
+  def entries(self):
+    """Lists the cached matrices
+
+      :return: (last use, total bytes, key) of each matrix, least recently used first
+      :rtype: list of tuples
+    """
+    entries = []
+    for path in glob.glob(os.path.join(self.directory, '*.calls.npy')):
+      key = path[:-len('.calls.npy')]
+      try:
+        lastUsed = os.path.getmtime(path)
+        size = sum(os.path.getsize('%s.%s.npy' % (key, part)) for part in PARTS if os.path.exists('%s.%s.npy' % (key, part)))
+      except OSError:
+        continue
+      entries.append((lastUsed, size, key))
+    entries.sort()
+    return entries
+
+  def evict(self):
+    """Removes the least recently used matrices until the cache fits in ``max_bytes``
+
+      Files that are still memory-mapped stay readable until they are closed.
+
+      :return: number of matrices removed
+      :rtype: integer
+    """
+    entries = self.entries()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, key in entries:
+      if total <= self.max_bytes:
+        break
+      self.remove(key)
+      total -= size
+      removed += 1
+    return removed
+
+  def remove(self, key):
+    """Removes the files of one matrix
+
+      :param key: path from :meth:`key`
+      :type key: string
+    """
+    for part in PARTS:
+      try:
+        os.remove('%s.%s.npy' % (key, part))
+      except OSError:
+        pass
+
+  def invalidate(self, genotype_version, chromosome):
+    """Removes every matrix of a genotype version and chromosome, whatever its lines
+
+      :param genotype_version: :ref:`genotype_version_id <genotype_version_class>`
+      :type genotype_version: integer
+      :param chromosome: :ref:`chromosome_id <chromosome_class>`
+      :type chromosome: integer
+      :return: number of matrices removed
+      :rtype: integer
+    """
+    paths = glob.glob(os.path.join(self.directory, 'v%d_c%d_*.calls.npy' % (int(genotype_version), int(chromosome))))
+    for path in paths:
+      self.remove(path[:-len('.calls.npy')])
+    return len(paths)
+
+  def clear(self):
+    """Removes every cached matrix"""
+    for _, _, key in self.entries():
+      self.remove(key)
+
+  def fetch_genotype_matrix(self, conn, genotype_version, chromosome, lines=None):
+    """Fetches the genotypes of one chromosome, from the cache if possible
+
+      This function returns the same as :func:`fetch.fetch_genotype_matrix`, except
+      that the matrix and positions are read-only memory maps of the cached files.
+      A cached matrix is only used if the chromosome's genotypes have not changed
+      since it was fetched, which costs one small query.
+
+      :param conn: psycopg2 connection
+      :type conn: connection object
+      :param genotype_version: :ref:`genotype_version_id <genotype_version_class>`
+      :type genotype_version: integer
+      :param chromosome: :ref:`chromosome_id <chromosome_class>`
+      :type chromosome: integer
+      :param lines: :ref:`line_id <line_class>` of each row, in order; defaults to every line genotyped for the chromosome, by line_id
+      :type lines: list of integers
+      :return: allele calls, line_id of each row, variant_pos of each column
+      :rtype: tuple of (numpy array of int8, list of integers, numpy array of int64)
+    """
+    stamp = fetch.genotype_stamp(conn, genotype_version, chromosome)
+    key = self.key(conn, genotype_version, chromosome, lines, stamp)
+    cached = self.load(key)
+    if cached is not None:
+      self.hits += 1
+      return cached
+    self.misses += 1
+    matrix, lines, positions = fetch.fetch_genotype_matrix(conn, genotype_version, chromosome, lines)
+    # Genotypes committed while the matrix was read may be in it only in part
+    if fetch.genotype_stamp(conn, genotype_version, chromosome) != stamp:
+      return matrix, lines, positions
+    self.store(key, matrix, lines, positions)
+    return self.load(key) or (matrix, lines, positions)
+
+
+# Used by the insert functions to remove matrices once new genotypes are committed
+cache = MatrixCache()
+
+def invalidate(genotype_version, chromosome):
+  """Removes every matrix of a genotype version and chromosome from the default cache
+
+    The insert functions call this through :meth:`CommitPolicy.after_commit <commitpolicy.CommitPolicy.after_commit>`,
+    so that no reader can cache the chromosome again from before the commit
+
+    :param genotype_version: :ref:`genotype_version_id <genotype_version_class>`
+    :type genotype_version: integer
+    :param chromosome: :ref:`chromosome_id <chromosome_class>`
+    :type chromosome: integer
+  """
+  if genotype_version is not None and chromosome is not None:
+    cache.invalidate(genotype_version, chromosome)
@@ -156,8 +156,8 @@ class phenotype(AutoRepr):
   :type phenotype_line: integer
   :param phenotype_trait: *required.* references :ref:`traid_id <trait_class>`
   :type phenotype_trait: integer
-  :param phenotype_value: *required.*
-  :type phenotype_value: string
+  :param phenotype_value: *required.* stored as double precision, keeping the text when it is not a number or has more digits than a double holds
+  :type phenotype_value: float or string
 
   """
   def __init__(self, phenotype_line, phenotype_trait, phenotype_value):
@@ -0,0 +1,102 @@
+"""Packs allele calls four to a byte for the genotype_packed column"""
+# A packed genotype is a 4-byte big-endian count of calls followed by the calls,
+# two bits each, the first call of every byte in its lowest bits. Each call is
+# stored as call + 1, so missing (-1) is 0 and 0, 1 and 2 are 1, 2 and 3.
+# The unpacking functions in ./c/packed_genotype.c read the same layout.
+import struct
+
+HEADER = struct.Struct('!i')
+SHIFTS = (0, 2, 4, 6)
+
+
+def packed_length(ncalls):
+  """Finds the size of a packed genotype
+
+    :param ncalls: number of calls
+    :type ncalls: integer
+    :return: bytes, including the count
+    :rtype: integer
+  """
+  return HEADER.size + (ncalls + 3) // 4
+
+
+def pack_calls(calls):
+  """Packs the allele calls of one line
+
+    :param calls: allele calls, each -1 (missing), 0, 1 or 2
+    :type calls: numpy array of int8
+    :return: packed genotype
+    :rtype: bytes
+    :raises: :exc:`ValueError` if a call is not -1, 0, 1 or 2
+  """
+  import numpy as np
+  calls = np.asarray(calls, dtype=np.int8)
+  if calls.ndim != 1:
+    raise ValueError('Calls of one line must be one-dimensional, not %d-dimensional' % calls.ndim)
+  return pack_matrix(calls[np.newaxis, :])[0]
+
+
+def pack_matrix(matrix):
+  """Packs the allele calls of many lines, each into its own packed genotype
+
+    :param matrix: allele calls, one row per line
+    :type matrix: numpy array of int8
+    :return: packed genotype of each row
+    :rtype: list of bytes
+    :raises: :exc:`ValueError` if a call is not -1, 0, 1 or 2
+  """
+  import numpy as np
+  matrix = np.asarray(matrix, dtype=np.int8)
+  if matrix.size and (matrix.min() < -1 or matrix.max() > 2):
+    raise ValueError('Calls must be -1 (missing), 0, 1 or 2 to be packed')
+  nrows, ncalls = matrix.shape
+  codes = np.zeros((nrows, (ncalls + 3) // 4 * 4), dtype=np.uint8)
+  codes[:, :ncalls] = matrix + 1
+  codes = codes.reshape(nrows, -1, 4)
+  packed = codes[:, :, 0] | (codes[:, :, 1] << 2) | (codes[:, :, 2] << 4) | (codes[:, :, 3] << 6)
+  header = HEADER.pack(ncalls)
+  return [header + row.tobytes() for row in packed]
+
+
+def unpack_calls(data, out=None):
+  """Unpacks the allele calls of one line
+
+    :param data: packed genotype
+    :type data: bytes
+    :param out: array to unpack into, which must have one element per call
+    :type out: numpy array of int8
+    :return: allele calls, with -1 for missing
+    :rtype: numpy array of int8
+    :raises: :exc:`ValueError` if data is shorter than its count of calls, or out is the wrong size
+  """
+  import numpy as np
+  ncalls = HEADER.unpack_from(data)[0]
+  if len(data) < packed_length(ncalls):
+    raise ValueError('Packed genotype of %d calls needs %d bytes, but has %d' % (ncalls, packed_length(ncalls), len(data)))
+  if out is None:
+    out = np.empty(ncalls, dtype=np.int8)
+  elif out.shape[0] != ncalls:
+    raise ValueError('Expected %d calls, found %d' % (out.shape[0], ncalls))
+  packed = np.frombuffer(data, dtype=np.uint8, count=(ncalls + 3) // 4, offset=HEADER.size)
+  codes = (packed[:, np.newaxis] >> np.array(SHIFTS, dtype=np.uint8)) & 3
+  out[:] = codes.reshape(-1)[:ncalls]
+  out -= 1
+  return out
+
+
+def unpack_matrix(rows):
+  """Unpacks the packed genotypes of many lines into a lines x calls matrix
+
+    :param rows: packed genotype of each line, all with the same number of calls
+    :type rows: list of bytes
+    :return: allele calls, one row per line
+    :rtype: numpy array of int8
+    :raises: :exc:`ValueError` if the genotypes do not all have the same number of calls
+  """
+  import numpy as np
+  rows = list(rows)
+  ncalls = HEADER.unpack_from(rows[0])[0] if rows else 0
+  matrix = np.empty((len(rows), ncalls), dtype=np.int8)
+  for i, data in enumerate(rows):
+    unpack_calls(data, out=matrix[i])
+  return matrix
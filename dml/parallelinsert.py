@@ -0,0 +1,194 @@
+"""Loads the variants and genotypes of many chromosomes in parallel"""
+# Each chromosome's .pos/.012/.indv files are handed to a worker process with its own
+# database connection. Blocks of variant and genotype IDs are reserved up front, in
+# chromosome order, so the IDs come out exactly as if the files were loaded one after
+# another by insertMaize282.py.
+import os
+import multiprocessing
+import traceback
+import insert
+import parsinghelpers as ph
+import partitions
+from commitpolicy import CommitPolicy
+from dbconnect import pooled_connection
+
+
+def reserve_ids(conn, table, column, count):
+  """Reserves a contiguous block of IDs from the sequence behind a SERIAL column
+
+  This function advances the sequence past the block so that no other insert draws
+  an ID from it. It assumes no one else is inserting into the table at the same time.
+
+  :param conn: psycopg2 connection
+  :type conn: connection object
+  :param table: name of table
+  :type table: string
+  :param column: name of SERIAL column
+  :type column: string
+  :param count: number of IDs to reserve
+  :type count: integer
+  :return: first ID of the block, or None if count is 0
+  :rtype: integer
+  """
+  if count == 0:
+    return None
+  cur = conn.cursor()
+  cur.execute("SELECT pg_get_serial_sequence(%s, %s);", (table, column))
+  sequence = cur.fetchone()[0]
+  cur.execute("SELECT nextval(%s);", (sequence,))
+  firstID = cur.fetchone()[0]
+  cur.execute("SELECT setval(%s, %s);", (sequence, firstID + count - 1))
+  conn.commit()
+  cur.close()
+  return firstID
+
+
+def create_genotype_partitions(conn, genotype_versionID, chromosomeIDs):
+  """Creates the genotype partitions of every chromosome before the workers start
+
+  Workers creating the same partitions at once would conflict, so they are created
+  and committed up front. Nothing is done unless genotype is partitioned.
+
+  :param conn: psycopg2 connection
+  :type conn: connection object
+  :param genotype_versionID: :ref:`genotype_version <genotype_version_class>`
+  :type genotype_versionID: integer
+  :param chromosomeIDs: :ref:`chromosome_id <chromosome_class>` of each chromosome
+  :type chromosomeIDs: list of integers
+  :return: partition of each chromosome, or an empty list if genotype is not partitioned
+  :rtype: list of Partition
+  """
+  cur = conn.cursor()
+  genotypePartitions = []
+  if partitions.is_partitioned(cur, 'genotype'):
+    for chromosomeID in chromosomeIDs:
+      genotypePartitions.append(partitions.genotype_partition(cur, genotype_versionID, chromosomeID))
+  conn.commit()
+  cur.close()
+  return genotypePartitions
+
+
+def set_partitions_detached(conn, genotypePartitions, detached):
+  """Detaches or attaches the genotype partitions of a parallel load, all in one transaction
+
+  Detaching and attaching lock the parent table, so this is done once before the
+  workers start and once after they have all finished, rather than by each worker.
+
+  :param conn: psycopg2 connection
+  :type conn: connection object
+  :param genotypePartitions: partitions to detach or attach
+  :type genotypePartitions: list of Partition
+  :param detached: detach the partitions that are attached, or else attach the ones that are detached
+  :type detached: boolean
+  """
+  cur = conn.cursor()
+  for partition in genotypePartitions:
+    if partitions.is_attached(cur, partition) == detached:
+      if detached:
+        partitions.detach(cur, partition)
+      else:
+        partitions.attach(cur, partition)
+  conn.commit()
+  cur.close()
+
+
+def insert_chromosome_files(task):
+  """Loads the variants and genotypes of one chromosome
+
+  This function runs in a worker process. It checks out a connection from the worker's
+  own pool, which stays open for the next chromosome the worker loads, and commits once
+  per file. Errors are returned rather than raised so that the other chromosomes finish.
+
+  :param task: chromosome_id, the .pos, .012 and .indv file paths, species_id,
+    population_id, genotype_version_id, the first variant and genotype IDs reserved for it,
+    whether to pack the genotypes, and whether its partition has been detached
+  :type task: tuple
+  :return: chromosome_id, variant IDs, genotype IDs, and the traceback if loading failed
+  :rtype: tuple
+  """
+  chromosomeID, variantPosFile, genotypeFile, lineFile, speciesID, populationID, genotype_versionID, firstVariantID, firstGenotypeID, packed, detached = task
+  try:
+    with pooled_connection() as conn:
+      policy = CommitPolicy(CommitPolicy.FILE)
+      variantIDs = insert.copy_variants_from_file(conn, variantPosFile, speciesID, chromosomeID, policy, firstVariantID=firstVariantID)
+      linelist = ph.parse_lines_from_file(lineFile)
+      lineIDlist = ph.convert_linelist_to_lineIDlist(conn, linelist, populationID)
+      # Workers are daemonic and cannot start a pool of their own, so each parses its file in one process
+      calls = ph.iter_genotypes_from_file(genotypeFile)
+      genotypeIDs = insert.copy_genotypes(conn, lineIDlist, chromosomeID, calls, genotype_versionID, policy, firstGenotypeID=firstGenotypeID, packed=packed, detached=detached)
+      policy.finish(conn)
+    return chromosomeID, variantIDs, genotypeIDs, None
+  except Exception:
+    return chromosomeID, None, None, traceback.format_exc()
+
+
+def insert_chromosomes_in_parallel(conn, chromosomeFiles, speciesID, populationID, genotype_versionID, workers=None, packed=False, detached=False):
+  """Inserts the variants and genotypes of many chromosomes in parallel
+
+  This function produces the same IDs and contents as calling
+  :func:`insert.insert_variants_from_file` for every chromosome in order and then
+  :func:`insert.insert_genotypes_from_file` for every chromosome in order.
+  The lines in the .indv files must already be in the database.
+
+  :param conn: psycopg2 connection, used to reserve IDs
+  :type conn: connection object
+  :param chromosomeFiles: (chromosome_id, .pos file, .012 file, .012.indv file) of each chromosome, in load order
+  :type chromosomeFiles: list of tuples
+  :param speciesID: :ref:`species <species_class>`
+  :type speciesID: integer
+  :param populationID: :ref:`population <population_class>`
+  :type populationID: integer
+  :param genotype_versionID: :ref:`genotype_version <genotype_version_class>`
+  :type genotype_versionID: integer
+  :param workers: number of worker processes, defaults to the number of CPUs
+  :type workers: integer
+  :param packed: store the genotypes packed four calls to a byte (see :func:`insert.copy_genotypes`)
+  :type packed: boolean
+  :param detached: detach every chromosome's genotype partition before the workers start, load
+    straight into the partitions, and attach them all again once the workers have finished
+    (see :func:`set_partitions_detached`). Queries on genotype do not see the chromosomes meanwhile.
+  :type detached: boolean
+  :return: variant IDs and genotype IDs of each chromosome, keyed by chromosome_id
+  :rtype: dict
+  :raises: :exc:`RuntimeError` listing every chromosome that failed, after the others have finished,
+    :exc:`ValueError` if detached is set but genotype is not partitioned
+  """
+  from tqdm import tqdm
+  variantCounts = [ph.count_lines(posFile) for _, posFile, _, _ in chromosomeFiles]
+  genotypeCounts = [ph.count_lines(lineFile) for _, _, _, lineFile in chromosomeFiles]
+  firstVariantID = reserve_ids(conn, 'variant', 'variant_id', sum(variantCounts))
+  firstGenotypeID = reserve_ids(conn, 'genotype', 'genotype_id', sum(genotypeCounts))
+  genotypePartitions = create_genotype_partitions(conn, genotype_versionID, [chromosomeID for chromosomeID, _, _, _ in chromosomeFiles])
+  if detached and not genotypePartitions:
+    raise ValueError('Cannot load into detached partitions, genotype is not partitioned')
+
+  tasks = []
+  variantOffset = 0
+  genotypeOffset = 0
+  for (chromosomeID, posFile, genotypeFile, lineFile), variantCount, genotypeCount in zip(chromosomeFiles, variantCounts, genotypeCounts):
+    tasks.append((chromosomeID, posFile, genotypeFile, lineFile, speciesID, populationID, genotype_versionID,
+                  firstVariantID + variantOffset if variantCount else None,
+                  firstGenotypeID + genotypeOffset if genotypeCount else None, packed, detached))
+    variantOffset += variantCount
+    genotypeOffset += genotypeCount
+
+  workers = min(workers or os.cpu_count() or 1, len(tasks)) or 1
+  insertedIDs = {}
+  errors = []
+  if detached:
+    set_partitions_detached(conn, genotypePartitions, True)
+  pool = multiprocessing.Pool(workers)
+  try:
+    for chromosomeID, variantIDs, genotypeIDs, error in tqdm(pool.imap_unordered(insert_chromosome_files, tasks), total=len(tasks), desc="Chromosomes"):
+      if error is not None:
+        errors.append('chromosome %s:\n%s' % (chromosomeID, error))
+      else:
+        insertedIDs[chromosomeID] = (variantIDs, genotypeIDs)
+  finally:
+    pool.close()
+    pool.join()
+    if detached:
+      set_partitions_detached(conn, genotypePartitions, False)
+  if errors:
+    raise RuntimeError('%d of %d chromosomes failed to load\n%s' % (len(errors), len(tasks), '\n'.join(errors)))
+  return insertedIDs
@@ -1,4 +1,5 @@
-import pandas as pd
+import os
+import re
 import csv
 import find
 
@@ -54,19 +55,22 @@ def parse_lines_from_file(lineFile):
 def convert_linelist_to_lineIDlist(conn, linelist, populationID):
   """Converts list of named lines to list of line IDs
 
-  :param linelist:
-  :type linelist: 
-  :param populationID:
+  All lines are looked up with a single query.
+
+  :param linelist: names of lines
+  :type linelist: list of strings
+  :param populationID: :ref:`population id <population_class>`
   :type populationID: integer
-  :return: list of line IDs
+  :return: list of line IDs, in the same order as linelist
   :rtype: list
+  :raises: :exc:`ValueError` listing every line not found in the population
 
   """
-  lineIDlist = []
-  for linename in linelist:
-    lineID = find.find_line(conn, linename, populationID)
-    lineIDlist.append(lineID)
-  return lineIDlist
+  lineIDs = find.find_lines(conn, linelist, populationID)
+  missingLines = [linename for linename in linelist if linename not in lineIDs]
+  if missingLines:
+    raise ValueError('%d lines not found in population %s: %s' % (len(missingLines), populationID, ', '.join(missingLines)))
+  return [lineIDs[linename] for linename in linelist]
 
 def parse_variants_from_file(variantPosFile):
   """Converts a newline-delimtied list of variant positions into a list, ignoring the first column of data
@@ -110,6 +114,236 @@ def parse_genotypes_from_file(genotypeFile):
 
   return rawGenos
 
+def count_lines(filename):
+  """Counts the lines of a file
+
+  :param filename: file path
+  :type filename: string
+  :return: number of lines, including a last line without a trailing newline
+  :rtype: integer
+
+  """
+  count = 0
+  block = b''
+  with open(filename, 'rb') as f:
+    for block in iter(lambda: f.read(1 << 20), b''):
+      count += block.count(b'\n')
+  if block and not block.endswith(b'\n'):
+    count += 1
+  return count
+
+def parse_genotype_row(row):
+  """Converts one row of a .012 file to an array of allele calls, ignoring the first column since it is an index term
+
+  The row is decoded as raw bytes with NumPy, so no Python object is created per allele call.
+
+  :param row: one line of a .012 file
+  :type row: bytes
+  :return: allele calls
+  :rtype: numpy array of int8
+  :raises: :exc:`ValueError` if a column holds anything but a single-digit call (``-1``, ``0``, ``1``, ``2``)
+
+  """
+  import numpy as np
+  start = row.index(b'\t') + 1
+  buf = np.frombuffer(row, dtype=np.uint8, offset=start)
+  positions = np.flatnonzero((buf >= ord('0')) & (buf <= ord('9')))
+  calls = (buf[positions] - ord('0')).astype(np.int8)
+  # A call is negative if its digit follows a minus sign
+  previous = np.empty_like(buf)
+  previous[0] = 0
+  previous[1:] = buf[:-1]
+  np.negative(calls, out=calls, where=previous[positions] == ord('-'))
+  columns = np.count_nonzero(buf == ord('\t')) + 1
+  if calls.shape[0] != columns:
+    raise ValueError('Expected %d single-digit allele calls, found %d' % (columns, calls.shape[0]))
+  return calls
+
+def iter_genotypes_from_file(genotypeFile):
+  """Reads a newline-delimited file of genotypes (for a given chromosome) one line at a time
+
+  Only one line of the file is held in memory at a time.
+
+  :param genotypeFile: file path for genotype information on allele calls, ignoring the first column since it is an index term
+  :type genotypeFile: string
+  :return: allele calls of each line, in file order
+  :rtype: generator of numpy arrays of int8
+
+  """
+  with open(genotypeFile, 'rb') as f:
+    for row in f:
+      if row.strip():
+        yield parse_genotype_row(row)
+
+def parse_genotype_matrix_from_file(genotypeFile):
+  """Converts a newline-delimited file of genotypes (for a given chromosome) to a matrix of allele calls
+
+  The matrix is allocated once, at one byte per call, and filled one line at a time.
+
+  :param genotypeFile: file path for genotype information on allele calls, ignoring the first column since it is an index term
+  :type genotypeFile: string
+  :return: allele calls, one row per line of the file
+  :rtype: 2-D numpy array of int8
+
+  """
+  import numpy as np
+  genotypes = None
+  for i, calls in enumerate(iter_genotypes_from_file(genotypeFile)):
+    if genotypes is None:
+      genotypes = np.empty((count_lines(genotypeFile), calls.shape[0]), dtype=np.int8)
+    genotypes[i] = calls
+  if genotypes is None:
+    return np.empty((0, 0), dtype=np.int8)
+  return genotypes[:i + 1]
+
+def split_file_on_lines(filename, parts):
+  """Splits a file into byte ranges that start and end on line boundaries
+
+  Each boundary is found by seeking to the next k/parts of the file and reading on to
+  the end of that line, so only about one line per range is read.
+
+  :param filename: file path
+  :type filename: string
+  :param parts: number of ranges to aim for
+  :type parts: integer
+  :return: (start, end) of each non-empty range, in file order, as byte offsets
+  :rtype: list of tuples
+
+  """
+  size = os.path.getsize(filename)
+  boundaries = [0]
+  with open(filename, 'rb') as f:
+    for k in range(1, parts):
+      offset = size * k // parts
+      if offset <= boundaries[-1]:
+        continue
+      # Read from the byte before, so that a range already starting on a line keeps its start
+      f.seek(offset - 1)
+      f.readline()
+      if f.tell() >= size:
+        break
+      if f.tell() > boundaries[-1]:
+        boundaries.append(f.tell())
+  boundaries.append(size)
+  return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+def iter_genotype_rows(genotypeFile, start, end):
+  """Reads the non-blank rows of a .012 file within a byte range one line at a time
+
+  :param genotypeFile: file path for genotype information on allele calls
+  :type genotypeFile: string
+  :param start: offset of the first byte of the range, at the start of a line
+  :type start: integer
+  :param end: offset past the last byte of the range, at the start of a line or the end of the file
+  :type end: integer
+  :return: rows of the file
+  :rtype: generator of bytes
+
+  """
+  with open(genotypeFile, 'rb') as f:
+    f.seek(start)
+    offset = start
+    while offset < end:
+      row = f.readline()
+      if not row:
+        break
+      offset += len(row)
+      if row.strip():
+        yield row
+
+def count_genotype_range(genotypeFile, start, end):
+  """Counts the non-blank rows of a .012 file within a byte range
+
+  This function runs in a worker process of :func:`parse_genotype_matrix_from_file_in_parallel`.
+
+  :param genotypeFile: file path for genotype information on allele calls
+  :type genotypeFile: string
+  :param start: offset of the first byte of the range (see :func:`iter_genotype_rows`)
+  :type start: integer
+  :param end: offset past the last byte of the range
+  :type end: integer
+  :return: number of rows
+  :rtype: integer
+
+  """
+  return sum(1 for _ in iter_genotype_rows(genotypeFile, start, end))
+
+def parse_genotype_range(genotypeFile, start, end, matrixFile, shape, firstRow):
+  """Parses the rows of a .012 file within a byte range into a shared matrix of allele calls
+
+  This function runs in a worker process of :func:`parse_genotype_matrix_from_file_in_parallel`.
+
+  :param genotypeFile: file path for genotype information on allele calls
+  :type genotypeFile: string
+  :param start: offset of the first byte of the range (see :func:`iter_genotype_rows`)
+  :type start: integer
+  :param end: offset past the last byte of the range
+  :type end: integer
+  :param matrixFile: file backing the shared matrix
+  :type matrixFile: string
+  :param shape: number of rows and columns of the whole matrix
+  :type shape: tuple of integers
+  :param firstRow: row of the matrix to write the first row of the range to
+  :type firstRow: integer
+
+  """
+  import numpy as np
+  genotypes = np.memmap(matrixFile, dtype=np.int8, mode='r+', shape=tuple(shape))
+  for i, row in enumerate(iter_genotype_rows(genotypeFile, start, end)):
+    genotypes[firstRow + i] = parse_genotype_row(row)
+  genotypes.flush()
+  del genotypes
+
+def parse_genotype_matrix_from_file_in_parallel(genotypeFile, workers=None, directory=None):
+  """Converts a newline-delimited file of genotypes (for a given chromosome) to a matrix of allele calls using many processes
+
+  The file is split into byte ranges on line boundaries, and worker processes count the rows of
+  each range. Once the row counts have given each range its first row, the workers parse their range
+  one line at a time straight into their rows of a shared, memory-mapped int8 matrix, so no process
+  reads the whole file or holds more than one line of it.
+
+  :param genotypeFile: file path for genotype information on allele calls, ignoring the first column since it is an index term
+  :type genotypeFile: string
+  :param workers: number of worker processes, defaults to the number of CPUs
+  :type workers: integer
+  :param directory: directory for the file backing the shared matrix, defaults to ``/dev/shm`` when it exists
+  :type directory: string
+  :return: allele calls, one row per line of the file
+  :rtype: 2-D numpy memmap of int8
+
+  .. note::
+    The backing file is removed before returning; the matrix stays valid for as long as it is referenced.
+
+  """
+  import multiprocessing
+  import tempfile
+  import numpy as np
+  workers = workers or os.cpu_count() or 1
+  ranges = split_file_on_lines(genotypeFile, workers)
+  if not ranges:
+    return np.empty((0, 0), dtype=np.int8)
+  with open(genotypeFile, 'rb') as f:
+    columns = parse_genotype_row(f.readline()).shape[0]
+  if directory is None and os.path.isdir('/dev/shm'):
+    directory = '/dev/shm'
+  pool = multiprocessing.Pool(min(workers, len(ranges)))
+  try:
+    rowCounts = pool.starmap(count_genotype_range, [(genotypeFile, start, end) for start, end in ranges])
+    shape = (sum(rowCounts), columns)
+    firstRows = np.cumsum([0] + rowCounts[:-1])
+    fd, matrixFile = tempfile.mkstemp(suffix='.int8', dir=directory)
+    try:
+      os.ftruncate(fd, max(shape[0] * shape[1], 1))
+      os.close(fd)
+      pool.starmap(parse_genotype_range, [(genotypeFile, start, end, matrixFile, shape, int(firstRow)) for (start, end), firstRow in zip(ranges, firstRows)])
+      genotypes = np.memmap(matrixFile, dtype=np.int8, mode='r+', shape=shape)
+    finally:
+      os.remove(matrixFile)
+  finally:
+    pool.close()
+    pool.join()
+  return genotypes
+
 def parse_unique_runs_from_gwas_results_file(filepath):
   """Convert :abbr:`GWAS(Genome-wide association studies)` run from file to 
   
@@ -137,11 +371,105 @@ def parse_unique_runs_from_gwas_results_file(filepath):
       "2_42047577",0.000000368637213827897,1,1,0.000000368637213827897,0.000000368637213827897,"ExtBIC","Co59_lmResid_NY06",15,115,NA
 
   """
-  gwas_runs = []
-  df = pd.read_csv(filepath)
-  for index, row in df.iterrows():
-    # Ignore duplicate entries based on trait, number of SNPs, and number of lines.
-    gwas_run = [row['trait'],row['nSNPs'],row['nLines']]
-    if gwas_run not in gwas_runs:
-      gwas_runs.append(gwas_run)
-  return gwas_runs
+  import pandas as pd
+  df = pd.read_csv(filepath, usecols=['trait', 'nSNPs', 'nLines'])
+  # Ignore duplicate entries based on trait, number of SNPs, and number of lines.
+  gwas_runs = df[['trait', 'nSNPs', 'nLines']].drop_duplicates()
+  return [list(gwas_run) for gwas_run in gwas_runs.itertuples(index=False, name=None)]
+
+
+def split_snp_names(snps):
+  """Splits SNP names from a GWAS results file into chromosome names and basepairs
+
+  :param snps: SNP names in the format ``<chromosome number>_<basepair>``. Example ``"4_217880534"``
+  :type snps: pandas Series of strings
+  :return: chromosome names (``"chr4"``) and basepairs (``217880534``)
+  :rtype: tuple of pandas Series
+
+  """
+  snp = snps.str.split('_', n=1, expand=True)
+  return 'chr' + snp[0], snp[1].astype(int)
+
+
+# A double holds any decimal of up to 15 significant digits closely enough to print it back,
+# unless it is smaller than the smallest double with full precision
+EXACT_DIGITS = 15
+MIN_NORMAL = 2.2250738585072014e-308
+# Text that counts as a phenotype value: a plain decimal, optionally with an exponent.
+# ddl/migrate_phenotype_value.sql uses the same pattern, so both agree on what is a number.
+NUMBER_PATTERN = r'^\s*[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?\s*$'
+
+def phenotype_value_round_trips(text, value):
+  """Checks whether a phenotype value stored as a double reads back as the original text
+
+  :param text: value as written in the input file
+  :type text: string
+  :param value: value parsed from text
+  :type value: float
+  :return: True if the shortest decimal of value equals the decimal in text
+  :rtype: boolean
+
+  """
+  from decimal import Decimal, InvalidOperation
+  try:
+    return Decimal(text.strip()) == Decimal(repr(float(value)))
+  except InvalidOperation:
+    return False
+
+
+def split_phenotype_values(text):
+  """Splits phenotype values into the double precision value and the text to keep
+
+  Applies the rule of :func:`split_phenotype_value` to every row. Each decimal is
+  parsed with the same correctly rounded conversion as ``float()``, which bulk parsers
+  such as :func:`pandas.to_numeric` do not always match. Rows that are short decimals in
+  the range of full precision always round-trip, so only the others are checked one by one.
+
+  :param text: values as written in the input file
+  :type text: pandas Series of strings
+  :return: value of each row (NaN where not a number) and original text of each row (None where the value round-trips)
+  :rtype: tuple of (numpy array of float64, list)
+
+  """
+  import numpy as np
+  text = text.astype(str)
+  numbers = text.str.match(NUMBER_PATTERN).values
+  values = np.full(len(text), np.nan)
+  values[numbers] = text.values[numbers].astype(object).astype(np.float64)
+  digits = text.str.replace(r'[eE].*$', '', regex=True).str.replace(r'[^0-9]', '', regex=True).str.lstrip('0').str.len().values
+  exact = numbers & np.isfinite(values) & (digits <= EXACT_DIGITS) & (np.abs(values) >= MIN_NORMAL)
+  originals = [None] * len(text)
+  for i in np.flatnonzero(~exact):
+    value, originals[i] = split_phenotype_value(text.iat[i])
+    values[i] = np.nan if value is None else value
+  return values, originals
+
+
+def split_phenotype_value(value):
+  """Splits one phenotype value into the double precision value and the text to keep
+
+  The value is NULL, and the text kept, unless the text is a decimal (see
+  ``NUMBER_PATTERN``) within the range of a double. The text is also kept when
+  the double does not read back as the same number, such as when it has more
+  digits than a double holds. Numbers given as floats are taken as their shortest
+  text, so NaN and infinity are kept as text too.
+
+  :param value: value as a number, or as text
+  :type value: float or string
+  :return: value (None if not a number) and original text (None if the value round-trips)
+  :rtype: tuple
+
+  """
+  if value is None:
+    return None, None
+  if not isinstance(value, str):
+    value = repr(float(value))
+  if re.match(NUMBER_PATTERN, value) is None:
+    return None, value
+  number = float(value)
+  # Values that overflow to infinity, or underflow to zero, are out of range
+  if number in (float('inf'), float('-inf')) or (number == 0 and re.search(r'[1-9]', value.strip().split('e')[0].split('E')[0])):
+    return None, value
+  if not phenotype_value_round_trips(value, number):
+    return number, value
+  return number, None
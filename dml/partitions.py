@@ -0,0 +1,162 @@
+"""Creates, detaches and attaches the partitions of genotype and gwas_result"""
+# Only used when the tables were created with ddl/partitioned.sql. Partition names
+# are built from integer IDs, so they are safe to format into statements.
+import collections
+from contextlib import contextmanager
+
+# A partition of parent holding the rows where each column of bounds equals its value;
+# the last column is the one parent is partitioned by
+Partition = collections.namedtuple('Partition', ['name', 'parent', 'bounds'])
+
+
+def is_partitioned(cur, table):
+  """Finds whether a table is partitioned
+
+    :param cur: psycopg2 cursor
+    :type cur: cursor object
+    :param table: name of table
+    :type table: string
+    :return: True if the table was created with ``PARTITION BY``
+    :rtype: boolean
+  """
+  cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s);", (table,))
+  row = cur.fetchone()
+  return row is not None and row[0]
+
+
+def exists(cur, name):
+  """Finds whether a table exists
+
+    :param cur: psycopg2 cursor
+    :type cur: cursor object
+    :param name: name of table
+    :type name: string
+    :rtype: boolean
+  """
+  cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (name,))
+  return cur.fetchone()[0]
+
+
+def is_attached(cur, partition):
+  """Finds whether a partition is attached to its parent
+
+    :param cur: psycopg2 cursor
+    :type cur: cursor object
+    :param partition: partition
+    :type partition: Partition
+    :rtype: boolean
+  """
+  cur.execute("SELECT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(%s) AND inhparent = to_regclass(%s));", (partition.name, partition.parent))
+  return cur.fetchone()[0]
+
+
+def create_partition(cur, partition, subpartition_by=None):
+  """Creates a partition, unless it already exists
+
+    :param cur: psycopg2 cursor
+    :type cur: cursor object
+    :param partition: partition to create
+    :type partition: Partition
+    :param subpartition_by: column to partition the partition by, if it is partitioned in turn
+    :type subpartition_by: string
+  """
+  if exists(cur, partition.name):
+    return
+  column, value = list(partition.bounds.items())[-1]
+  SQL = "CREATE TABLE IF NOT EXISTS %s PARTITION OF %s FOR VALUES IN (%d)" % (partition.name, partition.parent, value)
+  if subpartition_by is not None:
+    SQL += " PARTITION BY LIST (%s)" % subpartition_by
+  cur.execute(SQL + ";")
+
+
+def genotype_partition(cur, genotype_version, chromosome):
+  """Finds the partition of genotype for a chromosome, creating it if needed
+
+    :param cur: psycopg2 cursor
+    :type cur: cursor object
+    :param genotype_version: :ref:`genotype_version_id <genotype_version_class>`
+    :type genotype_version: integer
+    :param chromosome: :ref:`chromosome_id <chromosome_class>`
+    :type chromosome: integer
+    :return: the partition, genotype_v<genotype_version>_c<chromosome>
+    :rtype: Partition
+  """
+  version = Partition('genotype_v%d' % int(genotype_version), 'genotype', {'genotype_genotype_version': int(genotype_version)})
+  create_partition(cur, version, subpartition_by='genotype_chromosome')
+  partition = Partition('%s_c%d' % (version.name, int(chromosome)), version.name,
+                        {'genotype_genotype_version': int(genotype_version), 'genotype_chromosome': int(chromosome)})
+  create_partition(cur, partition)
+  return partition
+
+
+def gwas_result_partition(cur, chromosome):
+  """Finds the partition of gwas_result for a chromosome, creating it if needed
+
+    :param cur: psycopg2 cursor
+    :type cur: cursor object
+    :param chromosome: :ref:`chromosome_id <chromosome_class>`
+    :type chromosome: integer
+    :return: the partition, gwas_result_c<chromosome>
+    :rtype: Partition
+  """
+  partition = Partition('gwas_result_c%d' % int(chromosome), 'gwas_result', {'gwas_result_chromosome': int(chromosome)})
+  create_partition(cur, partition)
+  return partition
+
+
+def detach(cur, partition):
+  """Detaches a partition, leaving it a table of its own
+
+    Rows loaded into the detached table skip routing through the parent, and queries
+    on the parent do not see them until the partition is attached again. Detaching
+    locks the parent until the transaction ends, so to load many partitions at once
+    detach them all and commit before loading (see
+    :func:`parallelinsert.insert_chromosomes_in_parallel`).
+
+    :param cur: psycopg2 cursor
+    :type cur: cursor object
+    :param partition: partition to detach
+    :type partition: Partition
+  """
+  cur.execute("ALTER TABLE %s DETACH PARTITION %s;" % (partition.parent, partition.name))
+
+
+def attach(cur, partition):
+  """Attaches a detached partition again
+
+    This function first adds a CHECK constraint matching the partition bounds, which
+    is validated with one scan of the partition, so that attaching does not scan it
+    again while holding a lock on the parent
+
+    :param cur: psycopg2 cursor
+    :type cur: cursor object
+    :param partition: partition to attach
+    :type partition: Partition
+  """
+  condition = ' AND '.join('%s = %d' % (column, value) for column, value in partition.bounds.items())
+  column, value = list(partition.bounds.items())[-1]
+  cur.execute("ALTER TABLE %s ADD CONSTRAINT %s_bounds CHECK (%s);" % (partition.name, partition.name, condition))
+  cur.execute("ALTER TABLE %s ATTACH PARTITION %s FOR VALUES IN (%d);" % (partition.parent, partition.name, value))
+  cur.execute("ALTER TABLE %s DROP CONSTRAINT %s_bounds;" % (partition.name, partition.name))
+
+
+@contextmanager
+def detached(cur, partitions):
+  """Detaches partitions for the duration of a load, then attaches them again
+
+    Partitions that are already detached, such as by whoever is running several
+    loads at once, are left to them and stay detached. If the load raises, the
+    partitions are left detached; rolling back the transaction undoes the detach
+    along with the load.
+
+    :param cur: psycopg2 cursor
+    :type cur: cursor object
+    :param partitions: partitions to detach
+    :type partitions: list of Partition
+  """
+  partitions = [partition for partition in partitions if is_attached(cur, partition)]
+  for partition in partitions:
+    detach(cur, partition)
+  yield
+  for partition in partitions:
+    attach(cur, partition)
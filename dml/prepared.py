@@ -0,0 +1,72 @@
+"""Runs the find and insert queries as server-side prepared statements"""
+# Each statement is parsed and planned by the server the first time a connection
+# runs it, and from then on only executed. Values are bound as parameters, so names
+# containing quotes are looked up correctly.
+import weakref
+
+# Names of the statements already prepared on each connection
+prepared = weakref.WeakKeyDictionary()
+
+
+def plain_value(value):
+  """Converts NumPy scalars, which psycopg2 cannot adapt, to Python values
+
+    :param value: value of a parameter
+    :type value: any
+    :return: value psycopg2 can adapt
+    :rtype: any
+  """
+  if type(value).__module__ == 'numpy':
+    return value.item()
+  return value
+
+
+def prepare(cur, name, SQL):
+  """Prepares a statement on the cursor's connection, unless it already is
+
+    :param cur: psycopg2 cursor
+    :type cur: cursor object
+    :param name: name of statement, unique per query
+    :type name: string
+    :param SQL: query with ``$1``, ``$2``, ... placeholders
+    :type SQL: string
+  """
+  names = prepared.setdefault(cur.connection, set())
+  if name not in names:
+    cur.execute("PREPARE %s AS %s" % (name, SQL.rstrip().rstrip(';')))
+    names.add(name)
+
+
+def execute(cur, name, SQL, args=()):
+  """Executes a prepared statement, preparing it first if needed
+
+    This function prepares the statement once per connection, then runs
+    ``EXECUTE name (...)`` with the arguments bound to its parameters
+
+    :param cur: psycopg2 cursor
+    :type cur: cursor object
+    :param name: name of statement, unique per query
+    :type name: string
+    :param SQL: query with ``$1``, ``$2``, ... placeholders
+    :type SQL: string
+    :param args: value of each placeholder, in order
+    :type args: tuple
+  """
+  prepare(cur, name, SQL)
+  args = tuple(plain_value(arg) for arg in args)
+  if args:
+    cur.execute("EXECUTE %s (%s);" % (name, ', '.join(['%s'] * len(args))), args)
+  else:
+    cur.execute("EXECUTE %s;" % name)
+
+
+def forget(conn):
+  """Forgets the statements prepared on a connection
+
+    Call this after the session has been reset (for example with ``DISCARD ALL``),
+    which drops its prepared statements on the server
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+  """
+  prepared.pop(conn, None)
@@ -0,0 +1,81 @@
+# The modules in dml/ import each other by bare name, so put dml/ on the path
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def conn():
+  """Connection to a scratch database given by BAXDB_TEST_DSN; tests using it are skipped without one"""
+  import psycopg2
+  dsn = os.environ.get('BAXDB_TEST_DSN')
+  if not dsn:
+    pytest.skip('BAXDB_TEST_DSN is not set')
+  try:
+    conn = psycopg2.connect(dsn)
+  except psycopg2.OperationalError as err:
+    pytest.skip('Cannot connect to %s: %s' % (dsn, err))
+  yield conn
+  conn.close()
+
+
+@pytest.fixture
+def baxdb(conn):
+  """conn with the tables of ddl/createtables.sql in a fresh schema, which is dropped afterwards
+
+  The database must already have the tinyint type and the functions of ddl/functions.sql.
+  """
+  from idcache import cache
+  cur = conn.cursor()
+  cur.execute("SELECT to_regtype('tinyint') IS NOT NULL AND to_regproc('array_multi_index') IS NOT NULL AND to_regproc('genotype_packed_index') IS NOT NULL;")
+  if not cur.fetchone()[0]:
+    conn.rollback()
+    pytest.skip('The database given by BAXDB_TEST_DSN lacks the tinyint type or the functions of ddl/functions.sql')
+  # The schema starts empty, so the DROP TABLE statements are left out; they would find the tables in public
+  with open(os.path.join(os.path.dirname(__file__), '..', '..', 'ddl', 'createtables.sql')) as f:
+    SQL = ''.join(line for line in f if not line.startswith('\\') and not line.startswith('DROP TABLE'))
+  cur.execute("DROP SCHEMA IF EXISTS baxdb_test CASCADE; CREATE SCHEMA baxdb_test; SET search_path TO baxdb_test, public;")
+  cur.execute(SQL)
+  conn.commit()
+  cache.clear()
+  yield conn
+  conn.rollback()
+  cur.execute("DROP SCHEMA baxdb_test CASCADE;")
+  conn.commit()
+  cur.close()
+  cache.clear()
+
+
+@pytest.fixture
+def genotyped(baxdb, tmp_path):
+  """baxdb with a small genotyped population: the calls of chr1 stored as tinyint[] and
+  those of chr2 packed, each loaded from a .pos file that is not sorted by position
+
+  :return: conn, genotype version, {chromosome name: chromosome_id}, line_id of each row of the
+    calls, and the variant positions and calls of each chromosome as loaded, in file order
+  :rtype: dict
+  """
+  import numpy as np
+  import insert
+  from getorcreate import get_or_create
+  from models import species, population, line, chromosome, genotype_version
+  speciesID, = get_or_create(baxdb, [species('maize', 'Zea mays', None, None)])
+  populationID, = get_or_create(baxdb, [population('282', speciesID)])
+  lineIDs = get_or_create(baxdb, [line('L%d' % i, populationID) for i in range(5)])
+  chromosomeIDs = get_or_create(baxdb, [chromosome('chr1', speciesID), chromosome('chr2', speciesID)])
+  versionID, = get_or_create(baxdb, [genotype_version('test', 'v1', lineIDs[0], populationID)])
+  rng = np.random.RandomState(2)
+  positions = {'chr1': [500, 100, 300, 200, 400, 600, 700], 'chr2': [10, 30, 20, 40, 50]}
+  calls = {}
+  # Rows are loaded in reverse line order, so that no layout matches the load order by accident
+  rowLines = lineIDs[::-1]
+  for (name, chromosomeID), packed in zip(zip(['chr1', 'chr2'], chromosomeIDs), [False, True]):
+    posFile = tmp_path / ('%s.pos' % name)
+    posFile.write_text(''.join('%s\t%d\n' % (name, position) for position in positions[name]))
+    insert.copy_variants_from_file(baxdb, str(posFile), speciesID, chromosomeID)
+    calls[name] = rng.randint(-1, 3, size=(len(rowLines), len(positions[name]))).astype(np.int8)
+    insert.copy_genotypes(baxdb, rowLines, chromosomeID, calls[name], versionID, packed=packed)
+  return {'conn': baxdb, 'version': versionID, 'chromosomes': dict(zip(['chr1', 'chr2'], chromosomeIDs)),
+          'lines': rowLines, 'positions': positions, 'calls': calls}
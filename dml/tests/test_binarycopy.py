@@ -0,0 +1,62 @@
+import struct
+import numpy as np
+import pytest
+import binarycopy as bc
+
+TINYINT_OID = 16385
+
+
+def roundtrip(tuples, readsize, writesize):
+  """Streams tuples through CopyStream and back through CopyDecoder"""
+  stream = bc.CopyStream(tuples)
+  payload = b''
+  while True:
+    chunk = stream.read(readsize)
+    if not chunk:
+      break
+    payload += chunk
+  rows = []
+  decoder = bc.CopyDecoder(rows.append)
+  for offset in range(0, len(payload), writesize):
+    decoder.write(payload[offset:offset + writesize])
+  return payload, rows
+
+
+@pytest.mark.parametrize('readsize, writesize', [(-1, 1 << 20), (1, 1), (7, 3), (1 << 20, 5)])
+def test_tuples_round_trip(readsize, writesize):
+  rng = np.random.RandomState(0)
+  calls = [rng.randint(-1, 3, size=n).astype(np.int8) for n in (0, 1, 5, 1000)]
+  tuples = [bc.encode_tuple([bc.encode_integer(i), bc.encode_tinyint_array(c, TINYINT_OID), bc.NULL_FIELD, bc.encode_bytes(b'\x00\xff')])
+            for i, c in enumerate(calls)]
+  payload, rows = roundtrip(tuples, readsize, writesize)
+  assert payload.startswith(bc.COPY_HEADER) and payload.endswith(bc.COPY_TRAILER)
+  assert len(rows) == len(calls)
+  for i, (c, fields) in enumerate(zip(calls, rows)):
+    assert bc.decode_integer(fields[0]) == i
+    np.testing.assert_array_equal(bc.decode_tinyint_array(fields[1]), c)
+    assert fields[2] is None
+    assert fields[3] == b'\x00\xff'
+
+
+def test_tinyint_array_layout():
+  field = bc.encode_tinyint_array(np.array([0, -1, 2], dtype=np.int8), TINYINT_OID)
+  length, ndim, hasnull, oid, n, lower = struct.unpack_from('!iiiiii', field)
+  assert (length, ndim, hasnull, oid, n, lower) == (len(field) - 4, 1, 0, TINYINT_OID, 3, 1)
+  assert field[24:] == b'\x00\x00\x00\x01\x00\x00\x00\x00\x01\xff\x00\x00\x00\x01\x02'
+
+
+def test_decode_tinyint_array_with_nulls():
+  header = struct.pack('!iiiii', 1, 1, TINYINT_OID, 3, 1)
+  field = header + struct.pack('!ib', 1, 2) + struct.pack('!i', -1) + struct.pack('!ib', 1, 0)
+  np.testing.assert_array_equal(bc.decode_tinyint_array(field), [2, -1, 0])
+
+
+def test_decode_tinyint_array_checks_length():
+  field = bc.encode_tinyint_array(np.zeros(4, dtype=np.int8), TINYINT_OID)[4:]
+  with pytest.raises(ValueError):
+    bc.decode_tinyint_array(field, out=np.empty(3, dtype=np.int8))
+
+
+def test_null_integer():
+  assert bc.encode_integer(None) == bc.NULL_FIELD
+  assert bc.decode_integer(None) is None
@@ -0,0 +1,134 @@
+import pytest
+from commitpolicy import CommitPolicy
+
+
+class FakeCursor(object):
+  closed = False
+
+  def close(self):
+    self.closed = True
+
+
+class FakeConnection(object):
+  """Records commits and rollbacks in place of a psycopg2 connection"""
+  def __init__(self):
+    self.events = []
+
+  def cursor(self):
+    return FakeCursor()
+
+  def commit(self):
+    self.events.append('commit')
+
+  def rollback(self):
+    self.events.append('rollback')
+
+
+def test_rejects_bad_arguments():
+  with pytest.raises(ValueError):
+    CommitPolicy('sometimes')
+  with pytest.raises(ValueError):
+    CommitPolicy(CommitPolicy.BATCH, batch_size=0)
+
+
+def test_row_commits_every_row():
+  conn, policy = FakeConnection(), CommitPolicy(CommitPolicy.ROW)
+  with policy.file(conn):
+    policy.row(conn)
+    policy.row(conn)
+  assert conn.events == ['commit', 'commit', 'commit']
+
+
+def test_batch_commits_every_batch_and_at_end_of_file():
+  conn, policy = FakeConnection(), CommitPolicy(CommitPolicy.BATCH, batch_size=2)
+  with policy.file(conn):
+    for _ in range(3):
+      policy.row(conn)
+    assert conn.events == ['commit']
+  assert conn.events == ['commit', 'commit']
+
+
+def test_file_commits_once_per_outermost_file():
+  conn, policy = FakeConnection(), CommitPolicy(CommitPolicy.FILE)
+  with policy.file(conn):
+    with policy.file(conn):
+      policy.row(conn, 10)
+    assert conn.events == []
+  assert conn.events == ['commit']
+
+
+@pytest.mark.parametrize('mode', [CommitPolicy.BATCH, CommitPolicy.FILE])
+def test_rows_outside_a_file_are_committed(mode):
+  conn, policy = FakeConnection(), CommitPolicy(mode, batch_size=100)
+  policy.row(conn)
+  assert conn.events == ['commit']
+  assert conn not in policy.pending
+
+
+def test_load_commits_only_on_finish():
+  conn, policy = FakeConnection(), CommitPolicy(CommitPolicy.LOAD)
+  policy.row(conn)
+  with policy.file(conn):
+    policy.row(conn)
+  assert conn.events == []
+  policy.finish(conn)
+  assert conn.events == ['commit']
+
+
+@pytest.mark.parametrize('mode', CommitPolicy.MODES)
+def test_failed_file_rolls_back(mode):
+  conn, policy = FakeConnection(), CommitPolicy(mode, batch_size=100)
+  with pytest.raises(KeyError):
+    with policy.file(conn):
+      with policy.file(conn):
+        raise KeyError('bad row')
+  assert conn.events == ['rollback']
+  assert conn not in policy.depth and conn not in policy.pending
+
+
+def test_connections_are_counted_apart():
+  policy = CommitPolicy(CommitPolicy.BATCH, batch_size=3)
+  connA, connB = FakeConnection(), FakeConnection()
+  with policy.file(connB):
+    with pytest.raises(KeyError):
+      with policy.file(connA):
+        policy.row(connA, 2)
+        raise KeyError('bad row')
+    assert connA.events == ['rollback']
+    policy.row(connB, 2)
+    assert connB.events == []
+    policy.row(connB)
+    assert connB.events == ['commit']
+
+
+def test_finish_closes_kept_cursor():
+  conn, policy = FakeConnection(), CommitPolicy(CommitPolicy.FILE)
+  cur = policy.cursor(conn)
+  assert policy.cursor(conn) is cur
+  policy.finish(conn)
+  assert cur.closed
+  assert policy.cursor(conn) is not cur
+
+
+def test_after_commit_runs_once_after_commit():
+  conn, policy = FakeConnection(), CommitPolicy(CommitPolicy.FILE)
+  calls = []
+  with policy.file(conn):
+    policy.after_commit(conn, calls.append, 'chr1')
+    policy.after_commit(conn, calls.append, 'chr1')
+    policy.row(conn)
+    assert calls == []
+  assert conn.events == ['commit'] and calls == ['chr1']
+  policy.commit(conn)
+  assert calls == ['chr1']
+
+
+def test_after_commit_dropped_on_rollback():
+  conn, policy = FakeConnection(), CommitPolicy(CommitPolicy.FILE)
+  calls = []
+  with pytest.raises(KeyError):
+    with policy.file(conn):
+      policy.after_commit(conn, calls.append, 'chr1')
+      raise KeyError('bad row')
+  policy.commit(conn)
+  assert calls == []
@@ -0,0 +1,98 @@
+import gc
+import os
+import pytest
+import dbconnect
+
+
+class FakeConnection(object):
+  """Stands in for a psycopg2 connection whose socket is one end of a pipe"""
+  closed = 0
+
+  def __init__(self, fd):
+    self.fd = fd
+
+  def fileno(self):
+    return self.fd
+
+
+class FakePsycopgPool(object):
+  def __init__(self, idle, used):
+    self._pool = idle
+    self._used = used
+
+
+def test_disown_redirects_inherited_sockets():
+  idleRead, idleWrite = os.pipe()
+  usedRead, usedWrite = os.pipe()
+  pool = dbconnect.ConnectionPool.__new__(dbconnect.ConnectionPool)
+  pool.pid = -1
+  pool.pool = FakePsycopgPool([FakeConnection(idleWrite)], {1: FakeConnection(usedWrite)})
+  dbconnect.pools.add(pool)
+  try:
+    dbconnect.disown_inherited_pools()
+    assert pool in dbconnect.inheritedPools and pool not in dbconnect.pools
+    # What the child writes to its copies of the sockets goes nowhere
+    os.write(idleWrite, b'X')
+    os.write(usedWrite, b'X')
+    os.close(idleWrite)
+    os.close(usedWrite)
+    assert os.read(idleRead, 1) == b''
+    assert os.read(usedRead, 1) == b''
+  finally:
+    dbconnect.inheritedPools.remove(pool)
+    os.close(idleRead)
+    os.close(usedRead)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_forked_child_leaves_parent_connections_working(tmp_path):
+  import psycopg2
+  dsn = os.environ.get('BAXDB_TEST_DSN')
+  if not dsn:
+    pytest.skip('BAXDB_TEST_DSN is not set')
+  iniFile = tmp_path / 'database.ini'
+  iniFile.write_text('[postgresql]\ndsn=%s\n' % dsn)
+  try:
+    pool = dbconnect.ConnectionPool(2, 2, filename=str(iniFile))
+  except psycopg2.OperationalError as err:
+    pytest.skip('Cannot connect to %s: %s' % (dsn, err))
+  conn = pool.getconn()
+  pid = os.fork()
+  if pid == 0:
+    status = 1
+    try:
+      # Drop every reference to the inherited pool, so its connections are garbage collected
+      del conn, pool
+      dbconnect.inheritedPools[:] = []
+      gc.collect()
+      status = 0
+    finally:
+      os._exit(status)
+  _, status = os.waitpid(pid, 0)
+  assert status == 0
+  try:
+    cur = conn.cursor()
+    cur.execute('SELECT 1;')
+    assert cur.fetchone() == (1,)
+    cur.close()
+    pool.putconn(conn)
+    assert pool.healthy(pool.getconn())
+  finally:
+    pool.closeall()
+
+
+@pytest.mark.parametrize('first, second', [
+  (b"COPY (SELECT variant_pos FROM variant WHERE variant_chromosome = 1 ORDER BY variant_id) TO STDOUT;",
+   b"COPY (SELECT variant_pos FROM variant WHERE variant_chromosome = 12 ORDER BY variant_id) TO STDOUT;"),
+  (b"SELECT array_multi_index(genotype, ARRAY[1,2,3]::integer[]) FROM genotype WHERE genotype_line IN (4, 5)",
+   b"SELECT array_multi_index(genotype, ARRAY[7]::integer[]) FROM genotype WHERE genotype_line IN (6)"),
+  ("SELECT * FROM line WHERE line_name = 'B73' AND x = '{1,2}'::int[] AND y = 1.5e3",
+   "SELECT * FROM line WHERE line_name = 'It''s' AND x = '{}'::int[] AND y = 2"),
+])
+def test_statement_label_replaces_literals(first, second):
+  assert dbconnect.statement_label(first) == dbconnect.statement_label(second)
+
+
+def test_statement_label_keeps_names_and_parameters():
+  assert dbconnect.statement_label('EXECUTE insert_line (1, 2)') == 'EXECUTE insert_line'
+  assert dbconnect.statement_label('SELECT v1.x FROM t1 v1 WHERE a = $1 AND b = $2') == 'SELECT v1.x FROM t1 v1 WHERE a = $1 AND b = $2'
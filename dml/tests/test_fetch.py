@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+import fetch
+
+
+def expected(genotyped, name, lines, positions):
+  """The calls of lines at positions, taken from the matrix that was loaded"""
+  rows = [genotyped['lines'].index(line) for line in lines]
+  columns = [genotyped['positions'][name].index(position) for position in positions]
+  return genotyped['calls'][name][np.ix_(rows, columns)]
+
+
+@pytest.mark.parametrize('name', ['chr1', 'chr2'])
+def test_fetch_genotype_matrix_round_trips(genotyped, name):
+  matrix, lines, positions = fetch.fetch_genotype_matrix(genotyped['conn'], genotyped['version'], genotyped['chromosomes'][name])
+  assert lines == sorted(genotyped['lines'])
+  assert positions.tolist() == sorted(genotyped['positions'][name])
+  np.testing.assert_array_equal(matrix, expected(genotyped, name, lines, positions.tolist()))
+
+
+@pytest.mark.parametrize('name', ['chr1', 'chr2'])
+def test_fetch_genotype_matrix_of_chosen_lines(genotyped, name):
+  lines = [genotyped['lines'][3], genotyped['lines'][0]]
+  matrix, fetchedLines, positions = fetch.fetch_genotype_matrix(genotyped['conn'], genotyped['version'], genotyped['chromosomes'][name], lines)
+  assert fetchedLines == lines
+  np.testing.assert_array_equal(matrix, expected(genotyped, name, lines, positions.tolist()))
+
+
+def test_copy_genotype_rows_keeps_variant_id_order(genotyped):
+  conn, chromosomeID = genotyped['conn'], genotyped['chromosomes']['chr1']
+  matrix = fetch.copy_genotype_rows(conn, genotyped['version'], chromosomeID, genotyped['lines'], len(genotyped['positions']['chr1']))
+  np.testing.assert_array_equal(matrix, genotyped['calls']['chr1'])
+  assert fetch.fetch_variant_positions(conn, chromosomeID).tolist() == genotyped['positions']['chr1']
+
+
+def test_copy_genotype_rows_rejects_missing_lines(genotyped):
+  conn, chromosomeID = genotyped['conn'], genotyped['chromosomes']['chr1']
+  with pytest.raises(ValueError):
+    fetch.copy_genotype_rows(conn, genotyped['version'], chromosomeID, genotyped['lines'] + [10 ** 6], len(genotyped['positions']['chr1']))
+
+
+def test_find_variant_indices_are_1_based_in_variant_id_order(genotyped):
+  conn, chromosomeID = genotyped['conn'], genotyped['chromosomes']['chr1']
+  # chr1 was loaded as 500, 100, 300, 200, 400, 600, 700
+  assert fetch.find_variant_indices(conn, chromosomeID, 200, 500) == ([4, 3, 5, 1], [200, 300, 400, 500])
+  assert fetch.find_variant_indices(conn, chromosomeID, positions=[700, 500]) == ([7, 1], [700, 500])
+  with pytest.raises(ValueError):
+    fetch.find_variant_indices(conn, chromosomeID, positions=[150])
+  with pytest.raises(ValueError):
+    fetch.find_variant_indices(conn, chromosomeID)
+
+
+@pytest.mark.parametrize('name, region, positions', [
+  ('chr1', (200, 500), None),
+  ('chr1', None, [700, 100, 400]),
+  ('chr1', (500, 500), None),
+  ('chr1', (1, 10 ** 6), None),
+  ('chr2', (15, 45), None),
+  ('chr2', None, [50, 10]),
+])
+def test_fetch_genotype_region_matches_loaded_calls(genotyped, name, region, positions):
+  start, end = region or (None, None)
+  lines = [genotyped['lines'][4], genotyped['lines'][2], genotyped['lines'][0]]
+  for chosenLines in (None, lines):
+    matrix, fetchedLines, fetchedPositions = fetch.fetch_genotype_region(genotyped['conn'], genotyped['version'], genotyped['chromosomes'][name], start, end, positions, chosenLines)
+    assert fetchedLines == (chosenLines or sorted(genotyped['lines']))
+    if positions is not None:
+      assert fetchedPositions.tolist() == positions
+    else:
+      assert fetchedPositions.tolist() == sorted(p for p in genotyped['positions'][name] if start <= p <= end)
+    np.testing.assert_array_equal(matrix, expected(genotyped, name, fetchedLines, fetchedPositions.tolist()))
+
+
+def test_fetch_genotype_region_without_variants(genotyped):
+  matrix, lines, positions = fetch.fetch_genotype_region(genotyped['conn'], genotyped['version'], genotyped['chromosomes']['chr1'], 101, 199)
+  assert matrix.shape == (len(genotyped['lines']), 0) and positions.tolist() == []
@@ -0,0 +1,64 @@
+import pytest
+import find
+from idcache import cache
+
+
+class FakeCursor(object):
+  """Answers every query with rows, and records whether it was closed"""
+  def __init__(self, connection, rows):
+    self.connection = connection
+    self.rows = rows
+    self.closed = False
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+  def execute(self, SQL, args=None):
+    pass
+
+  def fetchone(self):
+    return self.rows[0] if self.rows else None
+
+  def fetchall(self):
+    return list(self.rows)
+
+  def close(self):
+    self.closed = True
+
+
+class FakeConnection(object):
+  def __init__(self, rows):
+    self.rows = rows
+    self.cursors = []
+
+  def cursor(self):
+    cur = FakeCursor(self, self.rows)
+    self.cursors.append(cur)
+    return cur
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+  cache.clear()
+  yield
+  cache.clear()
+
+
+@pytest.mark.parametrize('rows, expected', [([], None), ([(7,)], 7)])
+def test_find_one_closes_cursor(rows, expected):
+  conn = FakeConnection(rows)
+  assert find.find_trait(conn, 'weight') == expected
+  assert find.find_line(conn, 'B73', 1) == expected
+  assert conn.cursors and all(cur.closed for cur in conn.cursors)
+
+
+@pytest.mark.parametrize('rows', [[], [('B73', 7)]])
+def test_find_many_closes_cursor(rows):
+  conn = FakeConnection(rows)
+  assert find.find_lines(conn, ['B73'], 1) == dict(rows)
+  assert find.find_traits(conn, ['B73']) == dict(rows)
+  assert find.find_chromosomes(conn, ['B73'], 1) == dict(rows)
+  assert len(conn.cursors) == 3 and all(cur.closed for cur in conn.cursors)
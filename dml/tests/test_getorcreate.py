@@ -0,0 +1,40 @@
+import pytest
+from getorcreate import get_or_create
+from models import species, population, line, chromosome, genotype, genotype_version
+
+
+def test_returns_new_and_existing_ids_in_input_order(baxdb):
+  speciesID, = get_or_create(baxdb, [species('maize', 'Zea mays', None, None)])
+  populationID, = get_or_create(baxdb, [population('282', speciesID)])
+  first = get_or_create(baxdb, [line('B73', populationID), line('Mo17', populationID)])
+  IDs = get_or_create(baxdb, [line('W22', populationID), line('B73', populationID), line('W22', populationID), line('Mo17', populationID)])
+  assert IDs[1] == first[0] and IDs[3] == first[1]
+  assert IDs[0] == IDs[2] and IDs[0] not in first
+  assert get_or_create(baxdb, [line('Mo17', populationID), line('W22', populationID)]) == [first[1], IDs[0]]
+  cur = baxdb.cursor()
+  cur.execute("SELECT count(*) FROM line;")
+  assert cur.fetchone()[0] == 3
+  cur.close()
+
+
+def test_nullable_key_columns_match(baxdb):
+  from models import location
+  IDs = get_or_create(baxdb, [location('United States', 'New York', None, 'NY')])
+  assert get_or_create(baxdb, [location('United States', 'New York', None, 'NY')]) == IDs
+
+
+def test_rejects_mixed_models(baxdb):
+  with pytest.raises(ValueError):
+    get_or_create(baxdb, [species('maize', 'Zea mays', None, None), population('282', 1)])
+
+
+def test_raises_when_a_row_can_be_neither_found_nor_created(baxdb):
+  speciesID, = get_or_create(baxdb, [species('maize', 'Zea mays', None, None)])
+  populationID, = get_or_create(baxdb, [population('282', speciesID)])
+  lineID, = get_or_create(baxdb, [line('B73', populationID)])
+  chromosomeID, = get_or_create(baxdb, [chromosome('chr1', speciesID)])
+  versionIDs = get_or_create(baxdb, [genotype_version('v1', 'v1', lineID, populationID), genotype_version('v2', 'v2', lineID, populationID)])
+  get_or_create(baxdb, [genotype(lineID, chromosomeID, [0, 1, 2], versionIDs[0])])
+  # Unpartitioned, genotype is unique on line and chromosome, so the second version conflicts without matching
+  with pytest.raises(RuntimeError):
+    get_or_create(baxdb, [genotype(lineID, chromosomeID, [2, 1, 0], versionIDs[1])])
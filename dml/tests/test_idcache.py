@@ -0,0 +1,78 @@
+from idcache import IDCache
+
+
+class FakeConnection(object):
+  def __init__(self, dsn):
+    self.dsn = dsn
+
+
+def test_evicts_least_recently_used():
+  cache = IDCache(maxsize=2)
+  conn = FakeConnection('dbname=a')
+  cache.put(conn, 'line', ('B73',), 1)
+  cache.put(conn, 'line', ('Mo17',), 2)
+  assert cache.get(conn, 'line', ('B73',)) == 1
+  cache.put(conn, 'line', ('W22',), 3)
+  assert cache.get(conn, 'line', ('Mo17',)) is None
+  assert cache.get(conn, 'line', ('B73',)) == 1
+  assert cache.get(conn, 'line', ('W22',)) == 3
+  assert cache.stats()['line'] == {'hits': 3, 'misses': 1, 'size': 2}
+
+
+def test_keyed_by_database_and_table():
+  cache = IDCache()
+  a, b = FakeConnection('dbname=a'), FakeConnection('dbname=b')
+  cache.put(a, 'line', ('B73',), 1)
+  assert cache.get(b, 'line', ('B73',)) is None
+  assert cache.get(a, 'trait', ('B73',)) is None
+
+
+def test_invalidate_and_clear():
+  cache = IDCache()
+  conn = FakeConnection('dbname=a')
+  cache.put(conn, 'line', ('B73',), 1)
+  cache.put(conn, 'trait', ('weight',), 2)
+  cache.invalidate('line')
+  assert cache.get(conn, 'line', ('B73',)) is None
+  assert cache.get(conn, 'trait', ('weight',)) == 2
+  cache.clear()
+  assert cache.get(conn, 'trait', ('weight',)) is None
+
+
+class FakeTransaction(FakeConnection):
+  """A connection with an open transaction"""
+  def get_transaction_status(self):
+    return 2
+
+
+def test_uncommitted_ids_stay_with_their_connection():
+  cache = IDCache()
+  writer, reader = FakeTransaction('dbname=a'), FakeConnection('dbname=a')
+  assert cache.idle(reader) and not cache.idle(writer)
+  cache.put(writer, 'line', ('B73',), 1, shared=cache.idle(writer))
+  assert cache.get(writer, 'line', ('B73',)) == 1
+  assert cache.get(reader, 'line', ('B73',)) is None
+  cache.put(reader, 'line', ('Mo17',), 2, shared=cache.idle(reader))
+  assert cache.get(writer, 'line', ('Mo17',)) == 2
+
+
+def test_threads_share_the_cache():
+  import threading
+  cache = IDCache(maxsize=10)
+  conn = FakeConnection('dbname=a')
+  errors = []
+  def work(offset):
+    try:
+      for i in range(5000):
+        cache.put(conn, 'line', (str((i + offset) % 20),), i)
+        cache.get(conn, 'line', (str((i + offset + 1) % 20),))
+    except Exception as err:
+      errors.append(err)
+  threads = [threading.Thread(target=work, args=(offset,)) for offset in range(4)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert errors == []
+  stats = cache.stats()['line']
+  assert stats['hits'] + stats['misses'] == 20000 and stats['size'] == 10
@@ -0,0 +1,44 @@
+"""Tests for dropping and building the managed indexes, using a fake connection"""
+import pytest
+import indexes
+
+
+class FakeCursor(object):
+  """Records statements; every managed index is missing after it is dropped"""
+  def __init__(self, events):
+    self.events = events
+
+  def execute(self, query, args=None):
+    self.events.append(query.split()[0] if not query.startswith('SELECT') else 'SELECT')
+
+  def fetchone(self):
+    return (False,)
+
+  def close(self):
+    pass
+
+
+class FakeConnection(object):
+  def __init__(self):
+    self.events = []
+
+  def cursor(self):
+    return FakeCursor(self.events)
+
+  def commit(self):
+    self.events.append('commit')
+
+  def rollback(self):
+    self.events.append('rollback')
+
+
+def test_dropped_builds_indexes_after_a_failed_load():
+  conn = FakeConnection()
+  with pytest.raises(KeyError):
+    with indexes.dropped(conn, ['phenotype']):
+      conn.events.append('load')
+      raise KeyError('bad row')
+  assert conn.events[:4] == ['DROP', 'DROP', 'commit', 'load']
+  assert conn.events[4] == 'rollback'
+  assert conn.events.count('CREATE') == 2
+  assert conn.events.index('CREATE') > conn.events.index('rollback')
@@ -0,0 +1,85 @@
+import os
+import time
+import numpy as np
+import pytest
+import fetch
+import matrixcache
+
+
+class FakeConnection(object):
+  dsn = 'dbname=test'
+
+
+@pytest.fixture
+def database(monkeypatch):
+  """Genotypes of one chromosome, read through fetch.fetch_genotype_matrix and fetch.genotype_stamp"""
+  state = {'stamp': '2.2', 'matrix': np.array([[0, 1, 2], [2, 1, 0]], dtype=np.int8), 'fetches': 0, 'during_fetch': None}
+
+  def fetch_genotype_matrix(conn, genotype_version, chromosome, lines=None):
+    state['fetches'] += 1
+    matrix = state['matrix'].copy()
+    if state['during_fetch'] is not None:
+      state['stamp'] = state['during_fetch']
+      state['during_fetch'] = None
+    return matrix, [1, 2], np.array([10, 20, 30], dtype=np.int64)
+
+  monkeypatch.setattr(fetch, 'fetch_genotype_matrix', fetch_genotype_matrix)
+  monkeypatch.setattr(fetch, 'genotype_stamp', lambda conn, genotype_version, chromosome: state['stamp'])
+  return state
+
+
+def test_hit_returns_memory_mapped_copy(tmp_path, database):
+  cache = matrixcache.MatrixCache(str(tmp_path))
+  first = cache.fetch_genotype_matrix(FakeConnection(), 1, 3)
+  second = cache.fetch_genotype_matrix(FakeConnection(), 1, 3)
+  assert (cache.hits, cache.misses, database['fetches']) == (1, 1, 1)
+  assert isinstance(second[0], np.memmap) and not second[0].flags.writeable
+  np.testing.assert_array_equal(second[0], database['matrix'])
+  assert second[1] == first[1] == [1, 2]
+
+
+def test_new_genotypes_are_never_served_stale(tmp_path, database):
+  cache = matrixcache.MatrixCache(str(tmp_path))
+  cache.fetch_genotype_matrix(FakeConnection(), 1, 3)
+  # Another process commits a genotype for the chromosome, without touching this cache directory
+  database['stamp'] = '3.7'
+  database['matrix'] = np.array([[0, 1, 2], [2, 1, 0], [1, 1, 1]], dtype=np.int8)
+  matrix, _, _ = cache.fetch_genotype_matrix(FakeConnection(), 1, 3)
+  assert database['fetches'] == 2
+  np.testing.assert_array_equal(matrix, database['matrix'])
+  # The copy under the old stamp is gone
+  assert len(cache.entries()) == 1
+
+
+def test_matrix_read_across_a_commit_is_not_cached(tmp_path, database):
+  cache = matrixcache.MatrixCache(str(tmp_path))
+  database['during_fetch'] = '3.7'
+  cache.fetch_genotype_matrix(FakeConnection(), 1, 3)
+  assert cache.entries() == []
+  cache.fetch_genotype_matrix(FakeConnection(), 1, 3)
+  assert len(cache.entries()) == 1
+
+
+def test_evicts_least_recently_used(tmp_path, database):
+  cache = matrixcache.MatrixCache(str(tmp_path))
+  for chromosome in (1, 2, 3):
+    cache.fetch_genotype_matrix(FakeConnection(), 1, chromosome)
+  size = cache.entries()[0][1]
+  # Use chromosome 1 again, so chromosome 2 is the least recently used
+  past = time.time() - 100
+  for _, _, key in cache.entries():
+    os.utime('%s.calls.npy' % key, (past, past))
+  cache.fetch_genotype_matrix(FakeConnection(), 1, 1)
+  cache.max_bytes = 2 * size
+  assert cache.evict() == 1
+  names = sorted(os.path.basename(key).split('_')[1] for _, _, key in cache.entries())
+  assert names == ['c1', 'c3']
+
+
+def test_invalidate_removes_every_matrix_of_a_chromosome(tmp_path, database):
+  cache = matrixcache.MatrixCache(str(tmp_path))
+  cache.fetch_genotype_matrix(FakeConnection(), 1, 3)
+  cache.fetch_genotype_matrix(FakeConnection(), 1, 3, lines=[2, 1])
+  cache.fetch_genotype_matrix(FakeConnection(), 1, 4)
+  assert cache.invalidate(1, 3) == 2
+  assert len(cache.entries()) == 1
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+import packedgenotype as pg
+
+
+@pytest.mark.parametrize('ncalls', [0, 1, 3, 4, 5, 1001])
+def test_calls_round_trip(ncalls):
+  calls = np.random.RandomState(ncalls).randint(-1, 3, size=ncalls).astype(np.int8)
+  data = pg.pack_calls(calls)
+  assert len(data) == pg.packed_length(ncalls)
+  np.testing.assert_array_equal(pg.unpack_calls(data), calls)
+
+
+def test_matrix_round_trip():
+  matrix = np.random.RandomState(0).randint(-1, 3, size=(7, 13)).astype(np.int8)
+  rows = pg.pack_matrix(matrix)
+  assert rows == [pg.pack_calls(row) for row in matrix]
+  np.testing.assert_array_equal(pg.unpack_matrix(rows), matrix)
+
+
+def test_layout():
+  # Count, then call + 1 in two bits, the first call of each byte lowest
+  assert pg.pack_calls([-1, 0, 1, 2, 2]) == b'\x00\x00\x00\x05' + bytes([0b11100100, 0b00000011])
+
+
+def test_rejects_bad_input():
+  with pytest.raises(ValueError):
+    pg.pack_calls([0, 3])
+  with pytest.raises(ValueError):
+    pg.unpack_calls(b'\x00\x00\x00\x09\x00')
+  with pytest.raises(ValueError):
+    pg.unpack_calls(pg.pack_calls([0, 1]), out=np.empty(3, dtype=np.int8))
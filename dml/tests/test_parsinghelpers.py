@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+import parsinghelpers as ph
+
+
+@pytest.fixture
+def genotypeFile(tmp_path):
+  """A .012 file with a blank line in the middle and no newline at the end"""
+  rng = np.random.RandomState(1)
+  calls = rng.randint(-1, 3, size=(37, 53))
+  rows = ['\t'.join([str(i)] + [str(c) for c in row]) for i, row in enumerate(calls)]
+  rows.insert(20, '')
+  path = tmp_path / 'chr1.012'
+  path.write_text('\n'.join(rows))
+  return str(path), calls.astype(np.int8)
+
+
+def test_parse_genotype_row():
+  np.testing.assert_array_equal(ph.parse_genotype_row(b'7\t0\t-1\t2\t1\n'), [0, -1, 2, 1])
+  with pytest.raises(ValueError):
+    ph.parse_genotype_row(b'7\t0\t12\n')
+
+
+def test_serial_parsers_agree(genotypeFile):
+  path, calls = genotypeFile
+  np.testing.assert_array_equal(ph.parse_genotype_matrix_from_file(path), calls)
+  np.testing.assert_array_equal(np.array(list(ph.iter_genotypes_from_file(path))), calls)
+
+
+@pytest.mark.parametrize('parts', [1, 2, 3, 8, 100, 10000])
+def test_split_file_on_lines_covers_file(genotypeFile, parts):
+  path, calls = genotypeFile
+  ranges = ph.split_file_on_lines(path, parts)
+  assert ranges[0][0] == 0
+  assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+  with open(path, 'rb') as f:
+    data = f.read()
+  assert ranges[-1][1] == len(data)
+  for start, end in ranges:
+    assert start == 0 or data[start - 1:start] == b'\n'
+  assert sum(ph.count_genotype_range(path, start, end) for start, end in ranges) == calls.shape[0]
+
+
+@pytest.mark.parametrize('workers', [1, 3, 8, 100])
+def test_parallel_parser_matches_serial(genotypeFile, tmp_path, workers):
+  path, calls = genotypeFile
+  genotypes = ph.parse_genotype_matrix_from_file_in_parallel(path, workers=workers, directory=str(tmp_path))
+  np.testing.assert_array_equal(genotypes, ph.parse_genotype_matrix_from_file(path))
+  np.testing.assert_array_equal(genotypes, calls)
+
+
+PHENOTYPE_TEXTS = ['1', '1.0', '1e3', '.5', '5.', '+2.50', ' 3 ', '-0', '0e5', '0.1',
+                   '0.30000000000000004', '3.14159265358979323846', '123456789012345678',
+                   '1e400', '-1e400', '1e-400', '5e-324', '4.9406564584124654e-324',
+                   'NA', 'nan', 'NaN', 'inf', '-Infinity', '1_000', '0x10', 'abc', '1,5']
+
+
+def test_phenotype_bulk_and_single_paths_agree():
+  import pandas as pd
+  text = pd.Series(PHENOTYPE_TEXTS)
+  values, texts = ph.split_phenotype_values(text)
+  for i, t in enumerate(PHENOTYPE_TEXTS):
+    value, original = ph.split_phenotype_value(t)
+    assert texts[i] == original, t
+    if value is None:
+      assert np.isnan(values[i]), t
+    else:
+      assert values[i] == value, t
+
+
+@pytest.mark.parametrize('text, value, original', [
+  ('1.0', 1.0, None),
+  ('1e3', 1000.0, None),
+  ('.5', 0.5, None),
+  ('3.14159265358979323846', 3.141592653589793, '3.14159265358979323846'),
+  ('1e400', None, '1e400'),
+  ('1e-400', None, '1e-400'),
+  ('NA', None, 'NA'),
+  ('1_000', None, '1_000'),
+])
+def test_split_phenotype_value(text, value, original):
+  assert ph.split_phenotype_value(text) == (value, original)
+
+
+def test_split_phenotype_value_of_floats():
+  assert ph.split_phenotype_value(0.1) == (0.1, None)
+  assert ph.split_phenotype_value(np.float64(2.5)) == (2.5, None)
+  assert ph.split_phenotype_value(float('nan')) == (None, 'nan')
+  assert ph.split_phenotype_value(float('-inf')) == (None, '-inf')
+  assert ph.split_phenotype_value(None) == (None, None)
+
+
+def test_migration_matches_split_phenotype_value(conn):
+  import os
+  cur = conn.cursor()
+  if conn.server_version < 120000:
+    pytest.skip('The migration needs PostgreSQL 12 or later')
+  migration = os.path.join(os.path.dirname(__file__), '..', '..', 'ddl', 'migrate_phenotype_value.sql')
+  with open(migration) as f:
+    SQL = '\n'.join(line for line in f if not line.startswith('\\connect') and line.strip() not in ('BEGIN;', 'COMMIT;'))
+  try:
+    cur.execute("CREATE TEMP TABLE phenotype (phenotype_id SERIAL, phenotype_value TEXT NOT NULL);")
+    cur.execute("INSERT INTO phenotype (phenotype_value) SELECT unnest(%s::text[]);", (PHENOTYPE_TEXTS,))
+    cur.execute("SELECT phenotype_value FROM phenotype ORDER BY phenotype_id;")
+    texts = [row[0] for row in cur.fetchall()]
+    cur.execute(SQL)
+    cur.execute("SELECT phenotype_value, phenotype_value_text FROM phenotype ORDER BY phenotype_id;")
+    assert cur.fetchall() == [ph.split_phenotype_value(t) for t in texts]
+  finally:
+    conn.rollback()
+    cur.close()
+
+
+def test_split_phenotype_values_rounds_like_float():
+  import pandas as pd
+  rng = np.random.RandomState(0)
+  text = pd.Series(['%.15g' % value for value in rng.standard_normal(2000) * 10.0 ** rng.randint(-300, 300, 2000)])
+  values, texts = ph.split_phenotype_values(text)
+  np.testing.assert_array_equal(values, [float(t) for t in text])
+  assert texts == [None] * len(text)
@@ -0,0 +1,35 @@
+"""Tests for detaching partitions around loads, using a fake cursor"""
+import partitions
+
+
+class FakeCursor(object):
+  """Records the statements it is given; a partition is attached unless named in detachedNames"""
+  def __init__(self, detachedNames=()):
+    self.detachedNames = set(detachedNames)
+    self.statements = []
+    self.result = None
+
+  def execute(self, query, args=None):
+    if query.startswith('SELECT EXISTS (SELECT 1 FROM pg_inherits'):
+      self.result = (args[0] not in self.detachedNames,)
+    else:
+      self.statements.append(query)
+
+  def fetchone(self):
+    return self.result
+
+
+def test_detached_detaches_and_attaches():
+  partition = partitions.Partition('genotype_1_2', 'genotype', {'genotype_chromosome': 2})
+  cur = FakeCursor()
+  with partitions.detached(cur, [partition]):
+    assert len(cur.statements) == 1 and 'DETACH' in cur.statements[0]
+  assert len(cur.statements) == 4 and 'ATTACH PARTITION' in cur.statements[2]
+
+
+def test_detached_leaves_detached_partitions_alone():
+  partition = partitions.Partition('genotype_1_2', 'genotype', {'genotype_chromosome': 2})
+  cur = FakeCursor(detachedNames=['genotype_1_2'])
+  with partitions.detached(cur, [partition]):
+    pass
+  assert cur.statements == []
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import fetch
+import insert
+import variantmajor
+from getorcreate import get_or_create
+from models import line
+
+
+@pytest.mark.parametrize('name', ['chr1', 'chr2'])
+def test_layouts_agree(genotyped, name):
+  conn, versionID, chromosomeID = genotyped['conn'], genotyped['version'], genotyped['chromosomes'][name]
+  assert variantmajor.sync_variant_genotypes(conn, versionID, chromosomeID) == len(genotyped['positions'][name])
+  assert variantmajor.sync_variant_genotypes(conn, versionID, chromosomeID) == 0
+  assert variantmajor.variant_major_lines(conn, versionID, chromosomeID) == sorted(genotyped['lines'])
+  positions = sorted(genotyped['positions'][name])
+  lines = [genotyped['lines'][1], genotyped['lines'][4]]
+  for query in [{}, {'start': positions[1], 'end': positions[3]}, {'positions': positions[::-2]}]:
+    for chosenLines in (None, lines):
+      lineMajor = variantmajor.fetch_genotypes(conn, versionID, chromosomeID, lines=chosenLines, layout=variantmajor.LINE_MAJOR, **query)
+      variantMajor = variantmajor.fetch_genotypes(conn, versionID, chromosomeID, lines=chosenLines, layout=variantmajor.VARIANT_MAJOR, **query)
+      chosen = variantmajor.fetch_genotypes(conn, versionID, chromosomeID, lines=chosenLines, **query)
+      for matrix, fetchedLines, fetchedPositions in (variantMajor, chosen):
+        np.testing.assert_array_equal(matrix, lineMajor[0])
+        assert fetchedLines == lineMajor[1]
+        np.testing.assert_array_equal(fetchedPositions, lineMajor[2])
+
+
+def test_new_genotypes_make_the_copy_stale(genotyped):
+  conn, versionID, chromosomeID = genotyped['conn'], genotyped['version'], genotyped['chromosomes']['chr1']
+  variantmajor.sync_variant_genotypes(conn, versionID, chromosomeID)
+  assert variantmajor.stale_variant_genotypes(conn) == []
+  cur = conn.cursor()
+  cur.execute("SELECT line_population FROM line WHERE line_id = %s;", (genotyped['lines'][0],))
+  populationID = cur.fetchone()[0]
+  cur.close()
+  newLine, = get_or_create(conn, [line('L5', populationID)])
+  calls = np.array([[2, 2, 1, 0, -1, 0, 1]], dtype=np.int8)
+  insert.copy_genotypes(conn, [newLine], chromosomeID, calls, versionID)
+
+  assert variantmajor.variant_major_lines(conn, versionID, chromosomeID) is None
+  assert variantmajor.stale_variant_genotypes(conn) == [(versionID, chromosomeID)]
+  with pytest.raises(ValueError):
+    variantmajor.fetch_genotypes(conn, versionID, chromosomeID, positions=[100], layout=variantmajor.VARIANT_MAJOR)
+  # Unforced reads fall back to the genotype table, which has the new line
+  matrix, lines, _ = variantmajor.fetch_genotypes(conn, versionID, chromosomeID, positions=[500, 100])
+  assert newLine in lines
+  np.testing.assert_array_equal(matrix[lines.index(newLine)], [2, 2])
+
+  assert variantmajor.sync_variant_genotypes(conn, versionID, chromosomeID) == len(genotyped['positions']['chr1'])
+  assert variantmajor.stale_variant_genotypes(conn) == []
+  matrix, lines, _ = variantmajor.fetch_genotypes(conn, versionID, chromosomeID, positions=[500, 100], layout=variantmajor.VARIANT_MAJOR)
+  np.testing.assert_array_equal(matrix[lines.index(newLine)], [2, 2])
+  with pytest.raises(ValueError):
+    variantmajor.fetch_genotypes(conn, versionID, chromosomeID, positions=[100], lines=[10 ** 6], layout=variantmajor.VARIANT_MAJOR)
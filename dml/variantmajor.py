@@ -0,0 +1,241 @@
+"""Keeps a variant-major copy of the genotypes and reads from whichever layout is cheaper"""
+# The genotype table holds one array per (line, chromosome), so reading one variant
+# means reading every line's whole chromosome. variant_genotype holds one array per
+# (variant, genotype version) with every line's call, in the order stored in
+# variant_genotype_lines. That row also holds the stamp of the genotypes the copy was
+# built from (see fetch.genotype_stamp), so writing genotypes costs nothing extra: the
+# copy is simply out of date, and not used, until sync_variant_genotypes() runs again.
+import binarycopy as bc
+import commitpolicy as cp
+import fetch
+
+LINE_MAJOR = 'line'
+VARIANT_MAJOR = 'variant'
+
+
+def variant_major_lines(conn, genotype_version, chromosome):
+  """Finds the lines of the variant-major copy of a chromosome
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param genotype_version: :ref:`genotype_version_id <genotype_version_class>`
+    :type genotype_version: integer
+    :param chromosome: :ref:`chromosome_id <chromosome_class>`
+    :type chromosome: integer
+    :return: line_id of each call of the variant_genotype arrays, or None if there is no up-to-date copy
+    :rtype: list of integers
+  """
+  cur = conn.cursor()
+  cur.execute("SELECT variant_genotype_lines, variant_genotype_lines_stamp FROM variant_genotype_lines WHERE variant_genotype_lines_genotype_version = %s AND variant_genotype_lines_chromosome = %s;", (genotype_version, chromosome))
+  row = cur.fetchone()
+  cur.close()
+  if row is None or row[1] != fetch.genotype_stamp(conn, genotype_version, chromosome):
+    return None
+  return row[0]
+
+
+def stale_variant_genotypes(conn):
+  """Finds the variant-major copies that genotypes have been written to since they were built
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :return: (genotype_version_id, chromosome_id) of each out-of-date copy
+    :rtype: list of tuples
+  """
+  cur = conn.cursor()
+  cur.execute("SELECT variant_genotype_lines_genotype_version, variant_genotype_lines_chromosome, variant_genotype_lines_stamp FROM variant_genotype_lines ORDER BY 1, 2;")
+  copies = cur.fetchall()
+  cur.close()
+  return [(genotype_version, chromosome) for genotype_version, chromosome, stamp in copies
+          if stamp != fetch.genotype_stamp(conn, genotype_version, chromosome)]
+
+
+def sync_variant_genotypes(conn, genotype_version, chromosome, policy=None, force=False):
+  """Rebuilds the variant-major copy of a chromosome from the genotype table
+
+    This function fetches the whole lines x variants matrix, transposes it and
+    copies one row per variant into variant_genotype, replacing the old copy.
+    Nothing is done if the copy is already up to date, unless ``force`` is set.
+    Run it after loading genotypes, for instance for every chromosome listed by
+    :func:`stale_variant_genotypes`.
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param genotype_version: :ref:`genotype_version_id <genotype_version_class>`
+    :type genotype_version: integer
+    :param chromosome: :ref:`chromosome_id <chromosome_class>`
+    :type chromosome: integer
+    :param policy: :ref:`commit policy <commit_policy_class>`, defaults to committing every row
+    :type policy: CommitPolicy object
+    :param force: rebuild the copy even if it is up to date
+    :type force: boolean
+    :return: number of variants copied
+    :rtype: integer
+  """
+  import numpy as np
+  if not force and variant_major_lines(conn, genotype_version, chromosome) is not None:
+    return 0
+  policy = policy or cp.DEFAULT
+  cur = policy.cursor(conn)
+  # Taken before reading, so genotypes written meanwhile leave the new copy out of date
+  stamp = fetch.genotype_stamp(conn, genotype_version, chromosome)
+  cur.execute("SELECT variant_id FROM variant WHERE variant_chromosome = %s ORDER BY variant_id;", (chromosome,))
+  variantIDs = [row[0] for row in cur.fetchall()]
+  lines = fetch.genotype_lines(conn, genotype_version, chromosome)
+  columns = np.ascontiguousarray(fetch.copy_genotype_rows(conn, genotype_version, chromosome, lines, len(variantIDs)).T)
+  tinyint_oid = bc.find_type_oid(conn, 'tinyint')
+  versionField = bc.encode_integer(genotype_version)
+  tuples = (bc.encode_tuple([bc.encode_integer(variantID), versionField, bc.encode_tinyint_array(calls, tinyint_oid)])
+            for variantID, calls in zip(variantIDs, columns))
+  with policy.file(conn):
+    cur.execute("DELETE FROM variant_genotype_lines WHERE variant_genotype_lines_genotype_version = %s AND variant_genotype_lines_chromosome = %s;", (genotype_version, chromosome))
+    cur.execute("""DELETE FROM variant_genotype
+                   WHERE variant_genotype_genotype_version = %s
+                     AND variant_genotype_variant IN (SELECT variant_id FROM variant WHERE variant_chromosome = %s);""", (genotype_version, chromosome))
+    cur.copy_expert("COPY variant_genotype (variant_genotype_variant, variant_genotype_genotype_version, variant_genotype) FROM STDIN WITH (FORMAT binary);", bc.CopyStream(tuples), size=1 << 20)
+    cur.execute("INSERT INTO variant_genotype_lines (variant_genotype_lines_genotype_version, variant_genotype_lines_chromosome, variant_genotype_lines, variant_genotype_lines_stamp) VALUES (%s, %s, %s, %s);", (genotype_version, chromosome, lines, stamp))
+    policy.row(conn, len(variantIDs))
+  return len(variantIDs)
+
+
+def copy_variant_columns(conn, genotype_version, chromosome, indices, lineRows, nlines):
+  """Copies variant-major rows into the columns of a lines x variants matrix
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param genotype_version: :ref:`genotype_version_id <genotype_version_class>`
+    :type genotype_version: integer
+    :param chromosome: :ref:`chromosome_id <chromosome_class>`
+    :type chromosome: integer
+    :param indices: 1-based index of each variant in variant_id order, one per column
+    :type indices: list of integers
+    :param lineRows: position of each requested line in the variant_genotype arrays, one per row
+    :type lineRows: list of integers
+    :param nlines: number of calls in each variant_genotype array
+    :type nlines: integer
+    :return: allele calls
+    :rtype: numpy array of int8
+    :raises: :exc:`ValueError` if a variant has no row, or a row does not have ``nlines`` calls
+  """
+  import numpy as np
+  columnIndex = dict((index, column) for column, index in enumerate(indices))
+  matrix = np.empty((len(lineRows), len(indices)), dtype=np.int8)
+  filled = np.zeros(len(indices), dtype=bool)
+  calls = np.empty(nlines, dtype=np.int8)
+  lineRows = np.asarray(lineRows, dtype=np.intp)
+
+  def decode_row(fields):
+    column = columnIndex[bc.decode_integer(fields[0])]
+    try:
+      bc.decode_tinyint_array(fields[1], out=calls)
+    except ValueError as err:
+      raise ValueError('Variant-major genotype of variant %d on chromosome %s does not have %d calls: %s' % (indices[column], chromosome, nlines, err))
+    matrix[:, column] = calls[lineRows]
+    filled[column] = True
+
+  cur = conn.cursor()
+  SQL = cur.mogrify("""COPY (SELECT v.i::integer, g.variant_genotype FROM (
+          SELECT variant_id, row_number() OVER (ORDER BY variant_id) AS i FROM variant WHERE variant_chromosome = %s) v
+        JOIN variant_genotype g ON g.variant_genotype_variant = v.variant_id
+        WHERE g.variant_genotype_genotype_version = %s AND v.i = ANY(%s))
+        TO STDOUT WITH (FORMAT binary);""", (chromosome, genotype_version, [int(i) for i in indices]))
+  cur.copy_expert(SQL.decode(), bc.CopyDecoder(decode_row))
+  cur.close()
+
+  if not filled.all():
+    raise ValueError('No variant-major genotype for %d variant(s) on chromosome %s in genotype version %s' % (int((~filled).sum()), chromosome, genotype_version))
+  return matrix
+
+
+def choose_layout(nlines, nvariants, totalLines, totalVariants):
+  """Picks the layout that reads fewer calls
+
+    Reading from genotype costs the whole chromosome for every requested line;
+    reading from variant_genotype costs every line for every requested variant
+
+    :param nlines: number of lines requested
+    :type nlines: integer
+    :param nvariants: number of variants requested
+    :type nvariants: integer
+    :param totalLines: number of lines in the variant-major copy
+    :type totalLines: integer
+    :param totalVariants: number of variants on the chromosome
+    :type totalVariants: integer
+    :return: ``LINE_MAJOR`` or ``VARIANT_MAJOR``
+    :rtype: string
+  """
+  if nvariants * totalLines < nlines * totalVariants:
+    return VARIANT_MAJOR
+  return LINE_MAJOR
+
+
+def fetch_genotypes(conn, genotype_version, chromosome, start=None, end=None, positions=None, lines=None, layout=None):
+  """Fetches genotypes as a lines x variants matrix from the cheaper layout
+
+    This function reads a whole chromosome, a region, or chosen variants, from the
+    genotype table (through :func:`fetch.fetch_genotype_region`) or from
+    variant_genotype, whichever reads fewer calls (see :func:`choose_layout`). The
+    variant-major copy is only used while it is up to date.
+
+    :param conn: psycopg2 connection
+    :type conn: connection object
+    :param genotype_version: :ref:`genotype_version_id <genotype_version_class>`
+    :type genotype_version: integer
+    :param chromosome: :ref:`chromosome_id <chromosome_class>`
+    :type chromosome: integer
+    :param start: first base pair of the region
+    :type start: integer
+    :param end: last base pair of the region
+    :type end: integer
+    :param positions: variant_pos of each variant to fetch, in column order, instead of a region
+    :type positions: list of integers
+    :param lines: :ref:`line_id <line_class>` of each row, in order; defaults to every line genotyped for the chromosome, by line_id
+    :type lines: list of integers
+    :param layout: ``LINE_MAJOR`` or ``VARIANT_MAJOR`` to force a layout, or None to choose
+    :type layout: string
+    :return: allele calls, line_id of each row, variant_pos of each column
+    :rtype: tuple of (numpy array of int8, list of integers, numpy array of int64)
+    :raises: :exc:`ValueError` if the variant-major layout is forced but out of date, or lacks a requested line
+
+    :example:
+      .. code-block:: python
+
+        # One marker across every line reads a single variant_genotype row
+        matrix, lines, positions = variantmajor.fetch_genotypes(conn, versionID, chr10ID, positions=[5341206])
+  """
+  import numpy as np
+  if layout not in (None, LINE_MAJOR, VARIANT_MAJOR):
+    raise ValueError("Layout must be %r or %r, not %r" % (LINE_MAJOR, VARIANT_MAJOR, layout))
+  wholeChromosome = start is None and end is None and positions is None
+  if wholeChromosome and layout != VARIANT_MAJOR:
+    return fetch.fetch_genotype_matrix(conn, genotype_version, chromosome, lines)
+  if layout == LINE_MAJOR:
+    return fetch.fetch_genotype_region(conn, genotype_version, chromosome, start, end, positions, lines)
+  variantLines = variant_major_lines(conn, genotype_version, chromosome)
+  if variantLines is None:
+    if layout == VARIANT_MAJOR:
+      raise ValueError('Variant-major genotypes of chromosome %s in genotype version %s are missing or out of date' % (chromosome, genotype_version))
+    return fetch.fetch_genotype_region(conn, genotype_version, chromosome, start, end, positions, lines)
+
+  if wholeChromosome:
+    start, end = 1, 2 ** 31 - 1
+  indices, selected = fetch.find_variant_indices(conn, chromosome, start, end, positions)
+  if layout is None:
+    cur = conn.cursor()
+    cur.execute("SELECT count(*) FROM variant WHERE variant_chromosome = %s;", (chromosome,))
+    totalVariants = cur.fetchone()[0]
+    cur.close()
+    nlines = len(lines) if lines is not None else len(variantLines)
+    if choose_layout(nlines, len(indices), len(variantLines), totalVariants) == LINE_MAJOR:
+      return fetch.fetch_genotype_region(conn, genotype_version, chromosome, start, end, positions, lines)
+
+  lines = variantLines if lines is None else [int(line) for line in lines]
+  lineRow = dict((line, row) for row, line in enumerate(variantLines))
+  missing = [line for line in lines if line not in lineRow]
+  if missing:
+    raise ValueError('%d line(s) are not in the variant-major genotypes of chromosome %s: %s' % (len(missing), chromosome, ', '.join(str(line) for line in missing[:20])))
+  if indices:
+    matrix = copy_variant_columns(conn, genotype_version, chromosome, indices, [lineRow[line] for line in lines], len(variantLines))
+  else:
+    matrix = np.empty((len(lines), 0), dtype=np.int8)
+  return matrix, list(lines), np.array(selected, dtype=np.int64)
@@ -18,9 +18,9 @@ mkdir -p -m 755 "$pg_installdir" || { printf "Unable to create directory '$pg_in
 (
     cd ./c &&
     make &&
-    cp array_multi_index.so imputed_genotype.so summarize_variant.so "$pg_installdir" &&
+    cp array_multi_index.so imputed_genotype.so summarize_variant.so packed_genotype.so "$pg_installdir" &&
     chmod -R 755 "$pg_installdir"
-    printf "Created array_multi_index, imputed_genotype, and summarize_variant.\n"
+    printf "Created array_multi_index, imputed_genotype, packed_genotype, and summarize_variant.\n"
 )
 
 (
@@ -34,18 +34,24 @@ mkdir -p -m 755 "$pg_installdir" || { printf "Unable to create directory '$pg_in
 )
 
 # Move the remaining SQL scripts to a location accessible by postgres user
-cp ./ddl/setup.sql ./ddl/createtables.sql ./ddl/updatepermissions.sql "$pg_installdir"
+cp ./ddl/setup.sql ./ddl/createtables.sql ./ddl/partitioned.sql ./ddl/indexes.sql ./ddl/functions.sql ./ddl/updatepermissions.sql "$pg_installdir"
 printf "Relocated $(ls ./ddl) to $pg_installdir.\n"
 
 sudo -u postgres psql -q -U postgres -f "$pg_installdir/setup.sql" || { printf "Unable to perform setup for 'baxdb' database as user 'postgres'. Check UNIX account privileges and pg_hba.conf. Aborting.\n" 1>&2; exit 1; }
 sudo -u postgres psql -q -U postgres -f "$pg_installdir/tinyint.sql" || { printf "Unable to add 'tinyint' type to database 'baxdb'. Aborting.\n" 1>&2; exit 1; }
 sudo -u postgres psql -q -U postgres -f "$pg_installdir/createtables.sql" || { printf "Unable to perform setup for 'baxdb' database as user 'postgres'. Check UNIX account privileges and pg_hba.conf. Aborting.\n" 1>&2; exit 1; }
+# Set BAXDB_PARTITIONED to partition the genotype and gwas_result tables (PostgreSQL 11 or later)
+if [ -n "$BAXDB_PARTITIONED" ]; then
+    sudo -u postgres psql -q -U postgres -f "$pg_installdir/partitioned.sql" || { printf "Unable to partition the genotype and gwas_result tables. Aborting.\n" 1>&2; exit 1; }
+fi
+sudo -u postgres psql -q -U postgres -f "$pg_installdir/indexes.sql" || { printf "Unable to create indexes in database 'baxdb'. Aborting.\n" 1>&2; exit 1; }
+sudo -u postgres psql -q -U postgres -f "$pg_installdir/functions.sql" || { printf "Unable to add custom functions to database 'baxdb'. Aborting.\n" 1>&2; exit 1; }
 sudo -u postgres psql -q -U postgres -f "$pg_installdir/updatepermissions.sql" || { printf "Unable to perform setup for 'baxdb' database as user 'postgres'. Check UNIX account privileges and pg_hba.conf. Aborting.\n" 1>&2; exit 1; }
 sed -i "1s/^/local baxdb baxdb_owner trust\n/" "$(sudo -u postgres psql -t -P "format=unaligned" -c "SHOW hba_file;")"
 sudo -u postgres psql -t -P "format=unaligned" -c "SELECT pg_reload_conf();"
 
 # Remove the installation files from the database directory
-rm -f "$pg_installdir/setup.sql $pg_installdir/createtables.sql $pg_installdir/updatepermissions.sql"
+rm -f "$pg_installdir/setup.sql $pg_installdir/createtables.sql $pg_installdir/partitioned.sql $pg_installdir/indexes.sql $pg_installdir/functions.sql $pg_installdir/updatepermissions.sql"
 printf "Removed the temporary SQL files for building 'baxdb' database.\n"
 printf "Setup completed successfully.\n"
 printf "Please consider checking your 'pg_hba.conf' file to alter permissions to access the database. Permissions are currently set as 'local baxdb baxdb_owner trust'.\n"
\ No newline at end of file